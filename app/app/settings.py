@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -34,6 +37,9 @@ CORS_ALLOWED_ORIGINS = [
 "http://localhost",
 ]
 
+CORS_ALLOW_HEADERS = [*default_headers, 'idempotency-key']
+CORS_EXPOSE_HEADERS = ['idempotent-replayed']
+
 ALLOWED_HOSTS = ['*']
 
 
@@ -51,18 +57,44 @@ INSTALLED_APPS = [
     'corsheaders',
     'rest_framework',
     'pregnancy',
+    'jobs',
 ]
 
 MIDDLEWARE = [
+    'core.tracing.TracingMiddleware',
+    'core.metrics.MetricsMiddleware',
+    'core.query_inspector.QueryInspectorMiddleware',
+    'core.db_router.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+    # Below CORS and security so replayed and refused responses get their
+    # headers too.
+    'core.idempotency.IdempotencyMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Below authentication, so staff logged in with a session can profile.
+    'core.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+# Requests under these prefixes only run API_MIDDLEWARE, see core.handlers.
+# The API authenticates with JWT in the views, so it needs no session, CSRF
+# or messages middleware.
+API_PATH_PREFIXES = ['/api/']
+
+API_MIDDLEWARE = [
+    'core.tracing.TracingMiddleware',
+    'core.metrics.MetricsMiddleware',
+    'core.query_inspector.QueryInspectorMiddleware',
+    'core.db_router.ReplicaRoutingMiddleware',
+    'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
-    'django.middleware.common.CommonMiddleware',
+    # Below CORS and security so replayed and refused responses get their
+    # headers too.
+    'core.idempotency.IdempotencyMiddleware',
 ]
 
 ROOT_URLCONF = 'app.urls'
@@ -89,11 +121,90 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Connections are kept for DB_CONN_MAX_AGE seconds and checked before
+# reuse. With DB_PGBOUNCER=1 (transaction pooling) server-side cursors are
+# disabled, as they do not survive the end of a transaction; configure
+# the database time zone to UTC so Django does not SET it per connection.
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+DB_PGBOUNCER = os.environ.get('DB_PGBOUNCER', '') == '1'
+
+# SQLite tuning for single-node installs, disabled with SQLITE_TUNING=0.
+# WAL lets readers run alongside the writer, writers wait up to `timeout`
+# seconds (the busy timeout) for the lock, and transactions start with
+# BEGIN IMMEDIATE so they take the write lock up front instead of failing
+# with "database is locked" when upgrading a read lock. See
+# benchmarks/bench_sqlite_concurrency.py.
+SQLITE_TUNING = os.environ.get('SQLITE_TUNING', '1') == '1'
+SQLITE_OPTIONS = {
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': 20,
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA cache_size=-20000;'
+        'PRAGMA mmap_size=134217728;'
+        'PRAGMA temp_store=MEMORY;'
+    ),
+}
+
+if os.environ.get('DB_HOST'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'HOST': os.environ['DB_HOST'],
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'NAME': os.environ.get('DB_NAME'),
+            'USER': os.environ.get('DB_USER'),
+            'PASSWORD': os.environ.get('DB_PASS'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER,
+            'OPTIONS': {
+                'connect_timeout': int(
+                    os.environ.get('DB_CONNECT_TIMEOUT', 5)),
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': SQLITE_OPTIONS if SQLITE_TUNING else {},
+        }
+    }
+
+# Web server sizing for `manage.py serve`, WEB_CONCURRENCY defaults to
+# 2 x CPUs + 1 workers. Each worker holds up to one connection per thread
+# and database, checked against DB_MAX_CONNECTIONS by
+# `manage.py check --deploy`.
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 0))
+WEB_THREADS = int(os.environ.get('WEB_THREADS', 1))
+DB_MAX_CONNECTIONS = int(os.environ.get('DB_MAX_CONNECTIONS', 0)) or None
+
+# Read replicas, one alias per entry of DB_REPLICAS: database files for
+# SQLite (refreshed with `manage.py sync_replicas`), hosts otherwise.
+# Tests read the replicas through the primary, see core.db_router.
+DB_REPLICAS = [r for r in os.environ.get('DB_REPLICAS', '').split(',') if r]
+for index, replica in enumerate(DB_REPLICAS, start=1):
+    DATABASES[f'replica{index}'] = {
+        **DATABASES['default'],
+        ('NAME' if DATABASES['default']['ENGINE'].endswith('sqlite3')
+         else 'HOST'): replica,
+        'TEST': {'MIRROR': 'default'},
     }
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+
+DATABASE_REPLICAS = {
+    'ALIASES': [f'replica{i}' for i in range(1, len(DB_REPLICAS) + 1)],
+    'APPS': ['core', 'pregnancy'],
+    'PIN_SECONDS': int(os.environ.get('DB_REPLICA_PIN_SECONDS', 5)),
+    'CACHE': 'replica_pin',
+    'HEALTH_CHECK_INTERVAL': 10,
+    'MAX_LAG_SECONDS': 5,
 }
 
 
@@ -137,6 +248,15 @@ MEDIA_URL = '/static/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+STORAGES = {
+    'default': {
+        'BACKEND': 'core.storage.TracedFileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -144,23 +264,55 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'core.User'
 
+# User.cpf, the USERNAME_FIELD, is encrypted with random IVs: its blind
+# index cpf_index carries the unique constraint, see core.encryption.
+SILENCED_SYSTEM_CHECKS = ['auth.E003']
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Read-your-writes pins of core.db_router, which every worker must
+    # see: files shared by the workers of a node. Point it at a shared
+    # backend when the workers of a client span several nodes.
+    'replica_pin': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get(
+            'REPLICA_PIN_CACHE_DIR',
+            os.path.join(tempfile.gettempdir(), 'replica-pins')),
+    },
+    # Login throttling buckets, shared by the workers of a node through
+    # files when THROTTLE_CACHE_DIR is set.
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['THROTTLE_CACHE_DIR'],
+    } if os.environ.get('THROTTLE_CACHE_DIR') else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'throttle',
+    },
+}
+
 REST_FRAMEWORK = {
     # YOUR SETTINGS
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.JWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        'core.renderers.FastJSONParser',
         'rest_framework.parsers.MultiPartParser',  # Certifique-se de que isso está presente.
 
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'core.renderers.FastJSONRenderer',
     ],
-    "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    # Reverse proxies in front of the app: throttles identify clients by
+    # the address the nearest trusted proxy appended to X-Forwarded-For,
+    # by REMOTE_ADDR with none, never by a header the client chose.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+    "DEFAULT_SCHEMA_CLASS": "core.openapi.AutoSchema",
 }
 
 SPECTACULAR_SETTINGS = {
@@ -169,6 +321,173 @@ SPECTACULAR_SETTINGS = {
     "COMPONENT_SPLIT_REQUEST": True,
 
 }
+
+# Request metrics exposed on metrics/, see core.metrics. With several
+# worker processes, set METRICS_DIR to a directory shared by all of them.
+# Without METRICS_TOKEN only local clients can scrape them.
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 5
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Opt-in N+1, slow query and full scan detector, see core.query_inspector.
+# QUERY_INSPECTOR=log logs findings, QUERY_INSPECTOR=raise also fails the
+# request (and the tests).
+QUERY_INSPECTOR = {
+    'ENABLED': os.environ.get('QUERY_INSPECTOR') in ('log', 'raise'),
+    'RAISE': os.environ.get('QUERY_INSPECTOR') == 'raise',
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'SLOW_QUERY_MS': 100,
+    'EXPLAIN': True,
+}
+
+# Per-request profiler, see core.profiling. Staff requests sending the
+# `X-Profile: 1` header are profiled, as well as SAMPLE_RATE of all requests.
+PROFILING = {
+    'ENABLED': True,
+    'SAMPLE_RATE': float(os.environ.get('PROFILING_SAMPLE_RATE', 0)),
+    'INTERVAL': 0.005,
+    'DIR': os.environ.get('PROFILING_DIR', '/vol/web/profiles'),
+    'MAX_PROFILES': 100,
+    'TRACEMALLOC': True,
+    'TOP_ALLOCATIONS': 25,
+}
+
+# Request tracing, see core.tracing. TRACING_SAMPLE_RATE of the requests,
+# and with TRACING_TRUST_PARENT those with a sampled `traceparent` header,
+# are traced and exported to a local file or an OTLP/HTTP collector.
+TRACING = {
+    'SAMPLE_RATE': float(os.environ.get('TRACING_SAMPLE_RATE', 0)),
+    # Only behind a gateway setting the traceparent header of requests.
+    'TRUST_PARENT': os.environ.get('TRACING_TRUST_PARENT', '') == '1',
+    'EXPORTER': os.environ.get('TRACING_EXPORTER'),  # 'file' or 'otlp'
+    'FILE': os.environ.get('TRACING_FILE', '/vol/web/traces.jsonl'),
+    'OTLP_ENDPOINT': os.environ.get(
+        'TRACING_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces'),
+    'SERVICE_NAME': 'pre-natal-digital-api',
+}
+
+# Direct-to-storage image uploads, see core.uploads.
+UPLOADS = {
+    'BACKEND': 'core.uploads.LocalUploadBackend',
+    'TICKET_TTL': 600,
+    'FINALIZE_TTL': 3600,
+    'MAX_SIZE': 5 * 1024 * 1024,
+}
+
+# Bounded image validation, see core.images. Multipart files larger than
+# FILE_UPLOAD_MAX_MEMORY_SIZE are streamed to temporary files and files
+# larger than IMAGES['MAX_BYTES'] are not buffered at all.
+IMAGES = {
+    'FORMATS': ('JPEG', 'PNG', 'WEBP'),
+    'MAX_BYTES': 5 * 1024 * 1024,
+    'MAX_DIMENSION': 8000,
+    'MAX_PIXELS': 24_000_000,
+    'WORKERS': int(os.environ.get('IMAGE_WORKERS', 2)),
+    'TIMEOUT': 5,
+    'MAX_MEMORY': 512 * 1024 * 1024,
+}
+
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+
+FILE_UPLOAD_HANDLERS = [
+    'core.images.MaxSizeUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Media serving, see core.media. Set MEDIA_SENDFILE to 'x-accel-redirect'
+# behind nginx (with an internal location at ACCEL_PREFIX aliased to
+# MEDIA_ROOT) or 'x-sendfile' behind Apache to offload the file transfer.
+MEDIA = {
+    'SENDFILE': os.environ.get('MEDIA_SENDFILE') or None,
+    'ACCEL_PREFIX': '/protected-media/',
+    'IMMUTABLE_MAX_AGE': 365 * 24 * 60 * 60,
+    'MAX_AGE': 60 * 60,
+    'PRIVATE_MAX_AGE': 5 * 60,
+}
+
+# Idempotency-Key replay of unsafe API requests, see core.idempotency.
+IDEMPOTENCY = {
+    'ENABLED': True,
+    'TTL': 24 * 60 * 60,
+    'LOCK_TIMEOUT': 60,
+    'WAIT': 10,
+}
+
+# Batched API requests, see core.batch.
+BATCH = {
+    'MAX_REQUESTS': 20,
+    'MAX_WORKERS': 4,
+}
+
+# Database-backed job queue, see jobs.queue and `manage.py run_jobs`.
+JOBS = {
+    'QUEUES': ['default'],
+    'PROCESSES': int(os.environ.get('JOB_WORKERS', 2)),
+    'POLL_INTERVAL': 1.0,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_BASE': 5,
+    'BACKOFF_MAX': 60 * 60,
+    'LOCK_TIMEOUT': 10 * 60,
+    # Tasks queued by the idle workers, with their interval in seconds.
+    'PERIODIC': {
+        'core.tasks.cleanup_pending_uploads': 60 * 60,
+        'core.tasks.purge_idempotency_keys': 60 * 60,
+        'core.tasks.purge_token_revocations': 60 * 60,
+    },
+}
+
+# Server-side JWT revocation, see core.revocation.
+REVOCATION = {
+    'ENABLED': True,
+    'REFRESH_INTERVAL': 5,
+    'RELOAD_INTERVAL': 5 * 60,
+}
+
+# Verified JWT cache of each process, see core.authentication.
+TOKEN_CACHE = {
+    'ENABLED': True,
+    'MAX_SIZE': 10_000,
+}
+
+# Throttling of login attempts on token/, see core.throttling.
+LOGIN_THROTTLE = {
+    'ENABLED': True,
+    'CACHE': 'throttle',
+    'IP_CAPACITY': 30,
+    'IP_REFILL_SECONDS': 2,
+    'CPF_CAPACITY': 5,
+    'CPF_REFILL_SECONDS': 60,
+}
+
+# Encryption of CPF, SUS and NIS numbers, see core.encryption.
+# FIELD_ENCRYPTION_KEYS lists Fernet keys, newest first, so older ones
+# still decrypt while rotating; FIELD_ENCRYPTION_BLIND_INDEX_KEY keys the
+# lookups. Both are required outside DEBUG (check core.E001): with DEBUG
+# keys are derived from the committed SECRET_KEY and protect nothing.
+# Set FIELD_ENCRYPTION_PLAINTEXT_FALLBACK=1 only while
+# `manage.py encrypt_identifiers` runs on rows stored in plaintext.
+FIELD_ENCRYPTION = {
+    'KEYS': [k for k in os.environ.get('FIELD_ENCRYPTION_KEYS', '').split(',')
+             if k],
+    'BLIND_INDEX_KEY': os.environ.get('FIELD_ENCRYPTION_BLIND_INDEX_KEY', ''),
+    'DEVELOPMENT_KEYS': DEBUG,
+    'PLAINTEXT_FALLBACK': os.environ.get(
+        'FIELD_ENCRYPTION_PLAINTEXT_FALLBACK', '0') == '1',
+    'BATCH_SIZE': 500,
+}
+
+# CEP lookups on the index built by `manage.py build_cep_index`, see
+# core.cep.
+CEP = {
+    'INDEX_FILE': Path(os.environ.get('CEP_INDEX_FILE', BASE_DIR / 'cep.idx')),
+    'AUTOCOMPLETE_LIMIT': 10,
+    'MIN_PREFIX': 3,
+}
+
+# Precomputed schema served by api/schema/, see `manage.py build_schema`.
+OPENAPI_SCHEMA_FILE = BASE_DIR / 'openapi.json'
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
@@ -183,4 +502,9 @@ SIMPLE_JWT = {
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
     "TOKEN_OBTAIN_SERIALIZER": "core.serializers.MyTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER":
+        "core.serializers.RevocationTokenRefreshSerializer",
+    "TOKEN_VERIFY_SERIALIZER":
+        "core.serializers.RevocationTokenVerifySerializer",
+    "TOKEN_BLACKLIST_SERIALIZER": "core.serializers.TokenRevokeSerializer",
     }
\ No newline at end of file
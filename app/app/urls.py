@@ -1,34 +1,38 @@
 from django.contrib import admin
 from django.urls import path, include
-from django.conf.urls.static import static
 from django.conf import settings
 
-
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularSwaggerView
-)
+from core.health import healthz_view, readyz_view
+from core.media import serve_media
+from core.metrics import metrics_view
+from core.schema import CachedSchemaView, swagger_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics/', metrics_view, name='metrics'),
+    path('healthz', healthz_view, name='healthz'),
+    path('readyz', readyz_view, name='readyz'),
     path(
         'api/schema/',
-        SpectacularAPIView.as_view(),
+        CachedSchemaView.as_view(),
         name='api-schema'
     ),
     path(
         'api/docs/',
-        SpectacularSwaggerView.as_view(url_name='api-schema'),
+        swagger_view,
         name='api-docs'
     ),
     path(
         'api/v1/',
         include('core.urls', namespace='core'),
     ),
+    path(
+        'api/v1/',
+        include('jobs.urls', namespace='jobs'),
+    ),
+    path(
+        f'{settings.MEDIA_URL.lstrip("/")}<path:path>',
+        serve_media,
+        name='media',
+    ),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL,
-        document_root=settings.MEDIA_ROOT
-    )
@@ -5,11 +5,14 @@ It exposes the WSGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/wsgi/
+
+Requests under `API_PATH_PREFIXES` run through the lean `API_MIDDLEWARE`
+stack, see `core.handlers`.
 """
 
 import os
 
-from django.core.wsgi import get_wsgi_application
+from core.handlers import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
@@ -0,0 +1,52 @@
+"""
+Micro benchmarks for the API.
+
+Each module is a standalone script, run from the `app` directory:
+
+    python -m benchmarks.bench_renderers
+"""
+import os
+import time
+
+
+def setup_django():
+    """Configure Django so benchmarks can use models and serializers."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+    import django
+    django.setup()
+
+
+def setup_test_database():
+    """Create a throwaway test database and return its teardown callable."""
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+
+    def teardown():
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    return teardown
+
+
+def best_of(func, number=100, repeat=5) -> float:
+    """Return the best average time, in seconds, of one call to `func`."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+    return min(timings)
+
+
+def report(title: str, baseline: float, candidate: float, unit='ms'):
+    """Print a comparison line between two timings."""
+    scale = {'ms': 1e3, 'us': 1e6}[unit]
+    speedup = baseline / candidate if candidate else float('inf')
+    print(
+        f'{title:<40} {baseline * scale:>10.3f}{unit} '
+        f'{candidate * scale:>10.3f}{unit} {speedup:>7.2f}x'
+    )
@@ -0,0 +1,119 @@
+"""
+Compare the memory-mapped CEP index with the dataset loaded in memory.
+
+    python -m benchmarks.bench_cep [--ceps 1000000] [--number 20000]
+
+The baseline parses the CSV dataset into a dict and a sorted list of its
+CEPs, as each process would without the index. The candidate maps the
+index built by `write_index()`. The last line times the autocomplete
+view, authentication excluded.
+"""
+import argparse
+import bisect
+import csv
+import itertools
+import os
+import random
+import tempfile
+import time
+
+from benchmarks import best_of, report, setup_django
+
+
+def dataset(count: int):
+    """Yield `count` random, distinct CEPs with their address."""
+    rng = random.Random(0)
+    for number in sorted(rng.sample(range(1_000_000, 99_999_999), count)):
+        yield {
+            'cep': f'{number:08d}', 'street': f'Rua {number % 5000}',
+            'neighborhood': f'Bairro {number % 300}',
+            'city': f'Cidade {number % 5570}', 'state': 'SP',
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--ceps', type=int, default=1_000_000)
+    parser.add_argument('--number', type=int, default=20_000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import override_settings
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from core import cep
+    from core.models import User
+    from core.views import CepView
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'ceps.csv')
+        path = os.path.join(directory, 'cep.idx')
+        with open(source, 'w', newline='') as csv_file:
+            writer = csv.DictWriter(csv_file, ['cep', *cep.ADDRESS_FIELDS])
+            writer.writeheader()
+            writer.writerows(dataset(args.ceps))
+        with open(source, newline='') as csv_file:
+            cep.write_index(csv.DictReader(csv_file), path)
+
+        start = time.perf_counter()
+        with open(source, newline='') as csv_file:
+            loaded = {row['cep']: row for row in csv.DictReader(csv_file)}
+        keys = sorted(loaded)
+        load = time.perf_counter() - start
+        start = time.perf_counter()
+        index = cep.CepIndex(path)
+        mapped = time.perf_counter() - start
+
+        lookups = random.Random(1).sample(keys, min(1000, len(keys)))
+        prefixes = [key[:5] for key in lookups]
+
+        def get_dict():
+            key = itertools.cycle(lookups)
+            return lambda: loaded.get(next(key))
+
+        def get_index():
+            key = itertools.cycle(lookups)
+            return lambda: index.get(next(key))
+
+        def search_list():
+            prefix = itertools.cycle(prefixes)
+
+            def run():
+                key = next(prefix)
+                position = bisect.bisect_left(keys, key)
+                return [loaded[cep] for cep in keys[position:position + 10]
+                        if cep.startswith(key)]
+            return run
+
+        def search_index():
+            prefix = itertools.cycle(prefixes)
+            return lambda: index.search(next(prefix), 10)
+
+        print(f'{args.ceps} CEPs, index of '
+              f'{os.path.getsize(path) / 2 ** 20:.1f} MiB')
+        print(f'{"operation":<40} {"in memory":>12} {"mmap":>12} '
+              f'{"gain":>8}')
+        report('load', load, mapped)
+        report('get', best_of(get_dict(), args.number),
+               best_of(get_index(), args.number), unit='us')
+        report('autocomplete (10 results)',
+               best_of(search_list(), args.number),
+               best_of(search_index(), args.number), unit='us')
+
+        factory = APIRequestFactory()
+        view = CepView.as_view()
+        user = User(cpf='12345678909', email='bench@domain.com')
+        prefix = itertools.cycle(prefixes)
+
+        def autocomplete():
+            request = factory.get('/api/cep/', {'q': next(prefix)})
+            force_authenticate(request, user)
+            assert view(request).status_code == 200
+
+        with override_settings(CEP={'INDEX_FILE': path}):
+            elapsed = best_of(autocomplete, args.number // 10)
+        print(f'{"autocomplete view":<40} {"":>12} '
+              f'{elapsed * 1e6:>10.3f}us')
+
+
+if __name__ == '__main__':
+    main()
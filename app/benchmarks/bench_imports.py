@@ -0,0 +1,100 @@
+"""
+Measure the cold start of a worker and the import cost of each module.
+
+Each run starts a fresh interpreter that loads `app.wsgi` and serves one
+API request, the way a new pod does before taking traffic. The startup
+time is reported over several runs, then one run with `-X importtime`
+is broken down by package and by top-level import.
+
+    python -m benchmarks.bench_imports [--runs 5] [--top 20]
+"""
+import argparse
+import collections
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+STARTUP_SCRIPT = '''
+import json, os, sys, time
+start = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+from wsgiref.util import setup_testing_defaults
+from app.wsgi import application
+environ = {'PATH_INFO': '/api/v1/users/'}
+setup_testing_defaults(environ)
+statuses = []
+response = application(environ, lambda status, *args: statuses.append(status))
+b''.join(response)
+print(json.dumps({
+    'seconds': time.perf_counter() - start,
+    'status': statuses[0],
+    'modules': sorted(sys.modules),
+}))
+'''
+
+IMPORTTIME_RE = re.compile(
+    r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def run_startup(*flags):
+    """Start a worker interpreter, return its report and stderr."""
+    app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, *flags, '-c', STARTUP_SCRIPT],
+        cwd=app_dir, capture_output=True, text=True, check=True,
+        env={**os.environ, 'PYTHONPATH': app_dir},
+    )
+    return json.loads(result.stdout.splitlines()[-1]), result.stderr
+
+
+def parse_importtime(stderr: str) -> list:
+    """Return (self_us, cumulative_us, depth, module) per imported module."""
+    rows = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            rows.append((int(match[1]), int(match[2]),
+                         len(match[3]) // 2, match[4]))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+
+    timings = [run_startup()[0]['seconds'] for _ in range(args.runs)]
+    print(f'startup to first request over {args.runs} runs: '
+          f'best {min(timings) * 1e3:.0f}ms, '
+          f'median {statistics.median(timings) * 1e3:.0f}ms')
+
+    report, stderr = run_startup('-X', 'importtime')
+    rows = parse_importtime(stderr)
+    total = sum(row[0] for row in rows)
+    print(f'{len(rows)} modules imported in {total / 1e3:.0f}ms '
+          f'(-X importtime)\n')
+
+    packages = collections.Counter()
+    for self_us, _, _, module in rows:
+        packages[module.split('.')[0]] += self_us
+    print(f'{"package":<40} {"self":>10}')
+    for package, self_us in packages.most_common(args.top):
+        print(f'{package:<40} {self_us / 1e3:>8.1f}ms')
+
+    print(f'\n{"top-level import":<40} {"cumulative":>10}')
+    top_level = sorted((row for row in rows if row[2] == 0),
+                       key=lambda row: -row[1])
+    for _, cumulative, _, module in top_level[:args.top]:
+        print(f'{module:<40} {cumulative / 1e3:>8.1f}ms')
+
+    deferred = ('PIL', 'drf_spectacular.openapi', 'drf_spectacular.views')
+    loaded = [m for m in deferred if m in report['modules']]
+    print(f'\ndeferred modules loaded at startup: {loaded or "none"}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Compare ModelSerializer and ValuesSerializer for the list endpoints.
+
+    python -m benchmarks.bench_list_serializers [--rows 1000]
+"""
+import argparse
+
+from benchmarks import best_of, report, setup_django, setup_test_database
+
+
+def create_rows(rows: int):
+    """Insert `rows` users, each with a profile."""
+    from core.models import User, UserProfile
+
+    users = User.objects.bulk_create(
+        User(
+            cpf=f'{i:011d}',
+            email=f'user{i}@domain.com',
+            name=f'User {i}',
+            password='!',
+            phone='99999999999',
+        )
+        for i in range(rows)
+    )
+    UserProfile.objects.bulk_create(
+        UserProfile(
+            user=user,
+            name=f'Profile {user.id}',
+            image='uploads/images/profile.jpg',
+        )
+        for user in users
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--number', type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    teardown = setup_test_database()
+    try:
+        from core.fast_serializers import ValuesSerializer
+        from core.models import User, UserProfile
+        from core.serializers import UserProfileSerializer, UserSerializer
+
+        create_rows(args.rows)
+        cases = (
+            ('users', UserSerializer, User.objects.all()),
+            ('user_profiles', UserProfileSerializer,
+             UserProfile.objects.select_related('user')),
+        )
+        print(f'{"case":<40} {"model":>12} {"values":>12} {"gain":>8}')
+        for name, serializer_class, queryset in cases:
+            fast = ValuesSerializer(serializer_class)
+            instances = list(queryset)
+            rows = list(fast.rows(queryset))
+            report(
+                f'{name} serialize, per row',
+                best_of(lambda: serializer_class(instances, many=True).data,
+                        args.number) / args.rows,
+                best_of(lambda: fast.serialize_rows(rows),
+                        args.number) / args.rows,
+                unit='us',
+            )
+            report(
+                f'{name} query + serialize, per row',
+                best_of(lambda: serializer_class(
+                    queryset.all(), many=True).data, args.number) / args.rows,
+                best_of(lambda: fast.serialize(queryset),
+                        args.number) / args.rows,
+                unit='us',
+            )
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Compare CPF lookups and logins on plaintext and encrypted CPFs.
+
+    python -m benchmarks.bench_login [--users 1000] [--number 500]
+
+The baseline stores every CPF in plaintext, as before encryption, and
+looks it up with the plaintext fallback. The candidates store them
+encrypted and look them up by blind index, with and without the
+fallback. Passwords use a fast hasher so the login timings show the
+lookup, not PBKDF2.
+"""
+import argparse
+import itertools
+
+from benchmarks import best_of, report, setup_django, setup_test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--number', type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+    teardown = setup_test_database()
+    try:
+        from django.conf import settings
+        from django.db import connection
+        from django.test import override_settings
+        from core.encryption import encrypt_batch
+        from core.models import User
+        from core.serializers import MyTokenObtainPairSerializer
+
+        override_settings(
+            PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+            LOGIN_THROTTLE={'ENABLED': False, 'VALIDATE_CPF': False},
+        ).enable()
+        cpfs = [f'{index:011d}' for index in range(1, args.users + 1)]
+        for cpf in cpfs:
+            User.objects.create_user(
+                cpf=cpf, email=f'{cpf}@domain.com', name='Bench',
+                password='benchpass123')
+
+        def lookup():
+            cpf = itertools.cycle(cpfs)
+            return lambda: User.objects.get(cpf=next(cpf))
+
+        def login():
+            cpf = itertools.cycle(cpfs)
+
+            def run():
+                serializer = MyTokenObtainPairSerializer(data={
+                    'cpf': next(cpf), 'password': 'benchpass123'})
+                assert serializer.is_valid()
+            return run
+
+        def timings(func):
+            """Time `func` on plaintext and on encrypted CPFs."""
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    'UPDATE core_user SET cpf = %s, cpf_index = NULL '
+                    'WHERE email = %s',
+                    [(cpf, f'{cpf}@domain.com') for cpf in cpfs])
+            with override_settings(FIELD_ENCRYPTION={
+                    **settings.FIELD_ENCRYPTION,
+                    'PLAINTEXT_FALLBACK': True}):
+                plaintext = best_of(func(), args.number)
+                encrypt_batch(User, args.users)
+                fallback = best_of(func(), args.number)
+            encrypted = best_of(func(), args.number)
+            return plaintext, fallback, encrypted
+
+        print(f'{"operation":<40} {"plaintext":>12} {"encrypted":>12} '
+              f'{"gain":>8}')
+        for name, func in (('CPF lookup', lookup),
+                           ('login serializer', login)):
+            plaintext, fallback, encrypted = timings(func)
+            report(f'{name} (with fallback)', plaintext, fallback,
+                   unit='us')
+            report(f'{name} (blind index only)', plaintext, encrypted,
+                   unit='us')
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    main()
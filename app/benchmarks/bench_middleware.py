@@ -0,0 +1,65 @@
+"""
+Compare the full middleware stack with the lean API stack.
+
+    python -m benchmarks.bench_middleware [--number 2000]
+"""
+import argparse
+
+from benchmarks import best_of, report, setup_django, setup_test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    teardown = setup_test_database()
+    try:
+        from django.conf import settings
+        from django.core.handlers.wsgi import WSGIHandler
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from django.urls import reverse
+        from core.handlers import APIRoutingWSGIHandler, MiddlewareStackHandler
+        from core.schema import get_cached_schema
+
+        factory = RequestFactory()
+
+        class StubViewHandler(MiddlewareStackHandler):
+            """Stack handler answering without resolving a view."""
+
+            def _get_response(self, request):
+                return HttpResponse(b'{}', content_type='application/json')
+
+        def call(handler, path, **extra):
+            def run():
+                response = handler.get_response(factory.get(path, **extra))
+                assert response.status_code in (200, 304)
+                response.close()
+            return run
+
+        schema_url = reverse('api-schema') + '?format=json'
+        schema_etag = get_cached_schema().representation('json').etag
+        origin = {'HTTP_ORIGIN': 'http://localhost:3000'}
+
+        print(f'{"request":<40} {"full":>12} {"lean":>12} {"gain":>8}')
+        for name, full, lean, path, extra in (
+            ('middleware only', StubViewHandler(settings.MIDDLEWARE),
+             StubViewHandler(settings.API_MIDDLEWARE), '/api/v1/', {}),
+            ('middleware only (CORS)', StubViewHandler(settings.MIDDLEWARE),
+             StubViewHandler(settings.API_MIDDLEWARE), '/api/v1/', origin),
+            ('GET api/schema/ (304)', WSGIHandler(), APIRoutingWSGIHandler(),
+             schema_url, {'HTTP_IF_NONE_MATCH': schema_etag}),
+        ):
+            baseline = best_of(call(full, path, **extra), args.number)
+            candidate = best_of(call(lean, path, **extra), args.number)
+            report(name, baseline, candidate, unit='us')
+            print(f'{"  overhead saved per request":<40} '
+                  f'{(baseline - candidate) * 1e6:>10.1f}us')
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    main()
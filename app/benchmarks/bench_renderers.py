@@ -0,0 +1,81 @@
+"""
+Compare the stock DRF JSON renderer/parser with the orjson backed ones.
+
+    python -m benchmarks.bench_renderers [--rows 1000]
+"""
+import argparse
+import io
+
+from benchmarks import best_of, report, setup_django
+
+
+def build_payloads(rows: int):
+    """Return serialized user and user profile lists of `rows` items."""
+    from core.models import User, UserProfile
+    from core.serializers import UserProfileSerializer, UserSerializer
+
+    users = [
+        User(
+            id=i,
+            cpf=f'{i:011d}',
+            email=f'user{i}@domain.com',
+            name=f'Usuária Número {i}',
+            phone='99999999999',
+            is_active=True,
+            is_staff=bool(i % 7 == 0),
+            is_superuser=False,
+        )
+        for i in range(1, rows + 1)
+    ]
+    profiles = [
+        UserProfile(id=user.id, name=f'Perfil {user.id}', user=user)
+        for user in users
+    ]
+    return {
+        'users': UserSerializer(users, many=True).data,
+        'user_profiles': UserProfileSerializer(profiles, many=True).data,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--number', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+    from core import renderers
+
+    if renderers.orjson is None:
+        print('orjson is not installed; the fast classes fall back to DRF.')
+
+    stock_renderer = JSONRenderer()
+    fast_renderer = renderers.FastJSONRenderer()
+    stock_parser = JSONParser()
+    fast_parser = renderers.FastJSONParser()
+
+    print(f'{"payload":<40} {"stock":>12} {"fast":>12} {"gain":>8}')
+    for name, data in build_payloads(args.rows).items():
+        assert (
+            stock_parser.parse(io.BytesIO(stock_renderer.render(data)))
+            == fast_parser.parse(io.BytesIO(fast_renderer.render(data)))
+        )
+        report(
+            f'render {name} x{args.rows}',
+            best_of(lambda: stock_renderer.render(data), args.number),
+            best_of(lambda: fast_renderer.render(data), args.number),
+        )
+        body = stock_renderer.render(data)
+        report(
+            f'parse {name} x{args.rows}',
+            best_of(lambda: stock_parser.parse(io.BytesIO(body)),
+                    args.number),
+            best_of(lambda: fast_parser.parse(io.BytesIO(body)),
+                    args.number),
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Compare concurrent SQLite writes with Django's defaults and the tuned mode.
+
+Writer processes run read-modify-write transactions (read a row, update
+it, insert a log row) through `transaction.atomic()` against a throwaway
+database file, first with the default SQLite options, then with
+`settings.SQLITE_OPTIONS`. Failed transactions are not retried, like a
+request failing with "database is locked".
+
+    python -m benchmarks.bench_sqlite_concurrency [--writers 8]
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from benchmarks import setup_django
+
+ROWS = 16
+
+
+def create_database(path):
+    """Create the benchmark tables."""
+    db = sqlite3.connect(path)
+    db.executescript(
+        'CREATE TABLE bench (id INTEGER PRIMARY KEY, counter INTEGER);'
+        'CREATE TABLE bench_log ('
+        '    id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT);'
+    )
+    db.executemany('INSERT INTO bench VALUES (?, 0)',
+                   [(i,) for i in range(ROWS)])
+    db.commit()
+    db.close()
+
+
+def writer(path, options, transactions, start, results):
+    """Run `transactions` write transactions and report the outcome."""
+    setup_django()
+    from django.conf import settings
+    from django.db import OperationalError, connection, transaction
+
+    settings.DATABASES['default'].update(NAME=path, OPTIONS=options)
+    committed = locked = 0
+    start.wait()
+    for i in range(transactions):
+        row = (os.getpid() + i) % ROWS
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT counter FROM bench WHERE id = %s', [row])
+                counter = cursor.fetchone()[0]
+                cursor.execute(
+                    'UPDATE bench SET counter = %s WHERE id = %s',
+                    [counter + 1, row])
+                cursor.execute(
+                    'INSERT INTO bench_log (payload) VALUES (%s)', ['x' * 512])
+            committed += 1
+        except OperationalError as exc:
+            if 'locked' not in str(exc):
+                raise
+            locked += 1
+    results.put((committed, locked))
+
+
+def run(options, writers, transactions):
+    """Return the commits per second and lock errors of one mode."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'bench.sqlite3')
+        create_database(path)
+        start = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(
+                target=writer,
+                args=(path, options, transactions, start, results))
+            for _ in range(writers)
+        ]
+        for process in processes:
+            process.start()
+        time.sleep(0.5)
+        began = time.perf_counter()
+        start.set()
+        outcomes = [results.get() for _ in processes]
+        elapsed = time.perf_counter() - began
+        for process in processes:
+            process.join()
+    committed = sum(c for c, _ in outcomes)
+    locked = sum(lk for _, lk in outcomes)
+    return committed / elapsed, locked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--transactions', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+
+    total = args.writers * args.transactions
+    print(f'{args.writers} writers x {args.transactions} transactions')
+    print(f'{"mode":<12} {"commits/s":>12} {"locked":>8} {"failed":>8}')
+    for name, options in (('default', {}),
+                          ('tuned', settings.SQLITE_OPTIONS)):
+        throughput, locked = run(options, args.writers, args.transactions)
+        print(f'{name:<12} {throughput:>12.1f} {locked:>8} '
+              f'{locked / total:>7.1%}')
+
+
+if __name__ == '__main__':
+    main()
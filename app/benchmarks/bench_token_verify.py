@@ -0,0 +1,69 @@
+"""
+Compare JWT verification with and without the verified token cache.
+
+    python -m benchmarks.bench_token_verify [--clients 100] [--number 5000]
+
+Each call verifies the token of the next of `--clients` clients, as
+authentication and `token/verify/` do for clients sending their token
+again and again.
+"""
+import argparse
+import itertools
+
+from benchmarks import best_of, report, setup_django, setup_test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--number', type=int, default=5000)
+    args = parser.parse_args()
+
+    setup_django()
+    teardown = setup_test_database()
+    try:
+        from django.test import override_settings
+        from rest_framework_simplejwt.tokens import RefreshToken
+        from core.authentication import JWTAuthentication, token_cache
+        from core.models import User
+        from core.serializers import RevocationTokenVerifySerializer
+
+        user = User.objects.create_user(
+            cpf='12345678901', email='bench@domain.com', name='Bench',
+            password='benchpass123')
+        tokens = [
+            str(RefreshToken.for_user(user).access_token).encode()
+            for _ in range(args.clients)
+        ]
+        authentication = JWTAuthentication()
+
+        def authenticate():
+            raw = itertools.cycle(tokens)
+            return lambda: authentication.get_validated_token(next(raw))
+
+        def verify():
+            raw = itertools.cycle(tokens)
+
+            def run():
+                serializer = RevocationTokenVerifySerializer(
+                    data={'token': next(raw).decode()})
+                assert serializer.is_valid()
+            return run
+
+        print(f'{"verification":<40} {"uncached":>12} {"cached":>12} '
+              f'{"gain":>8}')
+        for name, func in (('authentication', authenticate),
+                           ('token/verify/ serializer', verify)):
+            with override_settings(TOKEN_CACHE={'ENABLED': False}):
+                baseline = best_of(func(), args.number)
+            token_cache.clear()
+            candidate = best_of(func(), args.number)
+            report(name, baseline, candidate, unit='us')
+            print(f'{"  tokens per second":<40} {1 / baseline:>12.0f} '
+                  f'{1 / candidate:>12.0f}')
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    main()
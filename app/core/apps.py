@@ -4,3 +4,20 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.models.signals import post_init, post_save
+
+        from core import checks  # noqa: F401
+        from core.revocation import (
+            remember_active,
+            revoke_inactive_user,
+        )
+
+        post_save.connect(
+            revoke_inactive_user, sender=settings.AUTH_USER_MODEL,
+            dispatch_uid='core.revoke_inactive_user')
+        post_init.connect(
+            remember_active, sender=settings.AUTH_USER_MODEL,
+            dispatch_uid='core.remember_active')
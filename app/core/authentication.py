@@ -0,0 +1,128 @@
+"""
+JWT authentication of the API.
+
+A client sends the same access token with every request until it
+expires, and checks it with `token/verify/` on each start. Decoding and
+verifying its signature every time is wasted work, so the tokens
+verified by the process are kept in `token_cache`, a bounded LRU keyed by
+the SHA-256 of the raw token and dropped when the token expires. The
+cache is shared by `JWTAuthentication` and `token/verify/`, and sized by
+`settings.TOKEN_CACHE['MAX_SIZE']`; revocation is still checked on
+every request.
+
+Hits and misses are counted in the `jwt_verify_cache_total` metric,
+evictions of live tokens in `jwt_verify_cache_evictions_total`.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import authentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from core.metrics import registry
+from core.revocation import is_revoked
+
+
+def token_cache_settings() -> dict:
+    """Return the verified token cache settings with their defaults."""
+    return {
+        'ENABLED': True,
+        'MAX_SIZE': 10_000,
+        **getattr(settings, 'TOKEN_CACHE', {}),
+    }
+
+
+class VerifiedTokenCache:
+    """Thread safe LRU of verified tokens, each kept until it expires."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens = OrderedDict()
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def clear(self):
+        """Drop every token."""
+        with self._lock:
+            self._tokens.clear()
+
+    @staticmethod
+    def key(kind: str, raw_token) -> str:
+        """Return the key of `raw_token` verified as a `kind` token."""
+        if isinstance(raw_token, str):
+            raw_token = raw_token.encode()
+        return f'{kind}:{hashlib.sha256(raw_token).hexdigest()}'
+
+    def get(self, key: str):
+        """Return the token cached at `key`, or None."""
+        with self._lock:
+            entry = self._tokens.get(key)
+            if entry is not None and entry[1] <= time.time():
+                del self._tokens[key]
+                entry = None
+            if entry is not None:
+                self._tokens.move_to_end(key)
+        registry.inc('jwt_verify_cache_total',
+                     ('miss' if entry is None else 'hit',))
+        return None if entry is None else entry[0]
+
+    def set(self, key: str, token):
+        """Cache `token` at `key` until it expires."""
+        max_size = token_cache_settings()['MAX_SIZE']
+        evicted = 0
+        with self._lock:
+            self._tokens[key] = (token, token['exp'])
+            self._tokens.move_to_end(key)
+            while len(self._tokens) > max_size:
+                _, (_, expires) = self._tokens.popitem(last=False)
+                evicted += expires > time.time()
+        if evicted:
+            registry.inc('jwt_verify_cache_evictions_total', (), evicted)
+
+    def get_or_verify(self, kind: str, raw_token, verify):
+        """
+        Return the token of `raw_token` from the cache, or verified by
+        `verify(raw_token)` and cached.
+        """
+        if not token_cache_settings()['ENABLED']:
+            return verify(raw_token)
+        key = self.key(kind, raw_token)
+        token = self.get(key)
+        if token is None:
+            token = verify(raw_token)
+            self.set(key, token)
+        return token
+
+
+token_cache = VerifiedTokenCache()
+
+
+class JWTAuthentication(authentication.JWTAuthentication):
+    """JWT authentication caching verified tokens, refusing revoked ones."""
+
+    def get_validated_token(self, raw_token):
+        token = token_cache.get_or_verify(
+            'auth', raw_token, super().get_validated_token)
+        if is_revoked(token):
+            raise InvalidToken(_('Token is revoked'))
+        return token
+
+
+def request_user_id(request):
+    """Return the user id of the JWT of `request`, without a query."""
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = header and authentication.get_raw_token(header)
+    if not raw_token:
+        return None
+    try:
+        token = authentication.get_validated_token(raw_token)
+    except (InvalidToken, TokenError):
+        return None
+    return token.get(api_settings.USER_ID_CLAIM)
@@ -0,0 +1,246 @@
+"""
+In-process execution of batched API requests.
+
+`POST api/v1/batch/` takes a list of sub-requests and returns all their
+responses at once, so a mobile client starting up pays TLS, middleware
+and authentication once instead of once per call:
+
+    {"requests": [
+        {"id": "me", "method": "GET", "path": "/api/v1/detail/me/"},
+        {"id": "profile", "method": "GET",
+         "path": "/api/v1/user-profiles/me"},
+        {"method": "POST", "path": "/api/v1/token/verify/",
+         "body": {"token": "..."}}
+    ]}
+
+Each sub-request is resolved and dispatched straight to its view, with
+the user authenticated by the batch request, so no middleware runs
+again. Views with a false `batchable` attribute can not be batched.
+Each sub-response is closed once read, see `close_response`.
+
+Sub-requests run in order, except that consecutive safe (GET, HEAD)
+ones run concurrently on a thread pool of `settings.BATCH['MAX_WORKERS']`
+threads. Reads run sequentially inside a transaction, whose writes other
+connections can not see. The pool threads run the `execute_wrapper`s of
+the batch request (metrics, tracing, profiling) on their own connections,
+which are persistent and counted by the `core.W001` connection budget.
+
+The response lists, in the order of the request, the `id`, `status`,
+`headers` and `body` of every sub-request. Bodies are spliced in as they
+were rendered by the views, without decoding them again.
+"""
+import contextvars
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections, connections
+from django.http import Http404
+from django.urls import Resolver404, resolve
+from rest_framework.permissions import SAFE_METHODS
+
+from core.renderers import FastJSONRenderer
+from core.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Headers of the batch request which do not apply to its sub-requests.
+REQUEST_ONLY_META = (
+    'CONTENT_LENGTH', 'CONTENT_TYPE', 'HTTP_CONTENT_LENGTH',
+    'HTTP_CONTENT_TYPE', 'HTTP_IDEMPOTENCY_KEY', 'PATH_INFO', 'QUERY_STRING',
+    'REQUEST_METHOD', 'wsgi.input',
+)
+RETURNED_HEADERS = ('Content-Type', 'Location')
+
+_renderer = FastJSONRenderer()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class BatchError(Exception):
+    """A sub-request can not be run."""
+
+
+def batch_settings() -> dict:
+    """Return the batch settings with their defaults."""
+    return {
+        'MAX_REQUESTS': 20,
+        'MAX_WORKERS': 4,
+        **getattr(settings, 'BATCH', {}),
+    }
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the thread pool running concurrent reads."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=batch_settings()['MAX_WORKERS'],
+                thread_name_prefix='batch')
+        return _executor
+
+
+def build_request(request, item: dict) -> WSGIRequest:
+    """Return the Django request of a sub-request of `request`."""
+    url = urlsplit(item['path'])
+    body = b''
+    if 'body' in item:
+        body = _renderer.render(item['body'])
+    environ = {
+        key: value for key, value in request.META.items()
+        if key not in REQUEST_ONLY_META
+    }
+    environ.update({
+        'REQUEST_METHOD': item['method'],
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+    })
+    sub_request = WSGIRequest(environ)
+    # Authenticated once by the batch request, see rest_framework.request.
+    sub_request._force_auth_user = request.user
+    sub_request._force_auth_token = request.auth
+    return sub_request
+
+
+def dispatch(request, item: dict):
+    """Run one sub-request, return its response."""
+    sub_request = build_request(request, item)
+    prefixes = tuple(settings.API_PATH_PREFIXES)
+    if not sub_request.path_info.startswith(prefixes):
+        raise BatchError('Only API paths can be batched.')
+    try:
+        match = resolve(sub_request.path_info)
+    except Resolver404:
+        raise Http404
+    if not getattr(getattr(match.func, 'view_class', None), 'batchable',
+                   True):
+        raise BatchError(f'{item["path"]} can not be batched.')
+    sub_request.resolver_match = match
+    with span('batch.request', **{
+            'http.method': item['method'],
+            'http.route': match.route}):
+        response = match.func(sub_request, *match.args, **match.kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response.render()
+    return response
+
+
+def in_atomic_block() -> bool:
+    """Return whether a connection of this thread is in a transaction."""
+    return any(connection.in_atomic_block
+               for connection in connections.all())
+
+
+def close_response(response):
+    """
+    Close a sub-response once read, as the handler does at the end of a
+    request: its resources are released and request_finished is sent.
+    Within a transaction, whose connection close_old_connections would
+    close, the response is left to the garbage collector.
+    """
+    if not in_atomic_block():
+        response.close()
+
+
+def run(request, item: dict) -> dict:
+    """Run one sub-request, return its result."""
+    try:
+        response = dispatch(request, item)
+    except BatchError as exc:
+        return {'id': item.get('id'), 'status': 400,
+                'error': str(exc)}
+    except Http404:
+        return {'id': item.get('id'), 'status': 404, 'error': 'Not found.'}
+    except Exception:
+        logger.exception('Batched %s %s failed', item['method'],
+                         item['path'])
+        return {'id': item.get('id'), 'status': 500,
+                'error': 'Server error.'}
+    try:
+        content = b''.join(response) if response.streaming \
+            else response.content
+    finally:
+        close_response(response)
+    return {
+        'id': item.get('id'),
+        'status': response.status_code,
+        'headers': {header: response[header] for header in RETURNED_HEADERS
+                    if header in response},
+        'content': content,
+    }
+
+
+def run_in_thread(request, item: dict):
+    """Run one sub-request on the thread pool, return its future."""
+    # Connections are per thread: the wrappers of the batch request are
+    # installed on the connections of the pool thread.
+    wrappers = [(connection.alias, list(connection.execute_wrappers))
+                for connection in connections.all()]
+
+    def call():
+        close_old_connections()
+        try:
+            with ExitStack() as stack:
+                for alias, alias_wrappers in wrappers:
+                    for wrapper in alias_wrappers:
+                        stack.enter_context(
+                            connections[alias].execute_wrapper(wrapper))
+                return run(request, item)
+        finally:
+            close_old_connections()
+
+    context = contextvars.copy_context()
+    return get_executor().submit(context.run, call)
+
+
+def execute(request, items: list) -> list:
+    """Run the sub-requests of a batch, return their results in order."""
+    concurrent = batch_settings()['MAX_WORKERS'] > 1 and \
+        not in_atomic_block()
+    results = []
+    reads = []
+
+    def flush():
+        if len(reads) > 1 and concurrent:
+            futures = [run_in_thread(request, read) for read in reads]
+            results.extend(future.result() for future in futures)
+        else:
+            results.extend(run(request, read) for read in reads)
+        reads.clear()
+
+    for item in items:
+        if item['method'] in SAFE_METHODS:
+            reads.append(item)
+            continue
+        flush()
+        results.append(run(request, item))
+    flush()
+    return results
+
+
+def render_results(results: list) -> bytes:
+    """Return the JSON body of a batch response."""
+    parts = []
+    for result in results:
+        content = result.pop('content', None)
+        encoded = _renderer.render(result)
+        if content is not None:
+            if not content:
+                body = b'null'
+            elif result['headers'].get('Content-Type', '').startswith(
+                    'application/json'):
+                body = content
+            else:
+                body = _renderer.render(content.decode(errors='replace'))
+            encoded = encoded[:-1] + b',"body":' + body + b'}'
+        parts.append(encoded)
+    return b'{"responses":[' + b','.join(parts) + b']}'
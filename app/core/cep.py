@@ -0,0 +1,268 @@
+"""
+CEP (postal code) lookups on a local, memory-mapped index.
+
+`manage.py build_cep_index` converts an offline CEP dataset (a CSV file
+with `cep`, `street`, `neighborhood`, `city` and `state` columns) into
+the binary file `settings.CEP['INDEX_FILE']`:
+
+* an 8 bytes header, `CEP1` and the number of records;
+* the records sorted by CEP, each of `RECORD_SIZE` bytes: the 8 ASCII
+  digits of the CEP, then the offset and length of its address;
+* the addresses, UTF-8 encoded, their fields separated by `\\x1f`.
+
+Each process maps the file read-only on the first lookup and binary
+searches the records in place: nothing is parsed up front, the pages of
+the file are shared by every process of a node through the page cache,
+and a lookup reads about log2(n) records. The index is replaced
+atomically, so running processes keep the file they mapped until they
+are restarted.
+
+`normalize_addresses()` rewrites the CEP of existing addresses as 8
+digits and sets their city and state from the index, and their street
+when it is blank.
+"""
+import functools
+import logging
+import mmap
+import os
+import re
+import struct
+import tempfile
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Missing index files already logged, see get_index().
+_missing_paths = set()
+
+MAGIC = b'CEP1'
+HEADER = struct.Struct('<4sI')
+RECORD = struct.Struct('<8sIH')
+RECORD_SIZE = RECORD.size
+CEP_LENGTH = 8
+ADDRESS_FIELDS = ('street', 'neighborhood', 'city', 'state')
+SEPARATOR = '\x1f'
+# Fields only filled in when blank: streets typed by users often carry
+# the house number, which the index does not have.
+BLANK_ONLY = ('street',)
+SEPARATORS = re.compile(r'[-. ]')
+
+
+def cep_settings() -> dict:
+    """Return the CEP lookup settings with their defaults."""
+    return {
+        'INDEX_FILE': settings.BASE_DIR / 'cep.idx',
+        'AUTOCOMPLETE_LIMIT': 10,
+        'MIN_PREFIX': 3,
+        'BATCH_SIZE': 500,
+        # Address model: its CEP field and the fields filled from the
+        # index, by name in the index.
+        'MODELS': {
+            'core.Address': {
+                'cep': 'cep', 'street': 'street', 'city': 'city',
+                'state': 'state',
+            },
+            'pregnancy.Address': {
+                'cep': 'zip_code', 'street': 'street', 'city': 'city',
+                'state': 'state',
+            },
+        },
+        **getattr(settings, 'CEP', {}),
+    }
+
+
+def cep_digits(value) -> str | None:
+    """Return the digits of a CEP or CEP prefix typed with `-` or `.`."""
+    if not isinstance(value, str):
+        return None
+    digits = SEPARATORS.sub('', value.strip())
+    if not digits.isascii() or not digits.isdigit() or \
+            len(digits) > CEP_LENGTH:
+        return None
+    return digits
+
+
+def normalize_cep(value) -> str | None:
+    """Return the 8 digits of a CEP, or None when it is not one."""
+    digits = cep_digits(value)
+    return digits if digits and len(digits) == CEP_LENGTH else None
+
+
+def write_index(rows, path=None) -> int:
+    """
+    Write the index of `rows`, dicts with a `cep` and the address
+    fields, to `path`, and return how many records it has. Rows with an
+    invalid CEP are skipped; the last row of a CEP wins.
+    """
+    path = str(path or cep_settings()['INDEX_FILE'])
+    addresses = {}
+    for row in rows:
+        cep = normalize_cep(row.get('cep'))
+        if cep:
+            addresses[cep] = SEPARATOR.join(
+                (row.get(field) or '').strip().replace(SEPARATOR, ' ')
+                for field in ADDRESS_FIELDS).encode()
+
+    records, offset = [], 0
+    for cep in sorted(addresses):
+        length = len(addresses[cep])
+        records.append(RECORD.pack(cep.encode(), offset, length))
+        offset += length
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as index_file:
+            index_file.write(HEADER.pack(MAGIC, len(records)))
+            index_file.write(b''.join(records))
+            for cep in sorted(addresses):
+                index_file.write(addresses[cep])
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(records)
+
+
+class CepIndex:
+    """Read-only, memory-mapped CEP index, see the module docstring."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as index_file:
+            self.map = mmap.mmap(index_file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a CEP index.')
+        self.addresses_offset = HEADER.size + self.count * RECORD_SIZE
+
+    def __len__(self):
+        return self.count
+
+    def key(self, position: int) -> bytes:
+        """Return the CEP of the record at `position`."""
+        start = HEADER.size + position * RECORD_SIZE
+        return self.map[start:start + CEP_LENGTH]
+
+    def record(self, position: int) -> dict:
+        """Return the address of the record at `position`."""
+        cep, offset, length = RECORD.unpack_from(
+            self.map, HEADER.size + position * RECORD_SIZE)
+        start = self.addresses_offset + offset
+        fields = self.map[start:start + length].decode().split(SEPARATOR)
+        return {'cep': cep.decode(), **dict(zip(ADDRESS_FIELDS, fields))}
+
+    def bisect(self, key: bytes) -> int:
+        """Return the position of the first record not below `key`."""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def get(self, cep: str) -> dict | None:
+        """Return the address of `cep`, or None."""
+        key = cep.encode()
+        position = self.bisect(key)
+        if position < self.count and self.key(position) == key:
+            return self.record(position)
+        return None
+
+    def search(self, prefix: str, limit: int) -> list:
+        """Return the addresses of the first `limit` CEPs of `prefix`."""
+        key = prefix.encode()
+        position = self.bisect(key)
+        results = []
+        while position < self.count and len(results) < limit and \
+                self.key(position).startswith(key):
+            results.append(self.record(position))
+            position += 1
+        return results
+
+
+@functools.lru_cache(maxsize=4)
+def load_index(path: str) -> CepIndex:
+    """
+    Return the index mapped from `path`. A missing file raises
+    FileNotFoundError, which is not cached: the index is used once built.
+    """
+    return CepIndex(path)
+
+
+def get_index() -> CepIndex | None:
+    """Return the CEP index of this process, None when it is missing."""
+    path = str(cep_settings()['INDEX_FILE'])
+    try:
+        return load_index(path)
+    except FileNotFoundError:
+        if path not in _missing_paths:
+            _missing_paths.add(path)
+            logger.warning(
+                'CEP index %s not found, CEP lookups are disabled. Run '
+                '`manage.py build_cep_index` with a CEP dataset.', path)
+        return None
+
+
+def normalize_address(index: CepIndex, address, fields: dict) -> bool:
+    """
+    Normalize the CEP of `address` and fill in its fields from `index`,
+    `fields` mapping index fields to model fields. Return whether the
+    address changed; unknown CEPs are left alone.
+    """
+    cep = normalize_cep(getattr(address, fields['cep']))
+    found = index.get(cep) if cep else None
+    if found is None:
+        return False
+    changed = False
+    for name, attname in fields.items():
+        value, current = found[name], getattr(address, attname)
+        if name in BLANK_ONLY and current and current.strip():
+            continue
+        if value and current != value:
+            setattr(address, attname, value)
+            changed = True
+    return changed
+
+
+def normalize_addresses(model, fields: dict, batch_size=None,
+                        dry_run=False) -> tuple:
+    """
+    Normalize the addresses of `model` with a CEP, in batches of
+    `batch_size` rows. Return how many were checked, and changed.
+    """
+    index = get_index()
+    if index is None:
+        raise FileNotFoundError(cep_settings()['INDEX_FILE'])
+    batch_size = batch_size or cep_settings()['BATCH_SIZE']
+    queryset = model._default_manager.exclude(
+        **{f'{fields["cep"]}__isnull': True}).order_by('pk')
+    checked = changed = 0
+    last_pk = None
+    while True:
+        batch = queryset if last_pk is None else \
+            queryset.filter(pk__gt=last_pk)
+        with transaction.atomic():
+            addresses = list(batch.select_for_update()[:batch_size])
+            if not addresses:
+                break
+            updated = [address for address in addresses
+                       if normalize_address(index, address, fields)]
+            if updated and not dry_run:
+                model._default_manager.bulk_update(
+                    updated, list(fields.values()))
+        checked += len(addresses)
+        changed += len(updated)
+        last_pk = addresses[-1].pk
+    return checked, changed
+
+
+def address_models() -> list:
+    """Return the address models and their fields, see `cep_settings`."""
+    return [(apps.get_model(label), fields)
+            for label, fields in cep_settings()['MODELS'].items()]
@@ -0,0 +1,59 @@
+"""
+System checks of the deployment settings.
+"""
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+from core.batch import batch_settings
+from core.encryption import field_encryption_settings
+from core.server import worker_count
+
+
+@register('database', deploy=True)
+def check_connection_budget(app_configs, **kwargs):
+    """
+    Warn when the web processes may hold more connections than allowed.
+
+    Persistent connections are kept per thread, so each process holds up
+    to one connection per thread and database alias: its request threads
+    and the batch thread pool, see core.batch. The master closes its
+    connections before forking and workers open none outside these
+    threads, see core.warmup.
+    """
+    limit = getattr(settings, 'DB_MAX_CONNECTIONS', None)
+    if not limit:
+        return []
+    workers = worker_count()
+    pool = batch_settings()['MAX_WORKERS']
+    threads = settings.WEB_THREADS + (pool if pool > 1 else 0)
+    needed = workers * threads
+    if needed <= limit:
+        return []
+    return [Warning(
+        f'{workers} workers x {threads} threads (including the batch pool) '
+        f'may open {needed} connections per database, over '
+        f'DB_MAX_CONNECTIONS={limit}.',
+        hint="Lower WEB_CONCURRENCY, WEB_THREADS or BATCH['MAX_WORKERS'], "
+             'or put pgbouncer in front of the database and set '
+             'DB_PGBOUNCER=1.',
+        id='core.W001',
+    )]
+
+
+@register('security')
+def check_field_encryption_keys(app_configs, **kwargs):
+    """
+    Fail when the field encryption keys are not set outside DEBUG: keys
+    derived from the SECRET_KEY committed with the code protect nothing.
+    """
+    if settings.DEBUG:
+        return []
+    options = field_encryption_settings()
+    return [Error(
+        f"settings.FIELD_ENCRYPTION['{name}'] is not set.",
+        hint=f'Set the {variable} environment variable.',
+        id='core.E001',
+    ) for name, variable in (
+        ('KEYS', 'FIELD_ENCRYPTION_KEYS'),
+        ('BLIND_INDEX_KEY', 'FIELD_ENCRYPTION_BLIND_INDEX_KEY'),
+    ) if not options[name]]
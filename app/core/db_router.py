@@ -0,0 +1,215 @@
+"""
+Read replica database routing.
+
+`ReplicaRouter` sends every write to the primary (`default`) and reads of
+the apps in `settings.DATABASE_REPLICAS['APPS']` to the replicas, in
+round-robin, when the current context allows it:
+
+* `ReplicaRoutingMiddleware` allows replica reads for safe requests (GET,
+  HEAD, OPTIONS). A client that wrote is pinned to the primary for
+  `PIN_SECONDS`, so it reads its own writes. The pin is keyed by the
+  user id of the JWT (the client IP for anonymous requests), so it
+  survives token refreshes, and stored in the `CACHE` cache, which
+  every worker serving the client must share: a file cache shared by
+  the workers of a node by default, a shared backend across nodes.
+* `use_replica()` allows them outside of requests (exports, dashboards),
+  `use_primary()` forbids them within a block.
+* A write, or an open transaction on the primary, sends the remaining
+  reads of the context to the primary.
+
+Replicas are health checked with `SELECT 1` (on PostgreSQL, their
+replication lag against `MAX_LAG_SECONDS`) at most every
+`HEALTH_CHECK_INTERVAL` seconds. Unhealthy replicas are skipped, and reads
+fall back to the primary when none is healthy.
+"""
+import contextvars
+import hashlib
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils.connection import ConnectionDoesNotExist
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_KEY_PREFIX = 'replica-pin:'
+
+PG_LAG_SQL = (
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() '
+    'THEN 0 ELSE COALESCE(EXTRACT(EPOCH FROM '
+    'now() - pg_last_xact_replay_timestamp()), 0) END'
+)
+
+
+def replica_settings() -> dict:
+    """Return the replica settings with their defaults."""
+    return {
+        'ALIASES': [],
+        'APPS': ['core', 'pregnancy'],
+        'PIN_SECONDS': 5,
+        'CACHE': 'default',
+        'HEALTH_CHECK_INTERVAL': 10,
+        'MAX_LAG_SECONDS': 5,
+        **getattr(settings, 'DATABASE_REPLICAS', {}),
+    }
+
+
+class RoutingState:
+    """Whether reads of the current context may use a replica."""
+
+    def __init__(self, replica: bool):
+        self.replica = replica
+        self.wrote = False
+
+
+_state = contextvars.ContextVar('replica_routing', default=None)
+
+
+@contextmanager
+def use_replica():
+    """Allow replica reads within the block."""
+    token = _state.set(RoutingState(replica=True))
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Send every read within the block to the primary."""
+    token = _state.set(RoutingState(replica=False))
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+def check_replica(alias: str, max_lag=None) -> bool:
+    """Return whether the replica answers and is not lagging behind."""
+    try:
+        connection = connections[alias]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql' and max_lag is not None:
+                cursor.execute(PG_LAG_SQL)
+                lag = cursor.fetchone()[0]
+                if lag > max_lag:
+                    logger.warning('Replica %s is %.1fs behind.', alias, lag)
+                    return False
+            else:
+                cursor.execute('SELECT 1')
+    except (ConnectionDoesNotExist, DatabaseError) as exc:
+        logger.warning('Replica %s is unavailable: %s', alias, exc)
+        return False
+    return True
+
+
+class ReplicaPool:
+    """Round-robin over the healthy replicas."""
+
+    def __init__(self):
+        self._health = {}
+        self._counter = itertools.count()
+
+    def mark(self, alias: str, healthy: bool):
+        """Record the health of a replica until the next check."""
+        self._health[alias] = (healthy, time.monotonic())
+
+    def is_healthy(self, alias: str, options: dict) -> bool:
+        """Return the health of a replica, checking it when stale."""
+        state = self._health.get(alias)
+        if state is None or time.monotonic() - state[1] >= \
+                options['HEALTH_CHECK_INTERVAL']:
+            self.mark(alias, check_replica(alias, options['MAX_LAG_SECONDS']))
+            state = self._health[alias]
+        return state[0]
+
+    def choose(self, options: dict):
+        """Return the next healthy replica, or None."""
+        aliases = options['ALIASES']
+        if not aliases:
+            return None
+        start = next(self._counter)
+        for offset in range(len(aliases)):
+            alias = aliases[(start + offset) % len(aliases)]
+            if self.is_healthy(alias, options):
+                return alias
+        return None
+
+
+pool = ReplicaPool()
+
+
+class ReplicaRouter:
+    """Route safe reads to the replicas and writes to the primary."""
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return None
+        state = _state.get()
+        if state is None or not state.replica:
+            return DEFAULT_DB_ALIAS
+        options = replica_settings()
+        if model._meta.app_label not in options['APPS'] or \
+                connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return pool.choose(options) or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.replica = False
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replica_settings()['ALIASES']}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replica_settings()['ALIASES']:
+            return False
+        return None
+
+
+def pin_key(request) -> str:
+    """Return the cache key pinning the client of `request`."""
+    from core.authentication import request_user_id
+
+    user_id = request_user_id(request)
+    client = f'user:{user_id}' if user_id is not None else \
+        f'ip:{request.META.get("REMOTE_ADDR", "")}'
+    return PIN_KEY_PREFIX + hashlib.sha256(client.encode()).hexdigest()
+
+
+class ReplicaRoutingMiddleware:
+    """Allow replica reads for safe requests of clients that did not write."""
+
+    def __init__(self, get_response):
+        if not replica_settings()['ALIASES']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        options = replica_settings()
+        cache = caches[options['CACHE']]
+        key = pin_key(request)
+        state = RoutingState(
+            replica=request.method in SAFE_METHODS and not cache.get(key))
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            cache.set(key, True, options['PIN_SECONDS'])
+        return response
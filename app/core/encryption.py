@@ -0,0 +1,273 @@
+"""
+Encrypted model fields looked up through blind indexes.
+
+Personal identifiers (CPF, SUS card and NIS numbers) are stored
+encrypted with Fernet (AES-CBC and HMAC-SHA256), under the first key of
+`settings.FIELD_ENCRYPTION['KEYS']`; the other keys still decrypt, so
+keys can be rotated. Encryption is randomized, so equal values have
+different ciphertexts and the column itself can not be searched.
+
+The keys are independent of SECRET_KEY, so rotating it does not break
+lookups, and must be set outside DEBUG; `DEVELOPMENT_KEYS` derives them
+from SECRET_KEY for development only.
+
+Each `EncryptedCharField` therefore names a `BlindIndexField` holding
+the HMAC-SHA256 of its value under `BLIND_INDEX_KEY`, keyed per field so
+equal values of different fields do not match. The blind index column is
+unique and indexed, and `field=value` lookups are rewritten to a single
+probe of it, so `User.objects.get(cpf=...)` and logins work unchanged.
+Only `exact` and `isnull` lookups are supported.
+
+The encrypted column itself is never unique: its constraint would
+compare ciphertexts, which always differ. Serializers needing unique
+validation declare a `UniqueValidator`, whose lookup goes through the
+blind index.
+
+Rows written before encryption keep their plaintext value, with no
+blind index, until they are encrypted in batches by the data migrations
+of the encrypted fields, see `encrypt_rows`, or by `manage.py
+encrypt_identifiers`, e.g. after restoring an older backup. Meanwhile,
+with `PLAINTEXT_FALLBACK` (off by default), lookups also match rows
+without a blind index by their plaintext.
+
+`bulk_update()` and `QuerySet.update()` do not call `pre_save()`, so
+their callers must set the blind index themselves, see
+`BlindIndexField.pre_save`.
+"""
+import base64
+import functools
+import hashlib
+import hmac
+import math
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models, transaction
+from django.db.models import Lookup, Q
+
+ENCRYPTED_PREFIX = 'enc:'
+# Fernet version, timestamp, IV and HMAC around the AES-CBC blocks.
+FERNET_OVERHEAD = 1 + 8 + 16 + 32
+
+
+def derive_key(purpose: str) -> str:
+    """Return a Fernet key derived from SECRET_KEY for `purpose`."""
+    return base64.urlsafe_b64encode(hmac.new(
+        settings.SECRET_KEY.encode(), purpose.encode(),
+        hashlib.sha256).digest()).decode()
+
+
+def field_encryption_settings() -> dict:
+    """
+    Return the field encryption settings with their defaults. Keys must
+    be set, unless `DEVELOPMENT_KEYS` derives them from SECRET_KEY.
+    """
+    options = {
+        'KEYS': [],
+        'BLIND_INDEX_KEY': '',
+        'DEVELOPMENT_KEYS': False,
+        'PLAINTEXT_FALLBACK': False,
+        'BATCH_SIZE': 500,
+        **getattr(settings, 'FIELD_ENCRYPTION', {}),
+    }
+    if options['DEVELOPMENT_KEYS']:
+        options['KEYS'] = options['KEYS'] or [
+            derive_key('core.encryption.field')]
+        options['BLIND_INDEX_KEY'] = options['BLIND_INDEX_KEY'] or \
+            derive_key('core.encryption.blind-index')
+    return options
+
+
+def encryption_key(name: str):
+    """Return the key setting `name`, raising when it is not set."""
+    key = field_encryption_settings()[name]
+    if not key:
+        raise ImproperlyConfigured(
+            f"settings.FIELD_ENCRYPTION['{name}'] is not set, see "
+            'core.encryption.')
+    return key
+
+
+@functools.lru_cache(maxsize=4)
+def get_fernet(keys: tuple):
+    """Return the Fernet encrypting with the first of `keys`."""
+    from cryptography.fernet import Fernet, MultiFernet
+
+    return MultiFernet([Fernet(key) for key in keys])
+
+
+def encrypt(value: str) -> str:
+    """Return the stored, encrypted form of `value`."""
+    keys = tuple(encryption_key('KEYS'))
+    return ENCRYPTED_PREFIX + get_fernet(keys).encrypt(
+        value.encode()).decode()
+
+
+def decrypt(value: str) -> str:
+    """Return the value of a stored value, encrypted or not."""
+    if not value.startswith(ENCRYPTED_PREFIX):
+        return value
+    keys = tuple(encryption_key('KEYS'))
+    return get_fernet(keys).decrypt(
+        value[len(ENCRYPTED_PREFIX):].encode()).decode()
+
+
+def blind_index(purpose: str, value: str) -> str:
+    """Return the blind index of `value` in the field `purpose`."""
+    key = encryption_key('BLIND_INDEX_KEY')
+    return hmac.new(base64.urlsafe_b64decode(key),
+                    f'{purpose}\0{value}'.encode(),
+                    hashlib.sha256).hexdigest()
+
+
+def ciphertext_length(max_length: int) -> int:
+    """Return the stored length of a value of `max_length` characters."""
+    blocks = 4 * max_length // 16 + 1
+    return len(ENCRYPTED_PREFIX) + 4 * math.ceil(
+        (FERNET_OVERHEAD + 16 * blocks) / 3)
+
+
+class EncryptedCharField(models.CharField):
+    """
+    CharField stored encrypted, looked up through the BlindIndexField
+    named `blind_index`. `max_length` is the length of the value, the
+    column is sized for its ciphertext.
+    """
+
+    def __init__(self, *args, blind_index=None, **kwargs):
+        self.blind_index = blind_index
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['blind_index'] = self.blind_index
+        return name, path, args, kwargs
+
+    def db_type_parameters(self, connection):
+        parameters = super().db_type_parameters(connection)
+        parameters['max_length'] = ciphertext_length(self.max_length)
+        return parameters
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else decrypt(value)
+
+    def get_db_prep_save(self, value, connection):
+        if hasattr(value, 'as_sql'):
+            return value
+        value = self.get_prep_value(value)
+        return None if value is None else encrypt(value)
+
+    def get_index_field(self):
+        """Return the blind index field of this field."""
+        return self.model._meta.get_field(self.blind_index)
+
+    def get_lookup(self, lookup_name):
+        if lookup_name not in ('exact', 'isnull'):
+            return None
+        return super().get_lookup(lookup_name)
+
+
+@EncryptedCharField.register_lookup
+class BlindIndexExact(Lookup):
+    """`field=value` of an encrypted field, compared on its blind index."""
+    lookup_name = 'exact'
+
+    def as_sql(self, compiler, connection):
+        if hasattr(self.rhs, 'resolve_expression') or \
+                not hasattr(self.lhs, 'alias'):
+            raise ValueError(
+                'Encrypted fields can only be compared to a value.')
+        if self.rhs is None:
+            return compiler.compile(self.lhs.target.get_col(
+                self.lhs.alias).get_lookup('isnull')(self.lhs, True))
+        field = self.lhs.target
+        index_field = field.get_index_field()
+        index_sql, index_params = compiler.compile(
+            index_field.get_col(self.lhs.alias))
+        sql = f'{index_sql} = %s'
+        params = [*index_params, index_field.compute(self.rhs)]
+        if field_encryption_settings()['PLAINTEXT_FALLBACK']:
+            lhs_sql, lhs_params = compiler.compile(self.lhs)
+            sql = f'({sql} OR ({index_sql} IS NULL AND {lhs_sql} = %s))'
+            params += [*index_params, *lhs_params, self.rhs]
+        return sql, params
+
+
+class BlindIndexField(models.CharField):
+    """Unique HMAC of the value of the encrypted field `source`."""
+
+    def __init__(self, *args, source=None, **kwargs):
+        self.source = source
+        kwargs.setdefault('max_length', 64)
+        kwargs.setdefault('editable', False)
+        kwargs.setdefault('null', True)
+        kwargs.setdefault('unique', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['source'] = self.source
+        for option in ('max_length', 'editable', 'null', 'unique'):
+            kwargs.pop(option, None)
+        return name, path, args, kwargs
+
+    def compute(self, value):
+        """Return the blind index of the value `value`."""
+        return blind_index(f'{self.model._meta.label_lower}.{self.source}',
+                           str(value))
+
+    def pre_save(self, model_instance, add):
+        value = getattr(model_instance, self.source)
+        index = None if value is None else self.compute(value)
+        setattr(model_instance, self.attname, index)
+        return index
+
+
+def encrypted_fields(model) -> list:
+    """Return the encrypted fields of `model`."""
+    return [field for field in model._meta.concrete_fields
+            if isinstance(field, EncryptedCharField)]
+
+
+def encrypted_models() -> list:
+    """Return the models with encrypted fields."""
+    return [model for model in apps.get_models() if encrypted_fields(model)]
+
+
+def encrypt_batch(model, batch_size=None, using=None) -> int:
+    """
+    Encrypt up to `batch_size` rows of `model` stored in plaintext and
+    set their blind indexes, return how many.
+    """
+    if batch_size is None:
+        batch_size = field_encryption_settings()['BATCH_SIZE']
+    fields = encrypted_fields(model)
+    manager = model._default_manager.db_manager(using)
+    pending = Q()
+    for field in fields:
+        pending |= Q(**{f'{field.blind_index}__isnull': True,
+                        f'{field.name}__isnull': False})
+    with transaction.atomic(using=manager.db):
+        rows = list(manager.filter(pending).order_by(
+            'pk').select_for_update()[:batch_size])
+        for row in rows:
+            for field in fields:
+                field.get_index_field().pre_save(row, False)
+        manager.bulk_update(rows, [
+            name for field in fields for name in (
+                field.name, field.blind_index)])
+    return len(rows)
+
+
+def encrypt_rows(model_label: str):
+    """
+    Return the RunPython function of a data migration encrypting every
+    plaintext row of the model `model_label`.
+    """
+    def forwards(apps, schema_editor):
+        model = apps.get_model(model_label)
+        while encrypt_batch(model, using=schema_editor.connection.alias):
+            pass
+
+    return forwards
@@ -0,0 +1,172 @@
+"""
+Read-only serialization straight from `values_list()` rows.
+
+`ValuesSerializer` inspects a ModelSerializer once and builds the same
+representation from database rows, skipping model instances and the
+field-by-field `to_representation` machinery. Nested serializers are
+resolved with joined columns, so a list needs a single query.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import FileSystemStorage
+from django.utils.encoding import filepath_to_uri
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+# Fields whose representation is the value returned by the database.
+RAW_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.ReadOnlyField,
+)
+
+RAW = 'raw'
+FILE = 'file'
+NESTED = 'nested'
+CONVERT = 'convert'
+
+
+def storage_url(storage):
+    """
+    Return a callable giving the URL of a stored file name.
+
+    `FileSystemStorage.url` spends most of its time in `urljoin`, which is
+    a plain concatenation for the relative names generated by uploads.
+    """
+    if storage.__class__.url is not FileSystemStorage.url:
+        return storage.url
+
+    def url(name):
+        path = filepath_to_uri(name).lstrip('/')
+        base_url = storage.base_url
+        if '/.' in '/' + path or not base_url.endswith('/'):
+            return storage.url(name)
+        return base_url + path
+
+    return url
+
+
+class ValuesSerializer:
+    """Compiled, read-only version of a ModelSerializer."""
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self._lookups = None
+        self._plan = None
+
+    @property
+    def lookups(self) -> list:
+        """Return the `values_list()` lookups needed by the serializer."""
+        self._compile()
+        return self._lookups
+
+    def rows(self, queryset):
+        """Return `queryset` as the rows the serializer consumes."""
+        return queryset.values_list(*self.lookups)
+
+    def to_representation(self, row, context=None):
+        """Return the representation of a single row."""
+        self._compile()
+        request = (context or {}).get('request')
+        return self._build(self._plan, row, request)
+
+    def serialize_rows(self, rows, context=None) -> list:
+        """Return the representation of every row in `rows`."""
+        self._compile()
+        plan = self._plan
+        build = self._build
+        request = (context or {}).get('request')
+        return [build(plan, row, request) for row in rows]
+
+    def serialize(self, queryset, context=None) -> list:
+        """Return the representation of every object in `queryset`."""
+        return self.serialize_rows(self.rows(queryset), context)
+
+    def _compile(self):
+        """Build the lookups and the plan used to convert rows."""
+        if self._plan is not None:
+            return
+        self._lookups = []
+        self._plan = self._compile_serializer(self.serializer_class(), '')
+
+    def _add_lookup(self, lookup: str) -> int:
+        """Register `lookup` and return its index in the row."""
+        if lookup not in self._lookups:
+            self._lookups.append(lookup)
+        return self._lookups.index(lookup)
+
+    def _compile_serializer(self, serializer, prefix: str) -> tuple:
+        """Return the conversion plan for the readable fields."""
+        model = serializer.Meta.model
+        plan = []
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+            if field.source == '*' or '.' in field.source:
+                raise ImproperlyConfigured(
+                    f'{self.serializer_class.__name__}.{field.field_name} '
+                    'uses a source that can not be read from values().'
+                )
+            lookup = prefix + field.source
+
+            if isinstance(field, serializers.ListSerializer):
+                raise ImproperlyConfigured(
+                    f'{self.serializer_class.__name__}.{field.field_name} '
+                    'is a many=True serializer, which is not supported.'
+                )
+            if isinstance(field, serializers.ModelSerializer):
+                index = self._add_lookup(lookup)
+                nested = self._compile_serializer(field, lookup + '__')
+                plan.append((field.field_name, NESTED, index, nested))
+            elif isinstance(field, serializers.FileField):
+                index = self._add_lookup(lookup)
+                url_for = storage_url(
+                    model._meta.get_field(field.source).storage)
+                plan.append((field.field_name, FILE, index, (url_for, field)))
+            elif isinstance(field, RAW_FIELDS) or (
+                isinstance(field, serializers.PrimaryKeyRelatedField)
+                and field.pk_field is None
+            ):
+                index = self._add_lookup(lookup)
+                plan.append((field.field_name, RAW, index, None))
+            elif isinstance(field, serializers.SerializerMethodField) or (
+                isinstance(field, serializers.RelatedField)
+            ):
+                raise ImproperlyConfigured(
+                    f'{self.serializer_class.__name__}.{field.field_name} '
+                    'can not be built from values().'
+                )
+            else:
+                index = self._add_lookup(lookup)
+                plan.append(
+                    (field.field_name, CONVERT, index, field.to_representation)
+                )
+        return tuple(plan)
+
+    @classmethod
+    def _build(cls, plan, row, request) -> dict:
+        """Convert `row` into a representation following `plan`."""
+        data = {}
+        for name, kind, index, extra in plan:
+            value = row[index]
+            if kind is RAW or value is None:
+                data[name] = value
+            elif kind is NESTED:
+                data[name] = cls._build(extra, row, request)
+            elif kind is FILE:
+                data[name] = cls._file_url(value, request, *extra)
+            else:
+                data[name] = extra(value)
+        return data
+
+    @staticmethod
+    def _file_url(name, request, url_for, field):
+        """Mirror `FileField.to_representation` for a stored file name."""
+        if not name:
+            return None
+        if not getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+            return name
+        url = url_for(name)
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
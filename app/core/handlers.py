@@ -0,0 +1,95 @@
+"""
+WSGI handler routing API requests through a lean middleware stack.
+
+The API authenticates with JWT only, so sessions, CSRF, messages and
+clickjacking protection are dead weight on `api/` routes. Requests whose
+path starts with one of `settings.API_PATH_PREFIXES` run through
+`settings.API_MIDDLEWARE`; everything else (admin) keeps the full
+`settings.MIDDLEWARE` stack. The `/healthz` and `/readyz` probes of
+`core.health` are answered before any middleware runs.
+"""
+import django
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.exception import convert_exception_to_response
+from django.core.handlers.wsgi import WSGIHandler
+from django.utils.module_loading import import_string
+
+from core.health import PROBES, probe_response
+
+
+class MiddlewareStackHandler(BaseHandler):
+    """
+    Synchronous handler running an explicit list of middleware.
+    """
+
+    def __init__(self, middleware):
+        self.middleware = list(middleware)
+        self.load_middleware()
+
+    def load_middleware(self, is_async=False):
+        """
+        Populate the middleware lists from `self.middleware`.
+        """
+        if is_async:
+            raise ImproperlyConfigured(
+                'MiddlewareStackHandler only supports synchronous requests.')
+
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+
+        handler = convert_exception_to_response(self._get_response)
+        for middleware_path in reversed(self.middleware):
+            middleware = import_string(middleware_path)
+            if not getattr(middleware, 'sync_capable', True):
+                raise ImproperlyConfigured(
+                    f'Middleware {middleware_path} is not sync capable.')
+            try:
+                mw_instance = middleware(handler)
+            except MiddlewareNotUsed:
+                continue
+
+            if hasattr(mw_instance, 'process_view'):
+                self._view_middleware.insert(0, mw_instance.process_view)
+            if hasattr(mw_instance, 'process_template_response'):
+                self._template_response_middleware.append(
+                    mw_instance.process_template_response)
+            if hasattr(mw_instance, 'process_exception'):
+                self._exception_middleware.append(
+                    mw_instance.process_exception)
+
+            handler = convert_exception_to_response(mw_instance)
+
+        self._middleware_chain = handler
+
+
+class APIRoutingWSGIHandler(WSGIHandler):
+    """
+    WSGI handler sending API requests to a lean middleware stack.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.api_path_prefixes = tuple(settings.API_PATH_PREFIXES)
+        self.api_handler = MiddlewareStackHandler(settings.API_MIDDLEWARE)
+
+    def get_response(self, request):
+        """
+        Return the response, choosing the stack from the request path.
+        """
+        probe = PROBES.get(request.path_info)
+        if probe is not None:
+            return probe_response(probe)
+        if request.path_info.startswith(self.api_path_prefixes):
+            return self.api_handler.get_response(request)
+        return super().get_response(request)
+
+
+def get_wsgi_application():
+    """
+    Return the WSGI callable, like `django.core.wsgi`, with API routing.
+    """
+    django.setup(set_prefix=False)
+    return APIRoutingWSGIHandler()
@@ -0,0 +1,135 @@
+"""
+Database availability checks and the liveness/readiness probes.
+
+`/healthz` answers as long as the process serves requests. `/readyz`
+also requires the primary database to answer and every migration to be
+applied; replicas are reported but do not fail readiness since reads fall
+back to the primary. Both are served by `core.handlers` before any
+middleware, URL resolution or authentication runs. Probes are public, so
+database errors are logged and reported as `unavailable`.
+
+`wait_for_database()` backs the `wait_for_db` command: it retries with
+exponential backoff and jitter until the database answers or an overall
+deadline passes.
+"""
+import json
+import logging
+import random
+import time
+
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+_migrated = set()
+
+
+def check_database(alias: str = DEFAULT_DB_ALIAS):
+    """Return None when the database answers, the error otherwise."""
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+    except DatabaseError as exc:
+        connection.close_if_unusable_or_obsolete()
+        return exc
+    return None
+
+
+def pending_migrations(alias: str = DEFAULT_DB_ALIAS) -> list:
+    """Return the migrations not applied yet, as `app.name` strings."""
+    if alias in _migrated:
+        return []
+    executor = MigrationExecutor(connections[alias])
+    plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    pending = [f'{m.app_label}.{m.name}' for m, backwards in plan]
+    if not pending:
+        _migrated.add(alias)
+    return pending
+
+
+def wait_for_database(alias=DEFAULT_DB_ALIAS, timeout=60.0,
+                      initial_delay=0.1, max_delay=5.0, log=None):
+    """
+    Wait until the database answers, with exponential backoff.
+
+    Return the number of attempts, raise TimeoutError with the last error
+    once `timeout` seconds have passed.
+    """
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    attempt = 0
+    while True:
+        attempt += 1
+        error = check_database(alias)
+        if error is None:
+            return attempt
+        connections[alias].close()
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(
+                f'Database {alias!r} unavailable after {attempt} attempts: '
+                f'{error}')
+        sleep = min(delay * random.uniform(0.5, 1.0), remaining)
+        if log is not None:
+            log(f'Database {alias!r} unavailable, retrying in '
+                f'{sleep:.2f}s: {error}')
+        time.sleep(sleep)
+        delay = min(delay * 2, max_delay)
+
+
+def liveness():
+    """Return the status code and body of the liveness probe."""
+    return 200, {'status': 'ok'}
+
+
+def readiness():
+    """Return the status code and body of the readiness probe."""
+    checks = {}
+    ready = True
+    for alias in connections:
+        error = check_database(alias)
+        if error is None:
+            checks[f'database:{alias}'] = 'ok'
+            continue
+        logger.warning('Database %r unavailable: %s', alias, error)
+        checks[f'database:{alias}'] = 'unavailable'
+        if alias == DEFAULT_DB_ALIAS:
+            ready = False
+    if ready:
+        pending = pending_migrations()
+        checks['migrations'] = 'ok' if not pending else \
+            f'{len(pending)} pending'
+        ready = not pending
+    return (200 if ready else 503), {
+        'status': 'ok' if ready else 'unavailable',
+        'checks': checks,
+    }
+
+
+def probe_response(probe) -> HttpResponse:
+    """Run a probe and return its JSON response."""
+    status, body = probe()
+    response = HttpResponse(
+        json.dumps(body), status=status, content_type='application/json')
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+PROBES = {
+    '/healthz': liveness,
+    '/readyz': readiness,
+}
+
+
+def healthz_view(request):
+    """Liveness probe, for servers not using `core.handlers`."""
+    return probe_response(liveness)
+
+
+def readyz_view(request):
+    """Readiness probe, for servers not using `core.handlers`."""
+    return probe_response(readiness)
@@ -0,0 +1,199 @@
+"""
+`Idempotency-Key` support for unsafe API requests.
+
+Mobile clients on bad networks retry requests whose response they never
+received. When such a request carries an `Idempotency-Key` header and a
+valid JWT, `IdempotencyMiddleware` runs the view for the first request
+only and stores its response, zlib compressed, in `IdempotencyKey` for
+`settings.IDEMPOTENCY['TTL']` seconds. Retries with the same key and
+user get the stored response back, with an `Idempotent-Replayed: true`
+header, without running the view again.
+
+Keys are scoped per user and bound to a fingerprint of the request
+(method, path, content type and body, or body length for uploads): a key
+reused for another request gets `422`. The first request inserts its key
+before running the view, so a concurrent duplicate finds it and waits up
+to `WAIT` seconds for the response, then gets `409` to retry later. A
+key left in progress by a crashed worker is taken over after
+`LOCK_TIMEOUT` seconds.
+
+Server errors (5xx) and rate limits (429) are not stored, so the client
+can retry them with the same key. Expired keys are deleted by the
+`core.tasks.purge_idempotency_keys` task, queued every hour by the job
+workers (`settings.JOBS['PERIODIC']`).
+"""
+import hashlib
+import time
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from rest_framework.permissions import SAFE_METHODS
+
+from core.authentication import request_user_id
+from core.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+STORED_HEADERS = ('Content-Type', 'Location')
+NOT_STORED_STATUSES = (429,)
+
+
+def idempotency_settings() -> dict:
+    """Return the idempotency settings with their defaults."""
+    return {
+        'ENABLED': True,
+        'TTL': 24 * 60 * 60,
+        'LOCK_TIMEOUT': 60,
+        'WAIT': 10,
+        'MAX_KEY_LENGTH': 255,
+        'MAX_FINGERPRINT_BODY': 64 * 1024,
+        **getattr(settings, 'IDEMPOTENCY', {}),
+    }
+
+
+def key_hash(user_id, key: str) -> str:
+    """Return the stored hash of the key of a user."""
+    return hashlib.sha256(f'{user_id}:{key}'.encode()).hexdigest()
+
+
+def fingerprint(request, max_body: int) -> str:
+    """Return a hash identifying the request a key was sent with."""
+    digest = hashlib.sha256()
+    content_type = request.META.get('CONTENT_TYPE', '')
+    length = int(request.META.get('CONTENT_LENGTH') or 0)
+    for part in (request.method, request.get_full_path(), content_type):
+        digest.update(part.encode() + b'\0')
+    if length <= max_body and not content_type.startswith('multipart/'):
+        digest.update(request.body)
+    else:
+        # Reading an upload would defeat its streaming to disk.
+        digest.update(str(length).encode())
+    return digest.hexdigest()
+
+
+def acquire(key: str, request_fingerprint: str, options: dict):
+    """
+    Insert the key of a new request and return `(record, True)`, or
+    return the record of an earlier request with `False`.
+    """
+    now = timezone.now()
+    values = {
+        'fingerprint': request_fingerprint,
+        'status_code': None,
+        'headers': {},
+        'body': b'',
+        'created_at': now,
+        'expires_at': now + timedelta(seconds=options['TTL']),
+    }
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(key_hash=key, **values), True
+    except IntegrityError:
+        pass
+
+    record = IdempotencyKey.objects.filter(key_hash=key).first()
+    if record is None:
+        return acquire(key, request_fingerprint, options)
+    stale = record.status_code is None and record.created_at < now - \
+        timedelta(seconds=options['LOCK_TIMEOUT'])
+    if record.expires_at <= now or stale:
+        taken = IdempotencyKey.objects.filter(
+            pk=record.pk, created_at=record.created_at).update(**values)
+        if taken:
+            return IdempotencyKey(pk=record.pk, key_hash=key, **values), True
+    return record, False
+
+
+def wait_for_response(record, timeout: float):
+    """Return `record` once its response is stored, or None on timeout."""
+    deadline = time.monotonic() + timeout
+    delay = 0.05
+    while record.status_code is None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.5)
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+        if record is None:
+            return None
+    return record
+
+
+def replay(record) -> HttpResponse:
+    """Return the stored response of `record`."""
+    response = HttpResponse(
+        zlib.decompress(bytes(record.body)), status=record.status_code)
+    for header, value in record.headers.items():
+        response[header] = value
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def store(record, response):
+    """Store `response` for the retries of `record`, or drop the key."""
+    if response.streaming or response.status_code >= 500 or \
+            response.status_code in NOT_STORED_STATUSES:
+        IdempotencyKey.objects.filter(pk=record.pk).delete()
+        return
+    IdempotencyKey.objects.filter(pk=record.pk).update(
+        status_code=response.status_code,
+        headers={header: response[header] for header in STORED_HEADERS
+                 if header in response},
+        body=zlib.compress(response.content),
+    )
+
+
+class IdempotencyMiddleware:
+    """Replay the response of requests retried with an Idempotency-Key."""
+
+    def __init__(self, get_response):
+        if not idempotency_settings()['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        key = request.META.get(IDEMPOTENCY_HEADER)
+        if not key or request.method in SAFE_METHODS:
+            return self.get_response(request)
+        options = idempotency_settings()
+        if len(key) > options['MAX_KEY_LENGTH']:
+            return JsonResponse(
+                {'detail': 'The Idempotency-Key header is too long.'},
+                status=400)
+        user_id = request_user_id(request)
+        if user_id is None:
+            return self.get_response(request)
+
+        request_fingerprint = fingerprint(
+            request, options['MAX_FINGERPRINT_BODY'])
+        record, created = acquire(
+            key_hash(user_id, key), request_fingerprint, options)
+        if not created:
+            if record.fingerprint != request_fingerprint:
+                return JsonResponse(
+                    {'detail': 'The Idempotency-Key was used for another '
+                               'request.'},
+                    status=422)
+            stored = wait_for_response(record, options['WAIT'])
+            if stored is None:
+                response = JsonResponse(
+                    {'detail': 'A request with this Idempotency-Key is in '
+                               'progress.'},
+                    status=409)
+                response['Retry-After'] = '1'
+                return response
+            return replay(stored)
+
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            IdempotencyKey.objects.filter(pk=record.pk).delete()
+            raise
+        store(record, response)
+        return response
@@ -0,0 +1,239 @@
+"""
+Bounded validation of uploaded images.
+
+Decoding an image costs memory and CPU proportional to its pixel count,
+not to its file size: a few kilobytes of PNG can expand to gigabytes.
+`validate_image` therefore works in stages, each bounded by
+`settings.IMAGES`:
+
+1. the byte size is checked against `MAX_BYTES`. `MaxSizeUploadHandler`
+   stops buffering multipart files past that size, and files past
+   `settings.FILE_UPLOAD_MAX_MEMORY_SIZE` are streamed to temporary files
+   instead of memory;
+2. the header is parsed lazily with Pillow, without decoding any pixel,
+   and the format, dimensions and pixel count are checked against
+   `FORMATS`, `MAX_DIMENSION` and `MAX_PIXELS`;
+3. the image is verified and fully decoded by one of up to `WORKERS`
+   decoder processes, each limited to `MAX_MEMORY` bytes of address
+   space, within `TIMEOUT` seconds. A decoder that times out or dies is
+   killed and replaced, so a decoding bomb can not keep a web worker
+   busy, and the images other decoders are working on are unaffected.
+"""
+import io
+import queue
+import threading
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+# Idle decoders of the process, and the number of decoders it may run.
+_decoders = queue.LifoQueue()
+_slots = None
+_slots_lock = threading.Lock()
+
+
+class ImageError(Exception):
+    """The image is not acceptable."""
+
+
+def images_settings() -> dict:
+    """Return the image validation settings with their defaults."""
+    return {
+        'FORMATS': ('JPEG', 'PNG', 'WEBP'),
+        'MAX_BYTES': 5 * 1024 * 1024,
+        'MAX_DIMENSION': 8000,
+        'MAX_PIXELS': 24_000_000,
+        'WORKERS': 2,
+        'TIMEOUT': 5,
+        'MAX_MEMORY': 512 * 1024 * 1024,
+        **getattr(settings, 'IMAGES', {}),
+    }
+
+
+class MaxSizeUploadHandler(FileUploadHandler):
+    """
+    Stop passing the data of a file past `IMAGES['MAX_BYTES']` to the
+    next upload handlers. Such files are replaced with an empty file of
+    the received size, which validation rejects.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.limit = images_settings()['MAX_BYTES']
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        return raw_data if self.received <= self.limit else None
+
+    def file_complete(self, file_size):
+        if self.received <= self.limit:
+            return None
+        return UploadedFile(
+            io.BytesIO(), name=self.file_name, size=self.received,
+            content_type=self.content_type, charset=self.charset,
+            content_type_extra=self.content_type_extra)
+
+
+def limit_memory(max_memory):
+    """Limit the address space of a decoding process."""
+    try:
+        import resource
+    except ImportError:
+        return
+    if max_memory:
+        resource.setrlimit(resource.RLIMIT_AS, (max_memory, max_memory))
+
+
+def decode_image(source, max_pixels: int) -> tuple:
+    """Verify and decode an image, return its format and size."""
+    from PIL import Image
+
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    try:
+        with Image.open(source) as image:
+            image.verify()
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        with Image.open(source) as image:
+            image.load()
+            return image.format, image.size
+    except Exception as exc:
+        raise ImageError(f'The image can not be decoded: {exc}') from None
+
+
+def serve_decoder(connection, max_memory):
+    """Decode the images received on `connection` until it closes."""
+    limit_memory(max_memory)
+    while True:
+        try:
+            source, max_pixels = connection.recv()
+        except EOFError:
+            return
+        try:
+            connection.send((None, decode_image(source, max_pixels)))
+        except ImageError as exc:
+            connection.send((str(exc), None))
+
+
+class Decoder:
+    """A decoding process, serving one image at a time over a pipe."""
+
+    def __init__(self, max_memory):
+        context = get_context('spawn')
+        self.connection, child = context.Pipe()
+        self.process = context.Process(
+            target=serve_decoder, args=(child, max_memory), daemon=True)
+        self.process.start()
+        child.close()
+
+    @property
+    def alive(self) -> bool:
+        return not self.connection.closed and self.process.is_alive()
+
+    def decode(self, source, max_pixels: int, timeout: float) -> tuple:
+        """
+        Return the format and size of an image, raising ImageError. The
+        process is killed when it does not answer within `timeout`.
+        """
+        try:
+            self.connection.send((source, max_pixels))
+            if not self.connection.poll(timeout):
+                self.kill()
+                raise ImageError('The image took too long to decode.')
+            error, result = self.connection.recv()
+        except (EOFError, OSError):
+            self.kill()
+            raise ImageError('The image could not be decoded.')
+        if error:
+            raise ImageError(error)
+        return result
+
+    def kill(self):
+        """Kill the process."""
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+def get_slots() -> threading.BoundedSemaphore:
+    """Return the semaphore bounding the decoders to `WORKERS`."""
+    global _slots
+    with _slots_lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(images_settings()['WORKERS'])
+        return _slots
+
+
+def decode(source) -> tuple:
+    """Decode `source` in an idle decoder, starting one if needed."""
+    options = images_settings()
+    slots = get_slots()
+    if not slots.acquire(timeout=options['TIMEOUT']):
+        raise ImageError('Too many images are being decoded, try again.')
+    try:
+        try:
+            decoder = _decoders.get_nowait()
+        except queue.Empty:
+            decoder = Decoder(options['MAX_MEMORY'])
+        try:
+            return decoder.decode(
+                source, options['MAX_PIXELS'], options['TIMEOUT'])
+        finally:
+            if decoder.alive:
+                _decoders.put(decoder)
+    finally:
+        slots.release()
+
+
+def inspect_image(file) -> tuple:
+    """Return the format and size of an image from its header."""
+    from PIL import Image, UnidentifiedImageError
+
+    options = images_settings()
+    file.seek(0)
+    try:
+        with Image.open(file, formats=options['FORMATS']) as image:
+            image_format, (width, height) = image.format, image.size
+    except (UnidentifiedImageError, Image.DecompressionBombError):
+        raise ImageError(
+            'Upload a valid image. The file you uploaded was either not an '
+            'image or a corrupted image.')
+    except (OSError, SyntaxError, ValueError) as exc:
+        raise ImageError(f'The image header is invalid: {exc}')
+    finally:
+        file.seek(0)
+
+    if max(width, height) > options['MAX_DIMENSION']:
+        raise ImageError(
+            f'The image is {width}x{height} pixels, the maximum is '
+            f'{options["MAX_DIMENSION"]} pixels wide or high.')
+    if width * height > options['MAX_PIXELS']:
+        raise ImageError(
+            f'The image has {width * height} pixels, the maximum is '
+            f'{options["MAX_PIXELS"]}.')
+    return image_format, (width, height)
+
+
+def validate_image(file) -> tuple:
+    """
+    Check the size, header and content of an image file, return its
+    format and size, raising ImageError.
+    """
+    options = images_settings()
+    if file.size is not None and file.size > options['MAX_BYTES']:
+        raise ImageError(
+            f'The file has {file.size} bytes, the maximum is '
+            f'{options["MAX_BYTES"]}.')
+    inspect_image(file)
+
+    if hasattr(file, 'temporary_file_path'):
+        source = file.temporary_file_path()
+    else:
+        source = file.read(options['MAX_BYTES'] + 1)
+        file.seek(0)
+    return decode(source)
@@ -0,0 +1,35 @@
+"""
+Django command to build the CEP index from an offline CEP dataset.
+"""
+import csv
+
+from django.core.management.base import BaseCommand
+
+from core.cep import write_index
+
+
+class Command(BaseCommand):
+    """Build the memory-mapped CEP index read by core.cep."""
+    help = 'Build the CEP index from a CSV file with cep, street, ' \
+        'neighborhood, city and state columns.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='CSV file of the CEP dataset.')
+        parser.add_argument(
+            '--file',
+            help='Output file, defaults to settings.CEP["INDEX_FILE"].',
+        )
+        parser.add_argument(
+            '--delimiter', default=',',
+            help='CSV delimiter, `;` for most public CEP datasets.',
+        )
+        parser.add_argument('--encoding', default='utf-8')
+
+    def handle(self, *args, **options):
+        with open(options['source'], newline='',
+                  encoding=options['encoding']) as source:
+            count = write_index(
+                csv.DictReader(source, delimiter=options['delimiter']),
+                options['file'])
+        self.stdout.write(self.style.SUCCESS(f'CEP index of {count} CEPs '
+                                             'written.'))
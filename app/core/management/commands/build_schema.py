@@ -0,0 +1,22 @@
+"""
+Django command to precompute the OpenAPI schema.
+"""
+from django.core.management.base import BaseCommand
+
+from core.schema import write_schema
+
+
+class Command(BaseCommand):
+    """Generate the OpenAPI schema file served by `api/schema/`."""
+    help = 'Generate the OpenAPI schema file served by api/schema/.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            help='Output file, defaults to settings.OPENAPI_SCHEMA_FILE.',
+        )
+
+    def handle(self, *args, **options):
+        path = write_schema(options['file'])
+        self.stdout.write(
+            self.style.SUCCESS(f'OpenAPI schema written to {path}'))
@@ -0,0 +1,42 @@
+"""
+Django command to encrypt the identifiers stored in plaintext.
+"""
+from django.core.management.base import BaseCommand
+
+from core.encryption import (
+    encrypt_batch,
+    encrypted_models,
+    field_encryption_settings,
+)
+from core.tasks import encrypt_identifiers
+
+
+class Command(BaseCommand):
+    """Encrypt plaintext rows of encrypted fields in batches."""
+    help = 'Encrypt the rows written before encryption, see core.encryption.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=field_encryption_settings()['BATCH_SIZE'],
+            help='Rows encrypted per transaction.',
+        )
+        parser.add_argument(
+            '--background', action='store_true',
+            help='Queue a job encrypting the rows batch after batch.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if options['background']:
+            job = encrypt_identifiers.enqueue({'batch_size': batch_size})
+            self.stdout.write(self.style.SUCCESS(f'Queued job {job.pk}.'))
+            return
+
+        for model in encrypted_models():
+            total = 0
+            while count := encrypt_batch(model, batch_size):
+                total += count
+                self.stdout.write(f'{model._meta.label}: {total} rows')
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.label}: {total} rows encrypted.'))
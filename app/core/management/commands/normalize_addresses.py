@@ -0,0 +1,46 @@
+"""
+Django command to normalize the addresses with the CEP index.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.cep import address_models, cep_settings, normalize_addresses
+from core.tasks import normalize_cep_addresses
+
+
+class Command(BaseCommand):
+    """Normalize the CEP of addresses and fill them in from the index."""
+    help = 'Normalize the CEP, street, city and state of addresses, see ' \
+        'core.cep.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=cep_settings()['BATCH_SIZE'],
+            help='Addresses updated per transaction.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Count the addresses that would change, change nothing.',
+        )
+        parser.add_argument(
+            '--background', action='store_true',
+            help='Queue a job normalizing the addresses.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if options['background']:
+            job = normalize_cep_addresses.enqueue({'batch_size': batch_size})
+            self.stdout.write(self.style.SUCCESS(f'Queued job {job.pk}.'))
+            return
+
+        for model, fields in address_models():
+            try:
+                checked, changed = normalize_addresses(
+                    model, fields, batch_size, dry_run=options['dry_run'])
+            except FileNotFoundError as exc:
+                raise CommandError(f'CEP index {exc} not found, run '
+                                   '`manage.py build_cep_index`.')
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.label}: {changed} of {checked} addresses '
+                f'{"to normalize" if options["dry_run"] else "normalized"}.'))
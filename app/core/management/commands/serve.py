@@ -0,0 +1,42 @@
+"""
+Django command to run the production server.
+"""
+from django.core.management.base import BaseCommand
+
+from core import server
+
+
+class Command(BaseCommand):
+    """Serve the application with preloaded, warmed up gunicorn workers."""
+    help = 'Run the production server, see core.server.'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bind', help='Address to listen on, defaults to WEB_BIND.')
+        parser.add_argument(
+            '--workers', type=int,
+            help='Worker processes, defaults to 2 x CPUs + 1.')
+        parser.add_argument(
+            '--threads', type=int,
+            help='Threads per worker, defaults to WEB_THREADS.')
+        parser.add_argument(
+            '--timeout', type=int,
+            help='Seconds before a silent worker is restarted.')
+        parser.add_argument(
+            '--max-requests', type=int,
+            help='Restart workers after this many requests.')
+        parser.add_argument(
+            '--no-warmup', action='store_false', dest='warmup',
+            help='Skip the warmup before forking the workers.')
+
+    def handle(self, *args, **options):
+        overrides = {
+            key: options[key]
+            for key in ('bind', 'workers', 'threads', 'timeout',
+                        'max_requests')
+            if options[key] is not None
+        }
+        if 'max_requests' in overrides:
+            overrides['max_requests_jitter'] = overrides['max_requests'] // 10
+        server.run(warm=options['warmup'], **overrides)
@@ -0,0 +1,33 @@
+"""
+Django command to copy the primary SQLite database to its replicas.
+"""
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.db_router import replica_settings
+
+
+class Command(BaseCommand):
+    """Refresh SQLite replicas from the primary for local testing."""
+    help = 'Copy the primary SQLite database to the replica databases.'
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError(
+                'Replicas are only synced for SQLite, other databases '
+                'replicate on the server.')
+        aliases = replica_settings()['ALIASES']
+        if not aliases:
+            raise CommandError('No replicas configured, set DB_REPLICAS.')
+
+        primary.ensure_connection()
+        for alias in aliases:
+            replica = sqlite3.connect(connections[alias].settings_dict['NAME'])
+            try:
+                primary.connection.backup(replica)
+            finally:
+                replica.close()
+            self.stdout.write(self.style.SUCCESS(f'Synced {alias}'))
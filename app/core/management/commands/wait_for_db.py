@@ -0,0 +1,48 @@
+"""
+Django command to wait for the database to be available.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from core.health import pending_migrations, wait_for_database
+
+
+class Command(BaseCommand):
+    """Wait for the database with exponential backoff and a deadline."""
+    help = 'Wait until the database accepts connections.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database alias to wait for.',
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=60.0,
+            help='Seconds to wait before giving up.',
+        )
+        parser.add_argument(
+            '--max-delay', type=float, default=5.0,
+            help='Longest pause between two attempts, in seconds.',
+        )
+        parser.add_argument(
+            '--check-migrations', action='store_true',
+            help='Also fail when migrations are not applied.',
+        )
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        try:
+            attempts = wait_for_database(
+                alias, timeout=options['timeout'],
+                max_delay=options['max_delay'], log=self.stdout.write)
+        except TimeoutError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f'Database {alias!r} available after {attempts} attempt(s).'))
+
+        if options['check_migrations']:
+            pending = pending_migrations(alias)
+            if pending:
+                raise CommandError(
+                    'Unapplied migrations: ' + ', '.join(pending))
+            self.stdout.write(self.style.SUCCESS('Migrations applied.'))
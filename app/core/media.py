@@ -0,0 +1,251 @@
+"""
+Serving of user uploaded media under `settings.MEDIA_URL`.
+
+`serve_media` replaces `django.views.static.serve`, which only runs with
+`DEBUG`. It answers conditional requests (`ETag`, `If-None-Match`,
+`If-Modified-Since`) with `304`, single `Range` requests with `206` and
+marks uploaded images, whose names are random UUIDs never reused for
+other content, as immutable so clients and CDNs cache them for a year.
+
+Files are private unless known to be public, which only the current
+image of a user is. Profile images are only served to the user owning
+the profile and to staff, any other file (replaced images, images of
+deleted users, pending uploads) only to staff; users are authenticated
+with a JWT `Authorization` header or the admin session. Private files
+are never cached by shared caches.
+
+With `settings.MEDIA['SENDFILE']` set, access checks and conditional
+requests still run here but the bytes are sent by the front server:
+
+* `'x-sendfile'` (Apache mod_xsendfile, lighttpd) sends the absolute
+  path of the file in an `X-Sendfile` header;
+* `'x-accel-redirect'` (nginx) sends `ACCEL_PREFIX` + the name in an
+  `X-Accel-Redirect` header, the prefix being an `internal` location
+  aliased to `MEDIA_ROOT`.
+
+The front server then handles range requests itself.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    StreamingHttpResponse,
+)
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import AuthenticationFailed
+
+from core.authentication import JWTAuthentication
+from core.uploads import CHUNK_SIZE
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+IMMUTABLE_NAME_RE = re.compile(
+    r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}'
+    r'\.[0-9a-z]+$')
+# Owner of the files anyone may read, see `media_owner`.
+PUBLIC = 'public'
+
+
+def media_settings() -> dict:
+    """Return the media serving settings with their defaults."""
+    return {
+        'SENDFILE': None,
+        'ACCEL_PREFIX': '/protected-media/',
+        'IMMUTABLE_MAX_AGE': 365 * 24 * 60 * 60,
+        'MAX_AGE': 60 * 60,
+        'PRIVATE_MAX_AGE': 5 * 60,
+        **getattr(settings, 'MEDIA', {}),
+    }
+
+
+def is_immutable(name: str) -> bool:
+    """Return whether `name` is a generated upload name."""
+    return bool(IMMUTABLE_NAME_RE.match(os.path.basename(name)))
+
+
+def media_owner(name: str):
+    """
+    Return `PUBLIC` for the current image of a user, the id of the user
+    owning a profile image, or None for any other file.
+    """
+    from core.models import User, UserProfile
+
+    if User.objects.filter(image=name).exists():
+        return PUBLIC
+    owners = UserProfile.objects.filter(
+        image=name, user__isnull=False).values_list('user_id', flat=True)
+    for owner in owners[:1]:
+        return owner
+    return None
+
+
+def request_user(request):
+    """Return the user of the session or of the JWT of `request`."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return authenticated[0] if authenticated else None
+
+
+def can_access(request, owner) -> bool:
+    """Return whether the user of `request` may read a file of `owner`."""
+    if owner == PUBLIC:
+        return True
+    user = request_user(request)
+    return user is not None and (
+        user.is_staff or (owner is not None and user.pk == owner))
+
+
+def etag(stat) -> str:
+    """Return the ETag of a file from its modification time and size."""
+    return f'"{int(stat.st_mtime_ns):x}-{stat.st_size:x}"'
+
+
+def parse_range(header: str, size: int):
+    """
+    Return the `(start, end)` bytes of a single range `Range` header, end
+    included, or None to serve the whole file.
+
+    Raise ValueError for a range outside of the file.
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or not (match[1] or match[2]):
+        return None
+    if not match[1]:
+        length = int(match[2])
+        if not length:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(match[1])
+    end = int(match[2]) if match[2] else size - 1
+    if start > end or start >= size:
+        raise ValueError(header)
+    return start, min(end, size - 1)
+
+
+def if_range_matches(request, tag: str, mtime: float) -> bool:
+    """Return whether the `If-Range` precondition of `request` holds."""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == tag
+    return parse_http_date_safe(if_range) == int(mtime)
+
+
+def iter_range(file, start: int, length: int):
+    """Yield `length` bytes of `file` from `start` and close it."""
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def sendfile_response(name: str, path: str, backend: str) -> HttpResponse:
+    """Return an empty response telling the front server to send `path`."""
+    response = HttpResponse()
+    if backend == 'x-sendfile':
+        response['X-Sendfile'] = path
+    elif backend == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = (
+            media_settings()['ACCEL_PREFIX'].rstrip('/') + '/' + name)
+    else:
+        raise ValueError(f'Unknown MEDIA SENDFILE backend {backend!r}.')
+    # Let the front server pick the content type from the file.
+    del response['Content-Type']
+    return response
+
+
+def file_response(request, path: str, stat):
+    """Return a full or partial response of the file at `path`."""
+    byte_range = None
+    header = request.META.get('HTTP_RANGE')
+    if header and if_range_matches(request, etag(stat), stat.st_mtime):
+        try:
+            byte_range = parse_range(header, stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'))
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            iter_range(open(path, 'rb'), start, end - start + 1),
+            status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Content-Length'] = end - start + 1
+    content_type, encoding = mimetypes.guess_type(path)
+    response['Content-Type'] = content_type or 'application/octet-stream'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
+
+
+def cache_headers(response, name: str, private: bool):
+    """Set the caching headers of a media response."""
+    options = media_settings()
+    if private:
+        patch_cache_control(
+            response, private=True, max_age=options['PRIVATE_MAX_AGE'])
+        response['Vary'] = 'Authorization, Cookie'
+    elif is_immutable(name):
+        patch_cache_control(
+            response, public=True, immutable=True,
+            max_age=options['IMMUTABLE_MAX_AGE'])
+    else:
+        patch_cache_control(response, public=True, max_age=options['MAX_AGE'])
+
+
+@require_safe
+def serve_media(request, path):
+    """Serve the media file `path` of the default storage."""
+    name = os.path.normpath(path).replace(os.sep, '/')
+    if name.startswith(('.', '/')):
+        raise Http404('Invalid media path.')
+    try:
+        full_path = default_storage.path(name)
+        stat = os.stat(full_path)
+    except (NotImplementedError, OSError, ValueError):
+        raise Http404('Media file not found.')
+    if not os.path.isfile(full_path):
+        raise Http404('Media file not found.')
+
+    owner = media_owner(name)
+    if not can_access(request, owner):
+        # Do not tell others that the file exists.
+        raise Http404('Media file not found.')
+
+    tag = etag(stat)
+    response = get_conditional_response(
+        request, etag=tag, last_modified=int(stat.st_mtime))
+    if response is None:
+        backend = media_settings()['SENDFILE']
+        if backend:
+            response = sendfile_response(name, full_path, backend)
+        else:
+            response = file_response(request, full_path, stat)
+    response['ETag'] = tag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Accept-Ranges'] = 'bytes'
+    cache_headers(response, name, owner != PUBLIC)
+    return response
@@ -0,0 +1,336 @@
+"""
+Per-route request metrics exposed in the Prometheus text format.
+
+`MetricsMiddleware` records, for each resolved URL name, the latency,
+the number and time of SQL queries, the response size and the status.
+Values are aggregated in process; when `settings.METRICS_DIR` is set each
+worker process periodically writes a snapshot there and `metrics_view`
+merges the snapshots of every worker, so any worker can be scraped. The
+server deletes the snapshot of a worker once it exits, and those of dead
+processes when it starts, see core.server.
+
+Methods outside the HTTP standard are labelled `other`, so clients can
+not create series at will. `metrics_view` requires the
+`settings.METRICS_TOKEN` bearer token, or without one a local client.
+"""
+import bisect
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# name: (type, help, label names, buckets)
+METRICS = {
+    'http_requests_total': (
+        'counter', 'Total HTTP requests.',
+        ('route', 'method', 'status'), None),
+    'http_request_duration_seconds': (
+        'histogram', 'HTTP request latency in seconds.',
+        ('route', 'method'), LATENCY_BUCKETS),
+    'http_response_size_bytes': (
+        'histogram', 'HTTP response body size in bytes.',
+        ('route', 'method'), SIZE_BUCKETS),
+    'http_request_db_queries': (
+        'histogram', 'SQL queries executed per HTTP request.',
+        ('route', 'method'), QUERY_COUNT_BUCKETS),
+    'db_query_duration_seconds_total': (
+        'counter', 'Total time spent running SQL queries.',
+        ('route', 'method'), None),
+    'jwt_verify_cache_total': (
+        'counter', 'Lookups of the verified token cache.',
+        ('result',), None),
+    'jwt_verify_cache_evictions_total': (
+        'counter', 'Unexpired tokens evicted from the verified token cache.',
+        (), None),
+}
+
+UNRESOLVED_ROUTE = '<unresolved>'
+KNOWN_METHODS = frozenset((
+    'CONNECT', 'DELETE', 'GET', 'HEAD', 'OPTIONS', 'PATCH', 'POST', 'PUT',
+    'TRACE'))
+OTHER_METHOD = 'other'
+LOCAL_ADDRESSES = frozenset(('127.0.0.1', '::1'))
+SNAPSHOT_RE = re.compile(r'^metrics-([0-9]+)\.json$')
+
+
+class MetricsRegistry:
+    """Thread safe, in-process store of counters and histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """Drop every recorded value."""
+        with self._lock:
+            self.pid = os.getpid()
+            self.values = {name: {} for name in METRICS}
+            self.last_flush = time.monotonic()
+
+    def _check_pid(self):
+        """Reset values inherited from the parent after a fork."""
+        if self.pid != os.getpid():
+            self.clear()
+
+    def inc(self, name: str, labels: tuple, value=1):
+        """Increment a counter."""
+        self._check_pid()
+        series = self.values[name]
+        with self._lock:
+            series[labels] = series.get(labels, 0) + value
+
+    def observe(self, name: str, labels: tuple, value):
+        """Record a value in a histogram."""
+        self._check_pid()
+        buckets = METRICS[name][3]
+        series = self.values[name]
+        with self._lock:
+            data = series.get(labels)
+            if data is None:
+                data = series[labels] = [[0] * (len(buckets) + 1), 0]
+            data[0][bisect.bisect_left(buckets, value)] += 1
+            data[1] += value
+
+    def snapshot(self) -> dict:
+        """Return the values as a JSON serializable dict."""
+        self._check_pid()
+        with self._lock:
+            return {
+                name: [
+                    [list(labels), value if METRICS[name][0] == 'counter'
+                     else [list(value[0]), value[1]]]
+                    for labels, value in series.items()
+                ]
+                for name, series in self.values.items()
+            }
+
+    def flush(self, directory=None):
+        """Write this process snapshot to `directory`, atomically."""
+        directory = directory or settings.METRICS_DIR
+        self.last_flush = time.monotonic()
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as snapshot_file:
+            json.dump(self.snapshot(), snapshot_file)
+        os.replace(
+            tmp_path, os.path.join(directory, f'metrics-{self.pid}.json'))
+
+    def maybe_flush(self):
+        """Flush when the configured interval has elapsed."""
+        interval = settings.METRICS_FLUSH_INTERVAL
+        if settings.METRICS_DIR and (
+                time.monotonic() - self.last_flush >= interval):
+            self.flush()
+
+
+registry = MetricsRegistry()
+
+
+def merge_snapshots(snapshots) -> dict:
+    """Sum the snapshots of several processes."""
+    merged = {name: {} for name in METRICS}
+    for snapshot in snapshots:
+        for name, series in snapshot.items():
+            if name not in merged:
+                continue
+            target = merged[name]
+            for labels, value in series:
+                labels = tuple(labels)
+                if METRICS[name][0] == 'counter':
+                    target[labels] = target.get(labels, 0) + value
+                    continue
+                counts, total = target.get(
+                    labels, [[0] * len(value[0]), 0])
+                target[labels] = [
+                    [a + b for a, b in zip(counts, value[0])],
+                    total + value[1],
+                ]
+    return merged
+
+
+def collect() -> dict:
+    """Return the merged values of every worker process."""
+    directory = settings.METRICS_DIR
+    if not directory:
+        return merge_snapshots([registry.snapshot()])
+
+    registry.flush(directory)
+    snapshots = []
+    for filename in os.listdir(directory):
+        if not filename.startswith('metrics-') or \
+                not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as snapshot_file:
+                snapshots.append(json.load(snapshot_file))
+        except (OSError, ValueError):
+            continue
+    return merge_snapshots(snapshots)
+
+
+def remove_snapshot(pid: int, directory=None):
+    """Delete the snapshot of the process `pid`, once it exited."""
+    directory = directory or settings.METRICS_DIR
+    if not directory:
+        return
+    try:
+        os.remove(os.path.join(directory, f'metrics-{pid}.json'))
+    except FileNotFoundError:
+        pass
+
+
+def is_running(pid: int) -> bool:
+    """Return whether the process `pid` is running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def remove_dead_snapshots(directory=None) -> int:
+    """Delete the snapshots of processes not running, return how many."""
+    directory = directory or settings.METRICS_DIR
+    if not directory or not os.path.isdir(directory):
+        return 0
+    removed = 0
+    for filename in os.listdir(directory):
+        match = SNAPSHOT_RE.match(filename)
+        if match and not is_running(int(match.group(1))):
+            remove_snapshot(int(match.group(1)), directory)
+            removed += 1
+    return removed
+
+
+def _escape(value) -> str:
+    """Escape a label value."""
+    return (
+        str(value).replace('\\', '\\\\').replace('\n', '\\n')
+        .replace('"', '\\"')
+    )
+
+
+def _labels(names, values, extra='') -> str:
+    """Format a label set."""
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def render_prometheus(values: dict) -> str:
+    """Render merged values in the Prometheus text format."""
+    lines = []
+    for name, (kind, help_text, label_names, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(values.get(name, {}).items()):
+            if kind == 'counter':
+                lines.append(f'{name}{_labels(label_names, labels)} {value}')
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(
+                    f'{name}_bucket{_labels(label_names, labels, le)} '
+                    f'{cumulative}'
+                )
+            lines.append(f'{name}_sum{_labels(label_names, labels)} {total}')
+            lines.append(
+                f'{name}_count{_labels(label_names, labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+class QueryTimer:
+    """`execute_wrapper` counting SQL queries and their duration."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        # Batched reads run the wrapper on several threads, see core.batch.
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self._lock:
+                self.count += 1
+                self.duration += time.perf_counter() - start
+
+
+class MetricsMiddleware:
+    """Record latency, SQL usage, size and status of every request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match else UNRESOLVED_ROUTE
+        method = request.method if request.method in KNOWN_METHODS \
+            else OTHER_METHOD
+        labels = (route, method)
+        if response.streaming:
+            size = int(response.get('Content-Length') or 0)
+        else:
+            size = len(response.content)
+
+        registry.inc(
+            'http_requests_total',
+            (route, method, str(response.status_code)))
+        registry.observe('http_request_duration_seconds', labels, duration)
+        registry.observe('http_response_size_bytes', labels, size)
+        registry.observe('http_request_db_queries', labels, timer.count)
+        registry.inc('db_query_duration_seconds_total', labels, timer.duration)
+        registry.maybe_flush()
+        return response
+
+
+def metrics_view(request):
+    """
+    Expose the metrics of every worker in the Prometheus text format.
+    When `settings.METRICS_TOKEN` is set it must be sent as a bearer token,
+    otherwise only local clients are answered.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        if not constant_time_compare(
+                request.META.get('HTTP_AUTHORIZATION', ''),
+                f'Bearer {token}'):
+            return HttpResponseForbidden()
+    elif request.META.get('REMOTE_ADDR') not in LOCAL_ADDRESSES:
+        return HttpResponseForbidden()
+
+    return HttpResponse(
+        render_prometheus(collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:35
+
+import core.encryption
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_tokenrevocation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='cpf_index',
+            field=core.encryption.BlindIndexField(source='cpf'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='cpf',
+            field=core.encryption.EncryptedCharField(blind_index='cpf_index', max_length=11, unique=True),
+        ),
+    ]
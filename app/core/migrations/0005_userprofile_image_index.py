@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:14
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_encrypt_cpf'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userprofile',
+            name='image',
+            field=models.ImageField(db_index=True, null=True, upload_to=core.models.profile_image_upload_path),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:22
+
+import core.encryption
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_userprofile_image_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='cpf',
+            field=core.encryption.EncryptedCharField(blind_index='cpf_index', max_length=11),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:40
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_drop_cpf_unique'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='image',
+            field=models.ImageField(db_index=True, null=True, upload_to=core.models.image_upload_path),
+        ),
+    ]
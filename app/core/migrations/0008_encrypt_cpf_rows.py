@@ -0,0 +1,16 @@
+from django.db import migrations
+
+from core.encryption import encrypt_rows
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_user_image_index'),
+    ]
+
+    operations = [
+        # Users created before 0004 can only log in once encrypted.
+        migrations.RunPython(encrypt_rows('core.User'),
+                             migrations.RunPython.noop),
+    ]
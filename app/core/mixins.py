@@ -0,0 +1,204 @@
+"""
+Mixins for the core app viewsets.
+"""
+import logging
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from rest_framework.decorators import MethodMapper, action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from core.encryption import BlindIndexField
+from core.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+class ValuesListModelMixin:
+    """
+    List a queryset through a `ValuesSerializer` instead of the
+    regular serializer. The response has the same shape.
+    """
+    values_serializer = None
+
+    def list(self, request, *args, **kwargs):
+        """
+        List objects built from `values_list()` rows.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = self.values_serializer.rows(queryset)
+        context = self.get_serializer_context()
+        serializer_name = self.values_serializer.serializer_class.__name__
+
+        page = self.paginate_queryset(rows)
+        with span('serializer.data', serializer=serializer_name, values=True):
+            if page is not None:
+                data = self.values_serializer.serialize_rows(page, context)
+                return self.get_paginated_response(data)
+
+            data = self.values_serializer.serialize_rows(rows, context)
+        return Response(data)
+
+
+class ExtraActionsMixin:
+    """
+    Find the `@action` methods of a viewset without resolving its class
+    attributes. DRF's `getmembers()` scan resolves the `schema`
+    descriptor, which imports drf_spectacular when the router builds the
+    URL patterns at startup.
+
+    Actions are recognized by the `mapping` that `@action` sets on them,
+    as DRF does.
+    """
+
+    @classmethod
+    def get_extra_actions(cls):
+        """
+        Get the methods that are marked as an extra ViewSet `@action`.
+        """
+        members = {}
+        for klass in reversed(cls.__mro__):
+            members.update(vars(klass))
+        actions = []
+        for name, method in sorted(members.items()):
+            if not isinstance(getattr(method, 'mapping', None), MethodMapper):
+                continue
+            if method.__name__ != name:
+                raise ImproperlyConfigured(
+                    f'The action {method.__name__} of {cls.__name__} is '
+                    f'bound to {name}; decorators of actions must use '
+                    '`functools.wraps`.')
+            actions.append(method)
+        return actions
+
+
+class BulkUpdateModelMixin:
+    """
+    Partially update many objects with `PATCH <list URL>/bulk/`.
+
+    The body is a list of changes, each with the `id` of its object. All
+    objects are fetched in one query from `get_bulk_queryset()`, the
+    objects the user may change, so permissions are checked for the whole
+    set at once. Each change is validated by the serializer of the view;
+    the valid ones are written with one `bulk_update()` in a single
+    transaction. The response has a result per change, in order:
+    `status` 200 with the new `data`, 400 with `errors`, 403 or 404.
+    """
+    bulk_max_items = 500
+
+    def get_bulk_queryset(self):
+        """
+        Return the objects the user may change in bulk.
+        """
+        return self.filter_queryset(self.get_queryset())
+
+    def bulk_apply(self, instance, validated_data) -> set:
+        """
+        Set the validated changes on `instance`, return the changed fields.
+        """
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        return set(validated_data)
+
+    def bulk_updated(self, instances: list):
+        """
+        Run after `instances` are written, in the same transaction.
+        """
+
+    def get_bulk_changes(self, data) -> list:
+        """
+        Return the changes of a bulk request, raising ValidationError.
+        """
+        if not isinstance(data, list) or not data:
+            raise ValidationError(
+                {'detail': 'Expected a non-empty list of changes.'})
+        if len(data) > self.bulk_max_items:
+            raise ValidationError({'detail': (
+                f'A bulk update can change up to {self.bulk_max_items} '
+                'objects.')})
+        for change in data:
+            if not isinstance(change, dict) or \
+                    not isinstance(change.get('id'), int):
+                raise ValidationError(
+                    {'detail': 'Each change must be an object with an id.'})
+        return data
+
+    @action(methods=['PATCH'], detail=False, url_path='bulk')
+    def bulk_update(self, request, *args, **kwargs):
+        """
+        Partially update a list of objects.
+        """
+        changes = self.get_bulk_changes(request.data)
+        ids = [change['id'] for change in changes]
+        model = self.get_queryset().model
+
+        with transaction.atomic():
+            with span('bulk_update.fetch', count=len(ids)):
+                instances = self.get_bulk_queryset().select_for_update(
+                    of=('self',)).in_bulk(ids)
+                missing = set(ids) - set(instances)
+                existing = set(self.get_queryset().filter(
+                    pk__in=missing).values_list('pk', flat=True)) \
+                    if missing else set()
+
+            results = []
+            updated = {}
+            fields = set()
+            seen = set()
+            for change in changes:
+                pk = change['id']
+                if pk in seen:
+                    results.append({'id': pk, 'status': 400, 'errors': {
+                        'id': ['This object is changed twice.']}})
+                    continue
+                seen.add(pk)
+                if pk not in instances:
+                    results.append({
+                        'id': pk,
+                        'status': 403 if pk in existing else 404,
+                    })
+                    continue
+                serializer = self.get_serializer(
+                    instances[pk],
+                    data={k: v for k, v in change.items() if k != 'id'},
+                    partial=True)
+                if not serializer.is_valid():
+                    results.append({'id': pk, 'status': 400,
+                                    'errors': serializer.errors})
+                    continue
+                fields |= self.bulk_apply(
+                    serializer.instance, serializer.validated_data)
+                updated[pk] = serializer
+                results.append({'id': pk, 'status': 200})
+
+            if updated and fields:
+                # bulk_update() does not call pre_save().
+                for field in model._meta.concrete_fields:
+                    if getattr(field, 'auto_now', False) or (
+                            isinstance(field, BlindIndexField)
+                            and field.source in fields):
+                        for serializer in updated.values():
+                            field.pre_save(serializer.instance, add=False)
+                        fields.add(field.name)
+                written = [serializer.instance
+                           for serializer in updated.values()]
+                try:
+                    with span('bulk_update.write', count=len(updated)):
+                        model.objects.bulk_update(written, sorted(fields))
+                except IntegrityError as exc:
+                    transaction.set_rollback(True)
+                    # The database error names tables and columns.
+                    logger.warning('Bulk update of %s conflicts: %s',
+                                   model._meta.label, exc)
+                    return Response(
+                        {'detail': 'The changes conflict with each other '
+                                   'or with existing data.'},
+                        status=status.HTTP_409_CONFLICT)
+                self.bulk_updated(written)
+
+        for result in results:
+            if result['status'] == 200:
+                result['data'] = updated[result['id']].data
+        return Response({'results': results})
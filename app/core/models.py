@@ -9,6 +9,8 @@ from django.contrib.auth.models import (
 )
 from django.core.exceptions import ValidationError
 
+from core.encryption import BlindIndexField, EncryptedCharField
+
 
 def image_upload_path(instance, filename: str) -> str:
     """Generate file path for new image"""
@@ -68,13 +70,16 @@ class User(AbstractBaseUser, PermissionsMixin):
     """
     Custom User model class
     """
-    cpf = models.CharField(max_length=11, unique=True)
+    # Unique through cpf_index: the ciphertexts of equal CPFs differ.
+    cpf = EncryptedCharField(max_length=11, blind_index='cpf_index')
+    cpf_index = BlindIndexField(source='cpf')
     email = models.EmailField(max_length=255, unique=True)
     phone = models.CharField(max_length=255, blank=True, null=True)
     name = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
-    image = models.ImageField(null=True,
+    # Media requests look public files up by image, see core.media.
+    image = models.ImageField(null=True, db_index=True,
                               upload_to=image_upload_path)
 
     objects = UserManager()
@@ -105,8 +110,40 @@ class UserProfile(models.Model):
     updated_at = models.DateField(null=True, blank=True, auto_now=True) 
     image = models.ImageField(
         null=True,
-        upload_to=profile_image_upload_path
+        upload_to=profile_image_upload_path,
+        # Media requests look their file owner up by image, see core.media.
+        db_index=True,
     )
 
     def __str__(self):
         return self.user.email
+
+
+class IdempotencyKey(models.Model):
+    """Response of the first request sent with an `Idempotency-Key`."""
+    key_hash = models.CharField(max_length=64, unique=True)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    headers = models.JSONField(default=dict)
+    body = models.BinaryField(default=bytes)
+    created_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.key_hash
+
+
+class TokenRevocation(models.Model):
+    """
+    A revoked JWT, by `jti`, or every JWT of `user` issued before
+    `issued_before`.
+    """
+    jti = models.CharField(max_length=255, blank=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True,
+                             blank=True)
+    issued_before = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti or f'{self.user_id}:{self.issued_before}'
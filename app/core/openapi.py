@@ -0,0 +1,17 @@
+"""
+OpenAPI schema class and extensions of the API.
+
+Imported by DRF when a schema is generated only, so drf_spectacular stays
+out of the startup path, see core.mixins.
+"""
+from drf_spectacular import openapi
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+
+
+class JWTScheme(SimpleJWTScheme):
+    """Bearer JWT security scheme of core.authentication."""
+    target_class = 'core.authentication.JWTAuthentication'
+
+
+class AutoSchema(openapi.AutoSchema):
+    """drf_spectacular AutoSchema with the extensions of this module."""
@@ -0,0 +1,288 @@
+"""
+Per-request sampling profiler.
+
+`ProfilingMiddleware` profiles a request when it carries the
+`X-Profile: 1` header and is made by a staff user, or when it is picked
+by `settings.PROFILING['SAMPLE_RATE']`. The profile records:
+
+* a statistical CPU profile, sampled from a background thread and stored
+  as folded stacks (`<id>.folded`), the input format of flamegraph.pl and
+  speedscope,
+* the SQL statements with their timings,
+* the `tracemalloc` allocation deltas of the request.
+
+The summary is stored as `<id>.json` next to the folded stacks, and the
+profile id is returned in the `X-Profile-Id` response header. Staff users
+download profiles from `api/v1/admin/profiles/`.
+"""
+import collections
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.exceptions import AuthenticationFailed
+
+from core.authentication import JWTAuthentication
+
+HEADER = 'HTTP_X_PROFILE'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+PROFILE_ID_RE = re.compile(r'^[0-9]{14}-[0-9a-f]{32}$')
+
+
+def profiling_settings() -> dict:
+    """Return the profiling settings with their defaults."""
+    return {
+        'ENABLED': True,
+        'SAMPLE_RATE': 0.0,
+        'INTERVAL': 0.005,
+        'DIR': None,
+        'MAX_PROFILES': 100,
+        'TRACEMALLOC': True,
+        'TOP_ALLOCATIONS': 25,
+        **getattr(settings, 'PROFILING', {}),
+    }
+
+
+class SamplingProfiler:
+    """Sample the stack of one thread at a fixed interval."""
+
+    def __init__(self, interval=0.005, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.samples = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(
+            target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[self._stack(frame)] += 1
+
+    @staticmethod
+    def _stack(frame) -> tuple:
+        """Return the stack of `frame`, outermost call first."""
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            filename = os.path.basename(code.co_filename)
+            stack.append(
+                f'{code.co_name} ({filename}:{code.co_firstlineno})')
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def folded(self) -> str:
+        """Return the samples in the folded stacks format."""
+        return ''.join(
+            ';'.join(name.replace(';', ':') for name in stack)
+            + f' {count}\n'
+            for stack, count in self.samples.most_common()
+        )
+
+
+class SQLRecorder:
+    """`execute_wrapper` keeping every statement and its duration."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'duration_ms': (time.perf_counter() - start) * 1000,
+            })
+
+
+class AllocationTracker:
+    """
+    Record the `tracemalloc` allocation deltas of a block.
+
+    Tracing is process-wide, so only one block is tracked at a time: a
+    block entered while another is tracked records no allocations
+    (`allocations` is None) instead of stopping tracing under it.
+    """
+    _lock = threading.Lock()
+
+    def __init__(self, top=25):
+        self.top = top
+        self.allocations = []
+        self._locked = False
+        self._started = False
+        self._before = None
+
+    def __enter__(self):
+        self._locked = self._lock.acquire(blocking=False)
+        if not self._locked:
+            self.allocations = None
+            return self
+        try:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started = True
+            self._before = tracemalloc.take_snapshot()
+        except BaseException:
+            self._release()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self._locked:
+            return
+        try:
+            after = tracemalloc.take_snapshot()
+        finally:
+            self._release()
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        stats = after.filter_traces(filters).compare_to(
+            self._before.filter_traces(filters), 'lineno')
+        self.allocations = [
+            {
+                'location': str(stat.traceback),
+                'size_diff': stat.size_diff,
+                'count_diff': stat.count_diff,
+            }
+            for stat in stats[:self.top]
+        ]
+
+    def _release(self):
+        """Stop the tracing this block started and let others trace."""
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+        self._locked = False
+        self._lock.release()
+
+
+def profile_dir() -> str:
+    """Return the directory profiles are stored in."""
+    return str(profiling_settings()['DIR'])
+
+
+def profile_path(profile_id: str, extension: str) -> str:
+    """Return the path of a stored profile file, validating the id."""
+    if not PROFILE_ID_RE.match(profile_id):
+        raise ValueError(f'Invalid profile id {profile_id!r}.')
+    return os.path.join(profile_dir(), f'{profile_id}.{extension}')
+
+
+def list_profiles() -> list:
+    """Return the ids of the stored profiles, newest first."""
+    try:
+        names = os.listdir(profile_dir())
+    except FileNotFoundError:
+        return []
+    return sorted(
+        (name[:-5] for name in names
+         if name.endswith('.json') and PROFILE_ID_RE.match(name[:-5])),
+        reverse=True,
+    )
+
+
+def save_profile(summary: dict, folded: str) -> str:
+    """Store a profile, prune the oldest ones and return its id."""
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    profile_id = (
+        time.strftime('%Y%m%d%H%M%S', time.gmtime()) + '-' + uuid.uuid4().hex)
+    summary['id'] = profile_id
+    with open(profile_path(profile_id, 'folded'), 'w') as folded_file:
+        folded_file.write(folded)
+    with open(profile_path(profile_id, 'json'), 'w') as summary_file:
+        json.dump(summary, summary_file)
+
+    for old_id in list_profiles()[profiling_settings()['MAX_PROFILES']:]:
+        for extension in ('json', 'folded'):
+            try:
+                os.remove(profile_path(old_id, extension))
+            except FileNotFoundError:
+                pass
+    return profile_id
+
+
+def is_staff_request(request) -> bool:
+    """
+    Return whether the request is made by a staff user, logged in with a
+    session or sending a JWT. API requests run no session middleware.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return result is not None and result[0].is_staff
+
+
+class ProfilingMiddleware:
+    """Profile staff requests asking for it and sampled requests."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def should_profile(self, request, options) -> bool:
+        """Return whether to profile the request."""
+        if request.META.get(HEADER) == '1' and is_staff_request(request):
+            return True
+        rate = options['SAMPLE_RATE']
+        return rate > 0 and random.random() < rate
+
+    def __call__(self, request):
+        options = profiling_settings()
+        if not options['ENABLED'] or not options['DIR'] or \
+                not self.should_profile(request, options):
+            return self.get_response(request)
+
+        recorder = SQLRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            allocations = AllocationTracker(options['TOP_ALLOCATIONS'])
+            if options['TRACEMALLOC']:
+                stack.enter_context(allocations)
+            profiler = stack.enter_context(
+                SamplingProfiler(options['INTERVAL']))
+            start = time.perf_counter()
+            response = self.get_response(request)
+            duration = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        summary = {
+            'method': request.method,
+            'path': request.path,
+            'route': match.view_name if match else None,
+            'status': response.status_code,
+            'duration_ms': duration * 1000,
+            'samples': sum(profiler.samples.values()),
+            'interval_ms': options['INTERVAL'] * 1000,
+            'sql': recorder.queries,
+            'sql_duration_ms': sum(q['duration_ms'] for q in recorder.queries),
+            'allocations': allocations.allocations,
+        }
+        response[PROFILE_ID_HEADER] = save_profile(summary, profiler.folded())
+        return response
@@ -0,0 +1,260 @@
+"""
+N+1, slow query and missing index detector for development and staging.
+
+`QueryInspector` wraps the database connections, fingerprints every SQL
+statement and reports:
+
+* statements repeated with the same shape (N+1 queries),
+* statements slower than a threshold,
+* filtered statements answered by a full table scan (`EXPLAIN`, on
+  SQLite and PostgreSQL).
+
+`QueryInspectorMiddleware` runs it around each request when
+`settings.QUERY_INSPECTOR['ENABLED']` is true, logging the findings and
+summarising them in the `X-Query-Inspector` response header. With
+`RAISE` also set, findings raise `QueryProblemError`, which makes the
+tests in `core/tests` fail:
+
+    QUERY_INSPECTOR=raise python manage.py test
+"""
+import json
+import logging
+import os
+import re
+import sys
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'X-Query-Inspector'
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|\?')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+# Source files of this project, used to point findings at app code.
+_PROJECT_DIR = str(settings.BASE_DIR)
+
+
+def fingerprint(sql: str) -> str:
+    """Return `sql` with literals and placeholders normalised."""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('(...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def inspector_settings() -> dict:
+    """Return the inspector settings with their defaults."""
+    return {
+        'ENABLED': False,
+        'RAISE': False,
+        'N_PLUS_ONE_THRESHOLD': 5,
+        'SLOW_QUERY_MS': 100,
+        'EXPLAIN': True,
+        **getattr(settings, 'QUERY_INSPECTOR', {}),
+    }
+
+
+class QueryProblemError(AssertionError):
+    """Raised for query problems when the inspector is set to raise."""
+
+
+class Finding:
+    """A problem found in the queries of a request."""
+
+    def __init__(self, kind: str, message: str, sql: str, location=None):
+        self.kind = kind
+        self.message = message
+        self.sql = sql
+        self.location = location
+
+    def __str__(self):
+        where = f' at {self.location}' if self.location else ''
+        return f'[{self.kind}] {self.message}{where}: {self.sql}'
+
+    def __repr__(self):
+        return f'<Finding {self}>'
+
+
+class _Statement:
+    """Statements sharing a fingerprint."""
+
+    def __init__(self, alias, sql, params, location):
+        self.alias = alias
+        self.sql = sql
+        self.params = params
+        self.location = location
+        self.count = 0
+        self.duration = 0.0
+
+
+def _app_location():
+    """Return `file:line` of the innermost project frame, if any."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        # Skip execute wrappers, such as the metrics one.
+        is_wrapper = 'execute' in frame.f_locals and 'many' in frame.f_locals
+        if filename.startswith(_PROJECT_DIR) and not is_wrapper and \
+                'site-packages' not in filename:
+            relative = os.path.relpath(filename, _PROJECT_DIR)
+            return f'{relative}:{frame.f_lineno}'
+        frame = frame.f_back
+    return None
+
+
+class QueryInspector:
+    """Context manager recording and analysing the queries it wraps."""
+
+    # EXPLAIN results are cached per process, keyed by fingerprint.
+    _explained = {}
+
+    def __init__(self, **options):
+        self.options = {**inspector_settings(), **options}
+        self.statements = {}
+        self.slow = []
+        self.total = 0
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.record(context['connection'].alias, sql, params, duration)
+
+    def record(self, alias, sql, params, duration):
+        """Record one executed statement."""
+        self.total += 1
+        key = fingerprint(sql)
+        statement = self.statements.get(key)
+        if statement is None:
+            statement = self.statements[key] = _Statement(
+                alias, sql, params, _app_location())
+        statement.count += 1
+        statement.duration += duration
+        if duration * 1000 >= self.options['SLOW_QUERY_MS']:
+            self.slow.append((sql, duration, _app_location()))
+
+    def findings(self) -> list:
+        """Analyse the recorded statements and return the findings."""
+        results = []
+        threshold = self.options['N_PLUS_ONE_THRESHOLD']
+        for key, statement in self.statements.items():
+            if statement.count >= threshold:
+                results.append(Finding(
+                    'n+1',
+                    f'{statement.count} queries with the same shape',
+                    key, statement.location,
+                ))
+        for sql, duration, location in self.slow:
+            results.append(Finding(
+                'slow', f'query took {duration * 1000:.1f}ms', sql, location))
+        if self.options['EXPLAIN']:
+            for key, statement in self.statements.items():
+                for table in self.full_scans(key, statement):
+                    results.append(Finding(
+                        'scan', f'full scan of {table}', key,
+                        statement.location,
+                    ))
+        return results
+
+    def full_scans(self, key, statement) -> list:
+        """Return the tables a filtered SELECT reads with a full scan."""
+        upper = key.upper()
+        if not upper.startswith('SELECT') or ' WHERE ' not in upper:
+            return []
+        if key not in self._explained:
+            self._explained[key] = self.explain(statement)
+        return self._explained[key]
+
+    @staticmethod
+    def explain(statement) -> list:
+        """Run EXPLAIN for `statement` and return the scanned tables."""
+        connection = connections[statement.alias]
+        vendor = connection.vendor
+        if vendor == 'sqlite':
+            prefix = 'EXPLAIN QUERY PLAN '
+        elif vendor == 'postgresql':
+            prefix = 'EXPLAIN (FORMAT JSON) '
+        else:
+            return []
+
+        try:
+            with transaction.atomic(using=statement.alias):
+                with connection.cursor() as cursor:
+                    cursor.execute(prefix + statement.sql, statement.params)
+                    rows = cursor.fetchall()
+        except DatabaseError:
+            return []
+
+        if vendor == 'sqlite':
+            return [
+                row[-1].split()[1] for row in rows
+                if row[-1].startswith('SCAN ') and ' USING ' not in row[-1]
+            ]
+
+        plan = rows[0][0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        tables = []
+        nodes = [node['Plan'] for node in plan]
+        while nodes:
+            node = nodes.pop()
+            if node.get('Node Type') == 'Seq Scan' and node.get('Filter'):
+                tables.append(node.get('Relation Name'))
+            nodes.extend(node.get('Plans', []))
+        return tables
+
+    def assert_clean(self):
+        """Raise QueryProblemError when there are findings."""
+        results = self.findings()
+        if results:
+            raise QueryProblemError(
+                'Query problems found:\n' + '\n'.join(map(str, results)))
+
+
+class QueryInspectorMiddleware:
+    """Inspect the queries of each request, when enabled."""
+
+    def __init__(self, get_response):
+        if not inspector_settings()['ENABLED']:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryInspector() as inspector:
+            response = self.get_response(request)
+
+        results = inspector.findings()
+        kinds = [finding.kind for finding in results]
+        response[HEADER] = (
+            f'queries={inspector.total}; n+1={kinds.count("n+1")}; '
+            f'slow={kinds.count("slow")}; scan={kinds.count("scan")}'
+        )
+        for finding in results:
+            logger.warning('%s %s', request.path, finding)
+        if results and inspector.options['RAISE']:
+            raise QueryProblemError(
+                f'Query problems in {request.method} {request.path}:\n'
+                + '\n'.join(map(str, results)))
+        return response
@@ -0,0 +1,80 @@
+"""
+Fast JSON renderer and parser for the API.
+
+Both classes use orjson when it is installed and fall back to the stock
+DRF implementation otherwise, so they are safe to enable everywhere. The
+renderer also falls back for the documents orjson can not encode.
+"""
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+# Types orjson does not know about (Decimal, timedelta, lazy strings,
+# querysets...) are delegated to the encoder DRF uses, so the output
+# matches the stock renderer.
+_encode_default = JSONEncoder().default
+
+_LINE_SEPARATOR = '\u2028'.encode('utf-8')
+_PARAGRAPH_SEPARATOR = '\u2029'.encode('utf-8')
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Render JSON with orjson, falling back to the DRF renderer."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render `data` into JSON, returning a bytestring."""
+        if orjson is None:
+            return super().render(
+                data, accepted_media_type, renderer_context)
+
+        if data is None:
+            return b''
+
+        # UTC datetimes end with `Z`, as with the DRF encoder.
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type or '', renderer_context):
+            option |= orjson.OPT_INDENT_2
+
+        try:
+            ret = orjson.dumps(data, default=_encode_default, option=option)
+        except TypeError:
+            # orjson.JSONEncodeError, e.g. integers beyond 64 bits: the
+            # stock renderer encodes them, or raises its own error.
+            return super().render(
+                data, accepted_media_type, renderer_context)
+
+        # Keep the output safe to embed in <script> tags, as DRF does.
+        if _LINE_SEPARATOR in ret or _PARAGRAPH_SEPARATOR in ret:
+            ret = ret.replace(_LINE_SEPARATOR, b'\\u2028')
+            ret = ret.replace(_PARAGRAPH_SEPARATOR, b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    """Parse JSON request bodies with orjson, falling back to DRF."""
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """Parse the incoming bytestream as JSON and return the data."""
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        try:
+            body = stream.read() if stream is not None else b''
+            if encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+                body = body.decode(encoding)
+            return orjson.loads(body)
+        except (ValueError, UnicodeDecodeError) as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,222 @@
+"""
+Server-side revocation of JWTs.
+
+Access tokens are self-contained, so without this a token stays valid
+until it expires, even once its user is disabled or logged out. Tokens
+are revoked in `TokenRevocation` either one by one, by their `jti`
+(`revoke_token`, used by `token/revoke/`), or all the tokens of a user
+issued before a time (`revoke_user`, run when a user is disabled).
+
+Every process keeps the unexpired revocations in memory, in dicts of
+revoked `jti` and of user cutoffs, so checking a token costs two hash
+lookups and no query. The process reads the revocations created since
+its last read every `settings.REVOCATION['REFRESH_INTERVAL']` seconds
+and reloads them all every `RELOAD_INTERVAL` seconds; revocations made
+by the process itself apply as soon as their transaction commits. A
+revocation made by another process therefore applies within
+`REFRESH_INTERVAL` seconds.
+
+Rows are read from the primary database, since a lagging replica would
+delay revocations. Expired rows are deleted by the
+`core.tasks.purge_token_revocations` task, queued every hour by the job
+workers (`settings.JOBS['PERIODIC']`).
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from core.models import TokenRevocation
+
+logger = logging.getLogger(__name__)
+
+
+def revocation_settings() -> dict:
+    """Return the revocation settings with their defaults."""
+    return {
+        'ENABLED': True,
+        'REFRESH_INTERVAL': 5,
+        'RELOAD_INTERVAL': 5 * 60,
+        # Rows committed late, out of creation order, are read again.
+        'OVERLAP': 30,
+        **getattr(settings, 'REVOCATION', {}),
+    }
+
+
+def max_token_lifetime() -> timedelta:
+    """Return the lifetime of the longest lived token."""
+    return max(api_settings.ACCESS_TOKEN_LIFETIME,
+               api_settings.REFRESH_TOKEN_LIFETIME,
+               api_settings.SLIDING_TOKEN_REFRESH_LIFETIME)
+
+
+class RevocationList:
+    """In-process copy of the unexpired revocations."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        """Forget every revocation, the next check reloads them."""
+        self.jtis = {}
+        self.cutoffs = {}
+        self.cursor = None
+        self.next_refresh = 0.0
+        self.next_reload = 0.0
+
+    def add(self, jti='', user_id=None, issued_before=None, expires_at=None):
+        """Add one revocation."""
+        with self._lock:
+            self._add(self.jtis, self.cutoffs,
+                      jti, user_id, issued_before, expires_at)
+
+    @staticmethod
+    def _add(jtis, cutoffs, jti, user_id, issued_before, expires_at):
+        if jti:
+            jtis[jti] = expires_at.timestamp()
+        if user_id is not None:
+            # The user id claim is a string, whatever the type of the id.
+            user_id = str(user_id)
+            cutoff = issued_before.timestamp()
+            if cutoff > cutoffs.get(user_id, (0.0, 0.0))[0]:
+                cutoffs[user_id] = (cutoff, expires_at.timestamp())
+
+    def prune(self, now: float):
+        """Drop the revocations of tokens which expired."""
+        self.jtis = {
+            jti: expires for jti, expires in self.jtis.items()
+            if expires > now}
+        self.cutoffs = {
+            user_id: cutoff for user_id, cutoff in self.cutoffs.items()
+            if cutoff[1] > now}
+
+    def refresh(self, force=False):
+        """Read the new revocations when the refresh interval elapsed."""
+        now = time.monotonic()
+        if not force and now < self.next_refresh:
+            return
+        # Other threads keep checking against the current revocations.
+        if not self._lock.acquire(blocking=force):
+            return
+        options = revocation_settings()
+        try:
+            self.read(reload=force or self.cursor is None
+                      or now >= self.next_reload)
+        except DatabaseError:
+            logger.exception('Revocations could not be read')
+        finally:
+            self.next_refresh = now + options['REFRESH_INTERVAL']
+            self._lock.release()
+
+    def read(self, reload: bool):
+        """Read the revocations created since the last read, or all."""
+        options = revocation_settings()
+        # Read the primary, not a lagging replica, without asking the
+        # router: db_for_write() would pin the request to the primary.
+        rows = TokenRevocation.objects.using(DEFAULT_DB_ALIAS).filter(
+            expires_at__gt=timezone.now())
+        if not reload:
+            rows = rows.filter(created_at__gte=self.cursor - timedelta(
+                seconds=options['OVERLAP']))
+        rows = list(rows.values_list(
+            'jti', 'user_id', 'issued_before', 'expires_at', 'created_at'))
+
+        # is_revoked() reads the dicts without the lock: a reload fills
+        # new dicts and swaps them in whole, never exposing a partial list.
+        if reload:
+            jtis, cutoffs = {}, {}
+            self.next_reload = time.monotonic() + options['RELOAD_INTERVAL']
+        else:
+            jtis, cutoffs = self.jtis, self.cutoffs
+        if self.cursor is None:
+            self.cursor = timezone.now()
+        for jti, user_id, issued_before, expires_at, created_at in rows:
+            self._add(jtis, cutoffs, jti, user_id, issued_before, expires_at)
+            self.cursor = max(self.cursor, created_at)
+        self.jtis, self.cutoffs = jtis, cutoffs
+        self.prune(time.time())
+
+    def is_revoked(self, payload: dict) -> bool:
+        """Return whether the token of claims `payload` is revoked."""
+        self.refresh()
+        if payload.get(api_settings.JTI_CLAIM) in self.jtis:
+            return True
+        cutoff = self.cutoffs.get(str(payload.get(api_settings.USER_ID_CLAIM)))
+        return cutoff is not None and payload.get('iat', 0) < cutoff[0]
+
+
+revocation_list = RevocationList()
+
+
+def is_revoked(token) -> bool:
+    """Return whether the validated `token` is revoked."""
+    if not revocation_settings()['ENABLED']:
+        return False
+    return revocation_list.is_revoked(token.payload)
+
+
+def revoke_token(token) -> TokenRevocation:
+    """Revoke the validated `token` by its `jti`."""
+    revocation = TokenRevocation.objects.create(
+        jti=token[api_settings.JTI_CLAIM],
+        expires_at=datetime_from_epoch(token['exp']),
+        created_at=timezone.now(),
+    )
+    transaction.on_commit(lambda: revocation_list.add(
+        revocation.jti, expires_at=revocation.expires_at))
+    return revocation
+
+
+def revoke_users(users) -> list:
+    """Revoke every token issued to `users` until now."""
+    now = timezone.now()
+    revocations = TokenRevocation.objects.bulk_create([
+        TokenRevocation(user=user, issued_before=now,
+                        expires_at=now + max_token_lifetime(), created_at=now)
+        for user in users
+    ])
+
+    def add():
+        for revocation in revocations:
+            revocation_list.add(
+                user_id=revocation.user_id, issued_before=now,
+                expires_at=revocation.expires_at)
+
+    if revocations:
+        transaction.on_commit(add)
+    return revocations
+
+
+def revoke_user(user) -> TokenRevocation:
+    """Revoke every token issued to `user` until now."""
+    return revoke_users([user])[0]
+
+
+def remember_active(sender, instance, **kwargs):
+    """Remember whether a user was active when loaded or last saved."""
+    # A deferred is_active is not loaded, it is then unknown.
+    instance._was_active = vars(instance).get('is_active')
+
+
+def was_disabled(user) -> bool:
+    """Return whether `user` was active and is not anymore."""
+    return (not user.is_active
+            and getattr(user, '_was_active', None) is not False)
+
+
+def revoke_inactive_user(sender, instance, created, update_fields=None,
+                         **kwargs):
+    """Revoke the tokens of a user saved as disabled."""
+    if update_fields is not None and 'is_active' not in update_fields:
+        return
+    disabled = not created and was_disabled(instance)
+    instance._was_active = instance.is_active
+    if disabled:
+        revoke_user(instance)
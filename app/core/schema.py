@@ -0,0 +1,179 @@
+"""
+Precomputed OpenAPI schema.
+
+The schema is generated once, by `manage.py build_schema` when the image
+is built, and served from memory afterwards. Each process loads it on the
+first request and keeps it until it is restarted by the next deploy.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from django.views import View
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'json': 'application/vnd.oai.openapi+json',
+    'yaml': 'application/vnd.oai.openapi; charset=utf-8',
+}
+
+
+def generate_schema() -> dict:
+    """Introspect the API and return the live OpenAPI schema."""
+    from drf_spectacular.settings import spectacular_settings
+
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    return generator.get_schema(request=None, public=True)
+
+
+def render_schema(schema: dict, fmt: str) -> bytes:
+    """Render `schema` in the given format ('json' or 'yaml')."""
+    from drf_spectacular.renderers import (
+        OpenApiJsonRenderer,
+        OpenApiYamlRenderer,
+    )
+
+    if fmt == 'json':
+        return OpenApiJsonRenderer().render(schema, renderer_context={})
+    return OpenApiYamlRenderer().render(schema, renderer_context={})
+
+
+def write_schema(path=None) -> str:
+    """Generate the schema and write it as JSON to `path`."""
+    path = path or settings.OPENAPI_SCHEMA_FILE
+    with open(path, 'wb') as schema_file:
+        schema_file.write(render_schema(generate_schema(), 'json'))
+    return str(path)
+
+
+def load_schema() -> dict:
+    """Return the schema file contents, generating it when missing."""
+    try:
+        with open(settings.OPENAPI_SCHEMA_FILE, 'rb') as schema_file:
+            return json.loads(schema_file.read())
+    except FileNotFoundError:
+        logger.warning(
+            'OpenAPI schema file %s not found, generating it in process. '
+            'Run `manage.py build_schema` when building the image.',
+            settings.OPENAPI_SCHEMA_FILE,
+        )
+        return json.loads(render_schema(generate_schema(), 'json'))
+
+
+class SchemaRepresentation:
+    """A rendered schema with its gzipped body and ETags."""
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.gzip_body = gzip.compress(body, mtime=0)
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gzip"'
+
+
+class CachedSchema:
+    """In-memory schema, rendered lazily once per format."""
+
+    def __init__(self, schema: dict):
+        self.schema = schema
+        self._representations = {}
+        self._lock = threading.Lock()
+
+    def representation(self, fmt: str) -> SchemaRepresentation:
+        """Return the rendered representation for `fmt`."""
+        representation = self._representations.get(fmt)
+        if representation is None:
+            with self._lock:
+                representation = self._representations.get(fmt)
+                if representation is None:
+                    representation = SchemaRepresentation(
+                        render_schema(self.schema, fmt))
+                    self._representations[fmt] = representation
+        return representation
+
+
+_cached_schema = None
+_cached_schema_lock = threading.Lock()
+
+
+def get_cached_schema() -> CachedSchema:
+    """Return the process wide cached schema."""
+    global _cached_schema
+    if _cached_schema is None:
+        with _cached_schema_lock:
+            if _cached_schema is None:
+                _cached_schema = CachedSchema(load_schema())
+    return _cached_schema
+
+
+def clear_schema_cache():
+    """Drop the cached schema, it is loaded again on the next request."""
+    global _cached_schema
+    _cached_schema = None
+
+
+class CachedSchemaView(View):
+    """
+    Serve the precomputed OpenAPI schema.
+
+    YAML is returned by default, as `SpectacularAPIView` does; JSON is
+    returned for `?format=json` or when JSON is accepted.
+    """
+
+    def get(self, request, *args, **kwargs):
+        """Return the schema, honouring If-None-Match and gzip."""
+        fmt = self.get_format(request)
+        representation = get_cached_schema().representation(fmt)
+        use_gzip = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        etag = representation.gzip_etag if use_gzip else representation.etag
+
+        if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(
+                representation.gzip_body if use_gzip
+                else representation.body,
+                content_type=FORMATS[fmt],
+            )
+            if use_gzip:
+                response['Content-Encoding'] = 'gzip'
+            response['Content-Disposition'] = (
+                f'inline; filename="schema.{fmt}"')
+
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+        return response
+
+    def get_format(self, request) -> str:
+        """Return the requested format."""
+        fmt = request.GET.get('format')
+        if fmt in FORMATS:
+            return fmt
+        if 'json' in request.META.get('HTTP_ACCEPT', ''):
+            return 'json'
+        return 'yaml'
+
+
+_swagger_view = None
+
+
+def swagger_view(request, *args, **kwargs):
+    """
+    Serve the Swagger UI. drf_spectacular's views are imported on the
+    first request, so processes that never serve the docs skip them.
+    """
+    global _swagger_view
+    if _swagger_view is None:
+        from drf_spectacular.views import SpectacularSwaggerView
+
+        _swagger_view = SpectacularSwaggerView.as_view(url_name='api-schema')
+    return _swagger_view(request, *args, **kwargs)
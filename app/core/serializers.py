@@ -1,17 +1,59 @@
 """
 Serializers for core app
 """
+from django.db import models
 from rest_framework import serializers
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.validators import UniqueValidator
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+    TokenVerifySerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import (
+    AccessToken,
+    RefreshToken,
+    UntypedToken,
+)
 
 
+from core.authentication import token_cache
+from core.batch import batch_settings
+from core.images import ImageError, validate_image
 from core.models import (
     User,
     UserProfile,
 )
+from core.revocation import is_revoked, revoke_token
+from core.throttling import is_valid_cpf, login_throttle_settings
+from core.tracing import TracedSerializerMixin
+from core.uploads import uploads_settings
+
+
+class BoundedImageField(serializers.ImageField):
+    """Image field validated by `core.images.validate_image`."""
 
+    def to_internal_value(self, data):
+        file_object = serializers.FileField.to_internal_value(self, data)
+        try:
+            image_format, _ = validate_image(file_object)
+        except ImageError as exc:
+            raise serializers.ValidationError(str(exc))
+        file_object.content_type = f'image/{image_format.lower()}'
+        return file_object
 
-class UserSerializer(serializers.ModelSerializer):
+
+class BoundedImageSerializerMixin:
+    """Map the model image fields to BoundedImageField."""
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.ImageField: BoundedImageField,
+    }
+
+
+class UserSerializer(TracedSerializerMixin, serializers.ModelSerializer):
     """Serializer for user objects."""
 
     class Meta:
@@ -31,15 +73,27 @@ class UserSerializer(serializers.ModelSerializer):
             'password': {
                 'write_only': True,
                 'min_length': 8,
-            }
+            },
+            # Unique through its blind index, see core.encryption.
+            'cpf': {
+                'validators': [UniqueValidator(queryset=User.objects.all())],
+            },
         }
 
+    def validate_cpf(self, value):
+        """Refuse CPFs with an invalid format or check digits."""
+        if not is_valid_cpf(value):
+            raise serializers.ValidationError('Enter a valid CPF.')
+        return value
+
     def create(self, validated_data):
         """Create a new user with encrypted password and return it."""
         return User.objects.create_user(**validated_data)
 
 
-class UserImageSerializer(serializers.ModelSerializer):
+class UserImageSerializer(
+        BoundedImageSerializerMixin, TracedSerializerMixin,
+        serializers.ModelSerializer):
     """Serializer for user image."""
 
     class Meta:
@@ -56,7 +110,9 @@ class UserImageSerializer(serializers.ModelSerializer):
         }
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(
+        BoundedImageSerializerMixin, TracedSerializerMixin,
+        serializers.ModelSerializer):
     """Serializer for user profile objects."""
     user = UserSerializer(
         read_only=True,
@@ -73,7 +129,9 @@ class UserProfileSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'user',)
 
 
-class UserProfileImageSerializer(serializers.ModelSerializer):
+class UserProfileImageSerializer(
+        BoundedImageSerializerMixin, TracedSerializerMixin,
+        serializers.ModelSerializer):
     """Serializer for user profile image."""
 
     class Meta:
@@ -91,6 +149,22 @@ class UserProfileImageSerializer(serializers.ModelSerializer):
 
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
+
+    def validate(self, attrs):
+        """
+        Refuse CPFs with an invalid format or check digits as wrong
+        credentials, before any password hash. Users stored before CPFs
+        were validated can still log in with theirs.
+        """
+        cpf = attrs[self.username_field]
+        if login_throttle_settings()['VALIDATE_CPF'] and \
+                not is_valid_cpf(cpf) and \
+                not User.objects.filter(cpf=cpf).exists():
+            raise AuthenticationFailed(
+                self.error_messages['no_active_account'],
+                'no_active_account')
+        return super().validate(attrs)
+
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
@@ -101,3 +175,98 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
         # ...
 
         return token
+
+
+class RevocationTokenVerifySerializer(TokenVerifySerializer):
+    """
+    Verify a token, refusing revoked tokens. Verified tokens are cached,
+    see core.authentication.
+    """
+
+    def validate(self, attrs):
+        token = token_cache.get_or_verify(
+            'verify', attrs['token'], UntypedToken)
+        if is_revoked(token):
+            raise InvalidToken('Token is revoked.')
+        return {}
+
+
+class RevocationTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresh an access token, refusing revoked refresh tokens."""
+
+    def validate(self, attrs):
+        if is_revoked(self.token_class(attrs['refresh'])):
+            raise InvalidToken('Token is revoked.')
+        return super().validate(attrs)
+
+
+class TokenRevokeSerializer(serializers.Serializer):
+    """Revoke a refresh token and optionally its access token."""
+    refresh = serializers.CharField(write_only=True)
+    access = serializers.CharField(write_only=True, required=False)
+
+    def validate(self, attrs):
+        tokens = []
+        for token_class, field in ((RefreshToken, 'refresh'),
+                                   (AccessToken, 'access')):
+            if field not in attrs:
+                continue
+            tokens.append(token_class(attrs[field]))
+        user_ids = {token.get(api_settings.USER_ID_CLAIM) for token in tokens}
+        if len(user_ids) > 1:
+            raise serializers.ValidationError(
+                'The tokens belong to different users.')
+        for token in tokens:
+            if not is_revoked(token):
+                revoke_token(token)
+        return {}
+
+
+class UploadTicketSerializer(serializers.Serializer):
+    """Serializer for upload ticket requests."""
+    target = serializers.ChoiceField(choices=('user', 'user-profile'))
+    id = serializers.IntegerField(required=False, min_value=1)
+    content_type = serializers.CharField()
+    size = serializers.IntegerField(min_value=1)
+
+    def validate_content_type(self, value):
+        """Check the content type is an accepted image type."""
+        if value not in uploads_settings()['CONTENT_TYPES']:
+            raise serializers.ValidationError(
+                f'Unsupported content type {value}.')
+        return value
+
+    def validate_size(self, value):
+        """Check the size is within the upload limit."""
+        max_size = uploads_settings()['MAX_SIZE']
+        if value > max_size:
+            raise serializers.ValidationError(
+                f'Images are limited to {max_size} bytes.')
+        return value
+
+
+class UploadFinalizeSerializer(serializers.Serializer):
+    """Serializer for upload finalize requests."""
+    ticket = serializers.CharField()
+
+
+class BatchItemSerializer(serializers.Serializer):
+    """Serializer for a sub-request of a batch."""
+    id = serializers.CharField(required=False, max_length=64)
+    method = serializers.ChoiceField(
+        choices=('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE'))
+    path = serializers.CharField(max_length=2048)
+    body = serializers.JSONField(required=False)
+
+
+class BatchSerializer(serializers.Serializer):
+    """Serializer for batch requests."""
+    requests = BatchItemSerializer(many=True, allow_empty=False)
+
+    def validate_requests(self, value):
+        """Check the batch is not larger than allowed."""
+        limit = batch_settings()['MAX_REQUESTS']
+        if len(value) > limit:
+            raise serializers.ValidationError(
+                f'A batch can have up to {limit} requests.')
+        return value
@@ -0,0 +1,106 @@
+"""
+Production WSGI server, run with `manage.py serve`.
+
+gunicorn serves `app.wsgi` with `preload_app`: the master imports and
+warms up the application (`core.warmup`) before forking, so workers share
+its memory and answer their first request at full speed. Workers default
+to `2 x CPUs + 1`, CPUs being the usable ones (affinity and cgroup quota),
+and run `settings.WEB_THREADS` threads each.
+
+Signals to the master:
+
+* `HUP` restarts the workers gracefully with the new configuration. With
+  a preloaded app they keep the code of the master.
+* `USR2` then `QUIT` to the old master deploys new code without downtime:
+  a new master is started, warmed up and forked before the old one stops.
+* `TERM` stops gracefully, waiting up to `graceful_timeout` seconds.
+"""
+import math
+import os
+
+from django.conf import settings
+from django.db import connections
+
+from core.metrics import remove_dead_snapshots, remove_snapshot
+
+
+def cpu_count() -> int:
+    """Return the number of CPUs the process may use."""
+    if hasattr(os, 'sched_getaffinity'):
+        count = len(os.sched_getaffinity(0))
+    else:
+        count = os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as cpu_max:
+            quota, period = cpu_max.read().split()
+        if quota != 'max':
+            count = min(count, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(count, 1)
+
+
+def worker_count() -> int:
+    """Return `settings.WEB_CONCURRENCY`, or `2 x CPUs + 1` when unset."""
+    return settings.WEB_CONCURRENCY or 2 * cpu_count() + 1
+
+
+def on_starting(server):
+    """Delete the metrics snapshots of processes which are gone."""
+    remove_dead_snapshots()
+
+
+def worker_exit(server, worker):
+    """Close the database connections of a stopping worker."""
+    connections.close_all()
+
+
+def child_exit(server, worker):
+    """Delete the metrics snapshot of an exited worker."""
+    remove_snapshot(worker.pid)
+
+
+def server_options(**options) -> dict:
+    """Return the gunicorn settings, overridden by `options`."""
+    return {
+        'bind': os.environ.get('WEB_BIND', '0.0.0.0:8000'),
+        'workers': worker_count(),
+        'threads': settings.WEB_THREADS,
+        'worker_class': 'gthread',
+        'preload_app': True,
+        'timeout': 30,
+        'graceful_timeout': 30,
+        'keepalive': 5,
+        'max_requests': 0,
+        'max_requests_jitter': 0,
+        'worker_tmp_dir': '/dev/shm' if os.path.isdir('/dev/shm') else None,
+        'accesslog': '-',
+        'on_starting': on_starting,
+        'worker_exit': worker_exit,
+        'child_exit': child_exit,
+        **options,
+    }
+
+
+def run(warm=True, **options):
+    """Run gunicorn until it is stopped."""
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        """gunicorn application loading and warming up `app.wsgi`."""
+
+        def load_config(self):
+            for key, value in server_options(**options).items():
+                if value is not None:
+                    self.cfg.set(key, value)
+
+        def load(self):
+            from app.wsgi import application
+            from core.warmup import warmup
+
+            if warm:
+                warmup()
+            connections.close_all()
+            return application
+
+    Application().run()
@@ -0,0 +1,16 @@
+"""
+Storage backends for the core app.
+"""
+from django.core.files.storage import FileSystemStorage
+
+from core import tracing
+
+
+class TracedFileSystemStorage(FileSystemStorage):
+    """File system storage recording a tracing span for each write."""
+
+    def _save(self, name, content):
+        with tracing.span('storage.save', **{
+                'storage.name': name,
+                'storage.size': getattr(content, 'size', None) or 0}):
+            return super()._save(name, content)
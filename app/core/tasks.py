@@ -0,0 +1,75 @@
+"""
+Background tasks of the core app, run by `manage.py run_jobs`.
+
+The cleanup tasks are queued periodically, see `settings.JOBS['PERIODIC']`.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from core.cep import address_models, normalize_addresses
+from core.encryption import encrypt_batch, encrypted_models
+from core.models import IdempotencyKey, TokenRevocation
+from core.uploads import PENDING_DIR, get_backend, uploads_settings
+from jobs.queue import task
+
+
+@task(queue='default', priority=-10, max_attempts=1)
+def cleanup_pending_uploads() -> int:
+    """Delete the uploads never finalized, return how many."""
+    storage = get_backend().storage
+    cutoff = timezone.now() - timedelta(
+        seconds=uploads_settings()['FINALIZE_TTL'])
+    try:
+        _, names = storage.listdir(PENDING_DIR)
+    except FileNotFoundError:
+        return 0
+    deleted = 0
+    for name in names:
+        key = f'{PENDING_DIR}/{name}'
+        if storage.get_modified_time(key) < cutoff:
+            storage.delete(key)
+            deleted += 1
+    return deleted
+
+
+@task(queue='default', priority=-10, max_attempts=1)
+def purge_idempotency_keys() -> int:
+    """Delete the expired idempotency keys, return how many."""
+    deleted, _ = IdempotencyKey.objects.filter(
+        expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+@task(queue='default', priority=-10, max_attempts=1)
+def purge_token_revocations() -> int:
+    """Delete the revocations of expired tokens, return how many."""
+    deleted, _ = TokenRevocation.objects.filter(
+        expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+@task(queue='default', priority=-5, max_attempts=3)
+def encrypt_identifiers(batch_size=None) -> int:
+    """
+    Encrypt a batch of the identifiers stored in plaintext, queue the
+    next batch while some are left, return how many rows were encrypted.
+    """
+    count = sum(encrypt_batch(model, batch_size)
+                for model in encrypted_models())
+    if count:
+        encrypt_identifiers.enqueue({'batch_size': batch_size})
+    return count
+
+
+@task(queue='default', priority=-10, max_attempts=1)
+def normalize_cep_addresses(batch_size=None) -> dict:
+    """
+    Normalize the CEP of every address and fill in their fields from the
+    CEP index, return how many addresses were checked and changed.
+    """
+    results = {}
+    for model, fields in address_models():
+        checked, changed = normalize_addresses(model, fields, batch_size)
+        results[model._meta.label] = {'checked': checked, 'changed': changed}
+    return results
@@ -3,7 +3,7 @@ Tests data for the core app.
 """
 
 USER_DATA_TEST = {
-    'cpf': '12345678901',
+    'cpf': '12345678909',
     'email': 'exemplae@domain.com',
     'name': 'Test User',
     'password': 'testpass123',
@@ -11,7 +11,7 @@ USER_DATA_TEST = {
 }
 
 USER_DATA_TEST_SAMPLE = {
-    'cpf': '12345678902',
+    'cpf': '11144477735',
     'email': 'example2@domain.com',
     'name': 'Test User 2',
     'password': 'testpass123',
@@ -19,7 +19,7 @@ USER_DATA_TEST_SAMPLE = {
 }
 
 SUPERVISOR_DATA_TEST = {
-    'cpf': '12345678903',
+    'cpf': '52998224725',
     'email': 'supervisor@domain.com',
     'name': 'Test Supervisor',
     'password': 'testpass123',
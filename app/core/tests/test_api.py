@@ -67,7 +67,7 @@ class UserApiTests(TestCase):
             'email': 'newuser1@gmail.com',
             'name': 'Test User',
             'password': 'testpass123',
-            'cpf': '1234567891',
+            'cpf': '12345678062',
             'phone': '99999999999'
         }, format='json')
         self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
@@ -148,7 +148,7 @@ class UserApiTests(TestCase):
             'email': 'exampl@gmail.com',
             'name': 'Test User22',
             'password': 'testpass123',
-            'cpf': '1234589075'
+            'cpf': '12345890797'
         }, format='json')
         self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
 
@@ -197,6 +197,18 @@ class SupervisorApiTest(TestCase):
         )
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
 
+    def test_create_user_invalid_cpf_fail(self):
+        """
+        Test creating user with wrong CPF check digits fails.
+        """
+        res = self.client.post(
+            reverse('core:user-list'),
+            {**USER_DATA_TEST_SAMPLE, 'cpf': '11144477736'},
+            format='json'
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('cpf', res.data)
+
     def test_create_exist_user_fail(self):
         """
         Test creating user that already exists fails.
@@ -323,7 +335,7 @@ class AdminApiTest(TestCase):
         res = self.client.post(
             reverse('core:admin-user-list'),
             {
-                'cpf': '123458901',
+                'cpf': '12345890100',
                 'phone': '99999999999',
                 'email': 'adminuser@gmail.com',
                 'name': 'Test Admin',
@@ -384,7 +396,7 @@ class AdminApiTest(TestCase):
         res = self.client.post(
             reverse('core:admin-user-list'),
             {
-                'cpf': '123456701',
+                'cpf': '12345670169',
                 'email': 'adminnewuser@gmail.com',
                 'name': 'Test Admin',
                 'password': 'testpass123'
@@ -406,7 +418,7 @@ class AdminApiTest(TestCase):
         res = self.client.post(
             reverse('core:admin-user-list'),
             {
-                'cpf': '123456781',
+                'cpf': '12345678143',
                 'email': 'adminnewuser@gmail.com',
                 'name': 'Test Admin',
                 'password': 'testpass123'
@@ -434,7 +446,7 @@ class AdminApiTest(TestCase):
         res = self.client.post(
             reverse('core:admin-user-list'),
             {
-                'cpf': '123456901',
+                'cpf': '12345690194',
                 'email': 'adminusertotest@gmail.com',
                 'name': 'Test Admin',
                 'password': 'testpass123'
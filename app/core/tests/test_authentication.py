@@ -0,0 +1,140 @@
+"""
+Tests for JWT authentication and its verified token cache.
+"""
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import (
+    AccessToken,
+    RefreshToken,
+    UntypedToken,
+)
+
+from core import authentication
+from core.metrics import registry
+from core.tests.data_test import USER_DATA_TEST
+
+ME_URL = reverse('core:me')
+VERIFY_URL = reverse('core:verify-token')
+
+
+def create_user(**params):
+    """
+    Helper function to create a user.
+    """
+    return get_user_model().objects.create_user(**params)
+
+
+def cache_lookups() -> dict:
+    """Return the recorded verified token cache lookups by result."""
+    return {labels[0]: value for labels, value in
+            registry.values['jwt_verify_cache_total'].items()}
+
+
+class VerifiedTokenCacheTests(TestCase):
+    """Tests for the verified token cache."""
+
+    def setUp(self) -> None:
+        self.cache = authentication.VerifiedTokenCache()
+        registry.clear()
+        self.addCleanup(registry.clear)
+        self.user = create_user(**USER_DATA_TEST)
+        return super().setUp()
+
+    def test_verified_once(self):
+        """Test a token is verified once, then served from the cache."""
+        raw = str(AccessToken.for_user(self.user))
+        verify = mock.Mock(side_effect=AccessToken)
+
+        first = self.cache.get_or_verify('auth', raw, verify)
+        second = self.cache.get_or_verify('auth', raw, verify)
+
+        self.assertIs(first, second)
+        verify.assert_called_once_with(raw)
+        self.assertEqual(cache_lookups(), {'miss': 1, 'hit': 1})
+
+    def test_kinds_are_separate(self):
+        """Test a token verified for one use is verified again for another."""
+        raw = str(RefreshToken.for_user(self.user))
+        self.cache.get_or_verify('verify', raw, UntypedToken)
+
+        with self.assertRaises(TokenError):
+            self.cache.get_or_verify('auth', raw, AccessToken)
+
+    def test_expired_tokens_are_dropped(self):
+        """Test an expired token is verified again."""
+        token = AccessToken.for_user(self.user)
+        key = self.cache.key('auth', str(token))
+        self.cache.set(key, token)
+
+        with mock.patch('core.authentication.time.time',
+                        return_value=token['exp']):
+            self.assertIsNone(self.cache.get(key))
+        self.assertEqual(len(self.cache), 0)
+
+    @override_settings(TOKEN_CACHE={'MAX_SIZE': 2})
+    def test_least_recently_used_are_evicted(self):
+        """Test the cache keeps its most recently used tokens."""
+        tokens = [AccessToken.for_user(self.user) for _ in range(3)]
+        keys = [self.cache.key('auth', str(token)) for token in tokens]
+        self.cache.set(keys[0], tokens[0])
+        self.cache.set(keys[1], tokens[1])
+        self.cache.get(keys[0])
+        self.cache.set(keys[2], tokens[2])
+
+        self.assertIsNone(self.cache.get(keys[1]))
+        self.assertIs(self.cache.get(keys[0]), tokens[0])
+        self.assertEqual(
+            registry.values['jwt_verify_cache_evictions_total'], {(): 1})
+
+    @override_settings(TOKEN_CACHE={'ENABLED': False})
+    def test_disabled(self):
+        """Test tokens are always verified when the cache is disabled."""
+        raw = str(AccessToken.for_user(self.user))
+        verify = mock.Mock(side_effect=AccessToken)
+
+        self.cache.get_or_verify('auth', raw, verify)
+        self.cache.get_or_verify('auth', raw, verify)
+
+        self.assertEqual(verify.call_count, 2)
+        self.assertEqual(len(self.cache), 0)
+
+
+class CachedAuthenticationTests(TestCase):
+    """Tests for the verified token cache used by the API."""
+
+    def setUp(self) -> None:
+        authentication.token_cache.clear()
+        self.addCleanup(authentication.token_cache.clear)
+        self.user = create_user(**USER_DATA_TEST)
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+        self.client = APIClient()
+        return super().setUp()
+
+    def test_requests_verify_token_once(self):
+        """Test repeated requests verify their token once."""
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+        with mock.patch('rest_framework_simplejwt.tokens.Token.verify',
+                        autospec=True) as verify:
+            for _ in range(3):
+                res = self.client.get(ME_URL)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(verify.call_count, 1)
+
+    def test_verify_endpoint(self):
+        """Test token/verify/ caches valid tokens only."""
+        res = self.client.post(VERIFY_URL, {'token': self.token},
+                               format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.post(VERIFY_URL, {'token': self.token[:-2]},
+                               format='json')
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.assertEqual(len(authentication.token_cache), 1)
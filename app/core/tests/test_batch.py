@@ -0,0 +1,193 @@
+"""
+Tests for batched API requests.
+"""
+import json
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.signals import request_finished
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core import batch
+from core.tests.data_test import (
+    SUPERVISOR_DATA_TEST,
+    USER_DATA_TEST,
+    USER_DATA_TEST_SAMPLE,
+)
+
+BATCH_URL = reverse('core:batch')
+ME_PATH = reverse('core:me')
+PROFILE_PATH = reverse('core:user-profile-view')
+VERIFY_PATH = reverse('core:verify-token')
+
+
+def create_user(**params):
+    """
+    Helper function to create a user.
+    """
+    return get_user_model().objects.create_user(**params)
+
+
+class BatchTestMixin:
+    """Helpers of the batch tests."""
+
+    def login(self, user):
+        self.token = RefreshToken.for_user(user).access_token
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def post_batch(self, *items):
+        res = self.client.post(
+            BATCH_URL, {'requests': list(items)}, format='json')
+        if res.status_code == status.HTTP_200_OK:
+            res.responses = json.loads(res.content)['responses']
+        return res
+
+
+class BatchTests(BatchTestMixin, TestCase):
+    """Tests for the batch endpoint."""
+
+    def setUp(self) -> None:
+        self.user = create_user(**USER_DATA_TEST)
+        self.login(self.user)
+        return super().setUp()
+
+    def test_startup_calls(self):
+        """Test the startup calls of the app are answered at once."""
+        with mock.patch.object(
+                JWTAuthentication, 'get_user', autospec=True,
+                side_effect=JWTAuthentication.get_user) as get_user:
+            res = self.post_batch(
+                {'id': 'me', 'method': 'GET', 'path': ME_PATH},
+                {'id': 'profile', 'method': 'GET', 'path': PROFILE_PATH},
+                {'id': 'verify', 'method': 'POST', 'path': VERIFY_PATH,
+                 'body': {'token': str(self.token)}},
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(get_user.call_count, 1)
+        me, profile, verify = res.responses
+        self.assertEqual((me['id'], me['status']), ('me', 200))
+        self.assertEqual(me['body']['cpf'], USER_DATA_TEST['cpf'])
+        self.assertEqual(profile['status'], 200)
+        self.assertEqual(profile['body']['name'], USER_DATA_TEST['name'])
+        self.assertEqual(verify['status'], 200)
+        self.assertEqual(verify['body'], {})
+
+    def test_per_item_errors(self):
+        """Test failing sub-requests do not fail the batch."""
+        res = self.post_batch(
+            {'method': 'GET', 'path': '/admin/'},
+            {'method': 'GET', 'path': '/api/v1/missing/'},
+            {'method': 'POST', 'path': BATCH_URL, 'body': {'requests': []}},
+            {'method': 'GET',
+             'path': reverse('core:user-detail', args=[self.user.id + 1])},
+            {'method': 'POST', 'path': VERIFY_PATH, 'body': {'token': 'x'}},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['status'] for item in res.responses],
+                         [400, 404, 400, 403, 401])
+        self.assertIn('can not be batched', res.responses[2]['error'])
+
+    def test_writes_are_ordered(self):
+        """Test reads after a write see it."""
+        self.login(create_user(**SUPERVISOR_DATA_TEST))
+        list_path = reverse('core:user-list')
+
+        res = self.post_batch(
+            {'method': 'GET', 'path': list_path},
+            {'method': 'POST', 'path': list_path,
+             'body': USER_DATA_TEST_SAMPLE},
+            {'method': 'GET', 'path': list_path},
+        )
+
+        before, created, after = res.responses
+        self.assertEqual(created['status'], 201)
+        self.assertEqual(len(after['body']), len(before['body']) + 1)
+
+    def test_auth_required(self):
+        """Test batches need authentication."""
+        res = APIClient().post(
+            BATCH_URL, {'requests': [{'method': 'GET', 'path': ME_PATH}]},
+            format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(BATCH={'MAX_REQUESTS': 2})
+    def test_validation(self):
+        """Test empty, oversized and malformed batches are refused."""
+        item = {'method': 'GET', 'path': ME_PATH}
+        self.assertEqual(self.post_batch().status_code, 400)
+        self.assertEqual(self.post_batch(item, item, item).status_code, 400)
+        self.assertEqual(
+            self.post_batch({'method': 'TRACE', 'path': ME_PATH}).status_code,
+            400)
+
+
+@override_settings(BATCH={'MAX_WORKERS': 4})
+class ConcurrentBatchTests(BatchTestMixin, TransactionTestCase):
+    """Tests for the concurrent reads of a batch."""
+
+    def test_reads_run_concurrently(self):
+        """Test consecutive reads run on the thread pool."""
+        self.login(create_user(**USER_DATA_TEST))
+
+        with mock.patch.object(batch, 'run_in_thread',
+                               wraps=batch.run_in_thread) as run_in_thread:
+            res = self.post_batch(
+                *[{'id': str(index), 'method': 'GET', 'path': ME_PATH}
+                  for index in range(4)],
+                {'method': 'POST', 'path': VERIFY_PATH,
+                 'body': {'token': str(self.token)}},
+            )
+
+        self.assertEqual(run_in_thread.call_count, 4)
+        self.assertEqual([item['id'] for item in res.responses],
+                         ['0', '1', '2', '3', None])
+        self.assertTrue(all(item['status'] == 200 for item in res.responses))
+        self.assertEqual(res.responses[3]['body']['cpf'],
+                         USER_DATA_TEST['cpf'])
+
+    def test_pool_threads_run_request_wrappers(self):
+        """Test concurrent reads run the execute_wrappers of the batch."""
+        self.login(create_user(**USER_DATA_TEST))
+        threads = []
+
+        def record(execute, sql, params, many, context):
+            threads.append(threading.current_thread().name)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            res = self.post_batch(
+                {'method': 'GET', 'path': PROFILE_PATH},
+                {'method': 'GET', 'path': PROFILE_PATH},
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(any(name.startswith('batch') for name in threads))
+
+    def test_sub_responses_are_closed(self):
+        """Test each sub-response is closed, sending request_finished."""
+        self.login(create_user(**USER_DATA_TEST))
+        finished = mock.Mock()
+        request_finished.connect(finished)
+        self.addCleanup(request_finished.disconnect, finished)
+
+        res = self.post_batch(
+            {'method': 'GET', 'path': ME_PATH},
+            {'method': 'GET', 'path': ME_PATH},
+            {'method': 'POST', 'path': VERIFY_PATH,
+             'body': {'token': str(self.token)}},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        # The three sub-responses, then the batch response.
+        self.assertEqual(finished.call_count, 4)
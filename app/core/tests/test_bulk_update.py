@@ -0,0 +1,204 @@
+"""
+Tests for bulk partial updates.
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import UserProfile
+from core.tests.data_test import SUPERVISOR_DATA_TEST, USER_DATA_TEST
+
+USERS_BULK_URL = reverse('core:user-bulk-update')
+PROFILES_BULK_URL = reverse('core:user-profile-bulk-update')
+
+
+def create_user(**params):
+    """
+    Helper function to create a user.
+    """
+    return get_user_model().objects.create_user(**params)
+
+
+def create_users(count):
+    """Create `count` users, return them."""
+    return [
+        create_user(cpf=f'{index:011d}', email=f'user{index}@domain.com',
+                    name=f'User {index}', password='testpass123',
+                    phone=f'{index:011d}')
+        for index in range(1, count + 1)
+    ]
+
+
+class BulkUpdateUserTests(TestCase):
+    """Tests for `PATCH users/bulk/`."""
+
+    def setUp(self) -> None:
+        self.staff = create_user(**SUPERVISOR_DATA_TEST)
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+        return super().setUp()
+
+    def test_bulk_update(self):
+        """Test supervisors change many users at once."""
+        users = create_users(3)
+
+        res = self.client.patch(USERS_BULK_URL, [
+            {'id': user.id, 'name': f'Renamed {user.id}'} for user in users
+        ], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([result['status'] for result in res.data['results']],
+                         [200, 200, 200])
+        self.assertEqual(res.data['results'][0]['data']['name'],
+                         f'Renamed {users[0].id}')
+        for user in users:
+            user.refresh_from_db()
+            self.assertEqual(user.name, f'Renamed {user.id}')
+
+    def test_queries_do_not_grow(self):
+        """Test the number of queries does not depend on the changes."""
+        users = create_users(12)
+        counts = []
+        for batch in (users[:2], users[2:]):
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.patch(USERS_BULK_URL, [
+                    {'id': user.id, 'is_active': False} for user in batch
+                ], format='json')
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1])
+        self.assertFalse(get_user_model().objects.filter(
+            pk__in=[user.pk for user in users], is_active=True).exists())
+
+    def test_per_item_results(self):
+        """Test invalid, duplicate and unknown changes are reported."""
+        first, second = create_users(2)
+
+        res = self.client.patch(USERS_BULK_URL, [
+            {'id': first.id, 'email': 'not an email'},
+            {'id': second.id, 'name': 'Valid'},
+            {'id': second.id, 'name': 'Twice'},
+            {'id': 999999, 'name': 'Missing'},
+        ], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([result['status'] for result in res.data['results']],
+                         [400, 200, 400, 404])
+        self.assertIn('email', res.data['results'][0]['errors'])
+        second.refresh_from_db()
+        self.assertEqual(second.name, 'Valid')
+
+    def test_password_is_hashed(self):
+        """Test passwords changed in bulk are hashed."""
+        user, = create_users(1)
+
+        self.client.patch(USERS_BULK_URL, [
+            {'id': user.id, 'password': 'newpass1234'}], format='json')
+
+        user.refresh_from_db()
+        self.assertTrue(user.check_password('newpass1234'))
+
+    def test_conflicting_changes(self):
+        """Test changes conflicting with each other are all rolled back."""
+        first, second = create_users(2)
+
+        with self.assertLogs('core.mixins', 'WARNING') as logs:
+            res = self.client.patch(USERS_BULK_URL, [
+                {'id': first.id, 'name': 'Changed',
+                 'email': 'same@domain.com'},
+                {'id': second.id, 'email': 'same@domain.com'},
+            ], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertNotIn('core_user', res.data['detail'])
+        self.assertIn('core_user', logs.output[0])
+        first.refresh_from_db()
+        self.assertEqual(first.name, 'User 1')
+
+    def test_users_change_only_themselves(self):
+        """Test users without staff status only change their own data."""
+        user = create_user(**USER_DATA_TEST)
+        self.client.force_authenticate(user)
+
+        res = self.client.patch(USERS_BULK_URL, [
+            {'id': user.id, 'name': 'Me'},
+            {'id': self.staff.id, 'name': 'Not me'},
+        ], format='json')
+
+        self.assertEqual([result['status'] for result in res.data['results']],
+                         [200, 403])
+        self.staff.refresh_from_db()
+        self.assertEqual(self.staff.name, SUPERVISOR_DATA_TEST['name'])
+
+    def test_invalid_body(self):
+        """Test bodies which are not a list of changes are refused."""
+        for body in ({'id': 1}, [], [{'name': 'No id'}], ['text']):
+            res = self.client.patch(USERS_BULK_URL, body, format='json')
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BulkUpdateProfileTests(TestCase):
+    """Tests for `PATCH admin/user-profiles/bulk/`."""
+
+    def setUp(self) -> None:
+        self.staff = create_user(**SUPERVISOR_DATA_TEST)
+        self.user = create_user(**USER_DATA_TEST)
+        self.profiles = [
+            UserProfile.objects.create(user=self.staff, name='Staff'),
+            UserProfile.objects.create(user=self.user, name='User'),
+        ]
+        self.client = APIClient()
+        return super().setUp()
+
+    def test_supervisors_update_profiles(self):
+        """Test supervisors change many profiles at once."""
+        self.profiles += [
+            UserProfile.objects.create(user=user, name=user.name)
+            for user in create_users(3)]
+        self.client.force_authenticate(self.staff)
+
+        with self.assertNumQueries(4):
+            res = self.client.patch(PROFILES_BULK_URL, [
+                {'id': profile.id, 'name': f'{profile.name} fixed'}
+                for profile in self.profiles
+            ], format='json')
+
+        self.assertEqual([result['status'] for result in res.data['results']],
+                         [200] * 5)
+        self.assertEqual(res.data['results'][1]['data']['user']['cpf'],
+                         USER_DATA_TEST['cpf'])
+        self.assertEqual(
+            sorted(UserProfile.objects.values_list('name', flat=True)),
+            ['Staff fixed', 'User 1 fixed', 'User 2 fixed', 'User 3 fixed',
+             'User fixed'])
+
+    def test_supervisors_update_profile(self):
+        """Test supervisors change any profile with PATCH too."""
+        self.client.force_authenticate(self.staff)
+
+        res = self.client.patch(
+            reverse('core:user-profile-detail', args=[self.profiles[1].id]),
+            {'name': 'Fixed'}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.profiles[1].refresh_from_db()
+        self.assertEqual(self.profiles[1].name, 'Fixed')
+
+    def test_users_update_own_profile(self):
+        """Test users only change their own profile."""
+        self.client.force_authenticate(self.user)
+
+        res = self.client.patch(PROFILES_BULK_URL, [
+            {'id': profile.id, 'name': 'Changed'}
+            for profile in self.profiles
+        ], format='json')
+
+        self.assertEqual([result['status'] for result in res.data['results']],
+                         [403, 200])
+        self.profiles[0].refresh_from_db()
+        self.assertEqual(self.profiles[0].name, 'Staff')
@@ -0,0 +1,253 @@
+"""
+Tests for the CEP lookups.
+"""
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import cep
+from core.models import Address
+from core.tests.data_test import USER_DATA_TEST
+from pregnancy.models import Address as PregnancyAddress
+
+SEARCH_URL = reverse('core:cep-search')
+DATASET = [
+    {'cep': '01310-100', 'street': 'Avenida Paulista',
+     'neighborhood': 'Bela Vista', 'city': 'São Paulo', 'state': 'SP'},
+    {'cep': '01310200', 'street': 'Avenida Paulista',
+     'neighborhood': 'Bela Vista', 'city': 'São Paulo', 'state': 'SP'},
+    {'cep': '01311000', 'street': 'Avenida Paulista',
+     'neighborhood': 'Cerqueira César', 'city': 'São Paulo', 'state': 'SP'},
+    {'cep': '20040020', 'street': 'Avenida Rio Branco',
+     'neighborhood': 'Centro', 'city': 'Rio de Janeiro', 'state': 'RJ'},
+    {'cep': '69900000', 'street': '', 'neighborhood': '',
+     'city': 'Rio Branco', 'state': 'AC'},
+    {'cep': 'invalid', 'street': 'Skipped'},
+]
+
+
+def detail_url(code):
+    """Return the URL of the address of CEP `code`."""
+    return reverse('core:cep-detail', args=[code])
+
+
+def create_user(**params):
+    """
+    Helper function to create a user.
+    """
+    return get_user_model().objects.create_user(**params)
+
+
+class IndexMixin:
+    """Build the index of DATASET in a temporary file for each test."""
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cep.idx')
+        cep.write_index(DATASET, self.path)
+        settings = override_settings(CEP={'INDEX_FILE': self.path,
+                                          'AUTOCOMPLETE_LIMIT': 2})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(cep.load_index.cache_clear)
+        return super().setUp()
+
+
+class CepIndexTests(IndexMixin, SimpleTestCase):
+    """Tests for the memory-mapped CEP index."""
+
+    def test_normalize_cep(self):
+        """Test CEPs are normalized to 8 digits."""
+        for value in ('01310-100', '01310100', ' 01.310-100 '):
+            self.assertEqual(cep.normalize_cep(value), '01310100', value)
+        for value in ('0131010', '013101000', '01310-10a', '０１３１０１００',
+                      '', None, 1310100):
+            self.assertIsNone(cep.normalize_cep(value), value)
+
+    def test_get(self):
+        """Test CEPs are found by binary search, unknown ones are not."""
+        index = cep.get_index()
+
+        self.assertEqual(len(index), 5)
+        self.assertEqual(index.get('20040020'), {
+            'cep': '20040020', 'street': 'Avenida Rio Branco',
+            'neighborhood': 'Centro', 'city': 'Rio de Janeiro',
+            'state': 'RJ'})
+        self.assertEqual(index.get('69900000')['city'], 'Rio Branco')
+        self.assertEqual(index.get('01311000')['neighborhood'],
+                         'Cerqueira César')
+        for missing in ('00000000', '01310150', '99999999'):
+            self.assertIsNone(index.get(missing), missing)
+
+    def test_search(self):
+        """Test prefix searches return the first CEPs in order."""
+        index = cep.get_index()
+
+        self.assertEqual([address['cep'] for address in
+                          index.search('0131', 10)],
+                         ['01310100', '01310200', '01311000'])
+        self.assertEqual(len(index.search('0131', 2)), 2)
+        self.assertEqual(index.search('02', 10), [])
+        self.assertEqual(index.search('9', 10), [])
+
+    def test_missing_index(self):
+        """Test a missing index disables lookups."""
+        with override_settings(CEP={'INDEX_FILE': self.path + '.missing'}), \
+                self.assertLogs('core.cep', 'WARNING'):
+            self.assertIsNone(cep.get_index())
+
+    def test_index_built_later(self):
+        """Test an index built after a failed lookup is used."""
+        path = self.path + '.later'
+        with override_settings(CEP={'INDEX_FILE': path}):
+            with self.assertLogs('core.cep', 'WARNING'):
+                self.assertIsNone(cep.get_index())
+            cep.write_index(DATASET, path)
+
+            self.assertEqual(len(cep.get_index()), 5)
+
+    def test_empty_index(self):
+        """Test an index without records finds nothing."""
+        cep.write_index([], self.path + '.empty')
+        index = cep.CepIndex(self.path + '.empty')
+
+        self.assertEqual(len(index), 0)
+        self.assertIsNone(index.get('01310100'))
+        self.assertEqual(index.search('013', 10), [])
+
+    def test_build_command(self):
+        """Test the command builds the index from a CSV dataset."""
+        source = self.path + '.csv'
+        with open(source, 'w', encoding='utf-8') as csv_file:
+            csv_file.write('cep;street;neighborhood;city;state\n'
+                           '01310-100;Avenida Paulista;Bela Vista;'
+                           'São Paulo;SP\n')
+        out = StringIO()
+
+        call_command('build_cep_index', source, file=self.path + '.built',
+                     delimiter=';', stdout=out)
+
+        self.assertIn('1 CEPs', out.getvalue())
+        self.assertEqual(
+            cep.CepIndex(self.path + '.built').get('01310100')['street'],
+            'Avenida Paulista')
+
+
+class CepApiTests(IndexMixin, TestCase):
+    """Tests for the CEP endpoints."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(create_user(**USER_DATA_TEST))
+
+    def test_detail(self):
+        """Test looking up a CEP, typed with or without a dash."""
+        res = self.client.get(detail_url('01310-100'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['cep'], '01310100')
+        self.assertEqual(res.data['city'], 'São Paulo')
+        self.assertIn('max-age', res['Cache-Control'])
+        self.assertEqual(self.client.get(detail_url('01310150')).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    def test_autocomplete(self):
+        """Test the autocomplete returns up to AUTOCOMPLETE_LIMIT CEPs."""
+        with self.assertNumQueries(0):
+            res = self.client.get(SEARCH_URL, {'q': '01310-'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([address['cep'] for address in res.data],
+                         ['01310100', '01310200'])
+
+    def test_autocomplete_needs_digits(self):
+        """Test too short or invalid prefixes are refused."""
+        for prefix in ('01', 'abc', ''):
+            res = self.client.get(SEARCH_URL, {'q': prefix})
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST,
+                             prefix)
+
+    def test_authentication_required(self):
+        """Test lookups need an authenticated user."""
+        res = APIClient().get(SEARCH_URL, {'q': '013'})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_missing_index(self):
+        """Test lookups are unavailable without an index."""
+        with override_settings(CEP={'INDEX_FILE': self.path + '.missing'}), \
+                self.assertLogs('core.cep', 'WARNING'):
+            res = self.client.get(SEARCH_URL, {'q': '013'})
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+class NormalizeAddressesTests(IndexMixin, TestCase):
+    """Tests for the normalization of existing addresses."""
+
+    def test_normalize(self):
+        """Test known CEPs are normalized and their addresses filled in."""
+        blank = Address.objects.create(cep='01310-100', city='sao paulo')
+        typed = Address.objects.create(cep='20040 020', street='Av. Rio '
+                                       'Branco, 156', state='Rio')
+        unknown = Address.objects.create(cep='99999-999', city='Typed')
+        Address.objects.create(cep=None)
+
+        self.assertEqual(
+            cep.normalize_addresses(Address, {
+                'cep': 'cep', 'street': 'street', 'city': 'city',
+                'state': 'state'}, batch_size=2),
+            (3, 2))
+
+        blank.refresh_from_db()
+        self.assertEqual(
+            (blank.cep, blank.street, blank.city, blank.state),
+            ('01310100', 'Avenida Paulista', 'São Paulo', 'SP'))
+        typed.refresh_from_db()
+        self.assertEqual(
+            (typed.cep, typed.street, typed.city, typed.state),
+            ('20040020', 'Av. Rio Branco, 156', 'Rio de Janeiro', 'RJ'))
+        unknown.refresh_from_db()
+        self.assertEqual((unknown.cep, unknown.city), ('99999-999', 'Typed'))
+
+    def test_command(self):
+        """Test the command normalizes the addresses of every model."""
+        PregnancyAddress.objects.create(
+            street='Rua A', city='x', state='y', zip_code='69900-000')
+        out = StringIO()
+
+        call_command('normalize_addresses', stdout=out)
+
+        self.assertIn('pregnancy.Address: 1 of 1 addresses normalized.',
+                      out.getvalue())
+        address = PregnancyAddress.objects.get()
+        self.assertEqual(
+            (address.zip_code, address.street, address.city, address.state),
+            ('69900000', 'Rua A', 'Rio Branco', 'AC'))
+
+    def test_dry_run(self):
+        """Test a dry run changes nothing."""
+        Address.objects.create(cep='01310-100')
+        out = StringIO()
+
+        call_command('normalize_addresses', dry_run=True, stdout=out)
+
+        self.assertIn('core.Address: 1 of 1 addresses to normalize.',
+                      out.getvalue())
+        self.assertEqual(Address.objects.get().cep, '01310-100')
+
+    def test_missing_index(self):
+        """Test the command fails without an index."""
+        with override_settings(CEP={'INDEX_FILE': self.path + '.missing'}), \
+                self.assertLogs('core.cep', 'WARNING'), \
+                self.assertRaises(CommandError):
+            call_command('normalize_addresses', stdout=StringIO())
@@ -0,0 +1,165 @@
+"""
+Tests for read replica routing.
+"""
+from unittest.mock import patch
+
+from django.contrib.auth.models import Group
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core import db_router
+from core.db_router import (
+    ReplicaPool,
+    ReplicaRouter,
+    ReplicaRoutingMiddleware,
+    use_primary,
+    use_replica,
+)
+from core.models import User
+
+REPLICAS = {
+    'ALIASES': ['replica1', 'replica2'],
+    'APPS': ['core', 'pregnancy'],
+    'PIN_SECONDS': 5,
+    'CACHE': 'replica_pin',
+    'HEALTH_CHECK_INTERVAL': 3600,
+}
+USER_ID = 'core.authentication.request_user_id'
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS)
+class ReplicaRouterTests(SimpleTestCase):
+    """Tests for ReplicaRouter, outside of the TestCase transaction."""
+    databases = {'default'}
+
+    def setUp(self) -> None:
+        self.pool = ReplicaPool()
+        self.pool.mark('replica1', True)
+        self.pool.mark('replica2', True)
+        patcher = patch.object(db_router, 'pool', self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = ReplicaRouter()
+        return super().setUp()
+
+    def test_reads_use_primary_by_default(self):
+        """Test reads outside of a replica context use the primary."""
+        self.assertEqual(self.router.db_for_read(User), 'default')
+
+    def test_round_robin(self):
+        """Test replica reads alternate between the replicas."""
+        with use_replica():
+            aliases = [self.router.db_for_read(User) for _ in range(4)]
+
+        self.assertEqual(sorted(aliases), ['replica1', 'replica1',
+                                           'replica2', 'replica2'])
+        self.assertNotEqual(aliases[0], aliases[1])
+
+    def test_unhealthy_replica_is_skipped(self):
+        """Test reads skip unhealthy replicas and fall back to primary."""
+        self.pool.mark('replica2', False)
+        with use_replica():
+            aliases = {self.router.db_for_read(User) for _ in range(4)}
+            self.assertEqual(aliases, {'replica1'})
+
+            self.pool.mark('replica1', False)
+            self.assertEqual(self.router.db_for_read(User), 'default')
+
+    def test_health_check_of_unknown_alias(self):
+        """Test replicas that can not be reached are unhealthy."""
+        with self.assertLogs('core.db_router', level='WARNING'):
+            healthy = ReplicaPool().is_healthy(
+                'missing', {**REPLICAS, 'MAX_LAG_SECONDS': 5})
+
+        self.assertFalse(healthy)
+
+    def test_write_pins_the_context(self):
+        """Test reads after a write use the primary."""
+        with use_replica():
+            self.assertNotEqual(self.router.db_for_read(User), 'default')
+            self.assertEqual(self.router.db_for_write(User), 'default')
+            self.assertEqual(self.router.db_for_read(User), 'default')
+
+    def test_primary_only_contexts(self):
+        """Test other apps, transactions and use_primary use the primary."""
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Group), 'default')
+            with use_primary():
+                self.assertEqual(self.router.db_for_read(User), 'default')
+            with transaction.atomic():
+                self.assertEqual(self.router.db_for_read(User), 'default')
+
+    def test_replicas_are_not_migrated(self):
+        """Test migrations only run on the primary."""
+        self.assertFalse(self.router.allow_migrate('replica1', 'core'))
+        self.assertIsNone(self.router.allow_migrate('default', 'core'))
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS)
+class ReplicaRoutingMiddlewareTests(SimpleTestCase):
+    """Tests for ReplicaRoutingMiddleware."""
+
+    def setUp(self) -> None:
+        caches['replica_pin'].clear()
+        self.addCleanup(caches['replica_pin'].clear)
+        pool = ReplicaPool()
+        pool.mark('replica1', True)
+        pool.mark('replica2', True)
+        patcher = patch.object(db_router, 'pool', pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+        self.middleware = ReplicaRoutingMiddleware(self.view)
+        return super().setUp()
+
+    def view(self, request):
+        """Record where reads go, writing on POST."""
+        router = ReplicaRouter()
+        if request.method == 'POST':
+            router.db_for_write(User)
+        self.read_alias = router.db_for_read(User)
+        return HttpResponse()
+
+    def request(self, method, ip='10.0.0.1', user_id=None):
+        """Run a request of a client and return the alias it read from."""
+        request = getattr(self.factory, method)(
+            '/api/v1/users/', REMOTE_ADDR=ip)
+        with patch(USER_ID, return_value=user_id):
+            self.middleware(request)
+        return self.read_alias
+
+    def test_safe_request_reads_from_replica(self):
+        """Test GET requests read from a replica."""
+        self.assertIn(self.request('get'), REPLICAS['ALIASES'])
+
+    def test_read_your_writes(self):
+        """Test a client that wrote reads from the primary for a while."""
+        self.assertEqual(self.request('post'), 'default')
+
+        self.assertEqual(self.request('get'), 'default')
+        self.assertIn(self.request('get', ip='10.0.0.2'), REPLICAS['ALIASES'])
+
+    def test_pin_follows_the_user(self):
+        """Test the pin of a user holds across tokens and addresses."""
+        self.request('post', user_id='7')
+
+        self.assertEqual(self.request('get', ip='10.0.0.2', user_id='7'),
+                         'default')
+        self.assertIn(self.request('get', user_id='8'), REPLICAS['ALIASES'])
+
+    def test_pins_are_shared_by_workers(self):
+        """Test pins are stored in a cache every worker process sees."""
+        backend = settings.CACHES[
+            settings.DATABASE_REPLICAS['CACHE']]['BACKEND']
+
+        self.assertNotIn('locmem', backend.lower())
+
+    @override_settings(DATABASE_REPLICAS={**REPLICAS, 'PIN_SECONDS': 0})
+    def test_pin_expires(self):
+        """Test the pin only lasts PIN_SECONDS."""
+        self.request('post')
+
+        self.assertIn(self.request('get'), REPLICAS['ALIASES'])
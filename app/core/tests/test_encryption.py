@@ -0,0 +1,271 @@
+"""
+Tests for the encrypted fields and their blind indexes.
+"""
+from io import StringIO
+from unittest import mock
+
+from cryptography.fernet import Fernet
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import FieldError, ImproperlyConfigured
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.db.migrations.loader import MigrationLoader
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.checks import check_field_encryption_keys
+from core.encryption import (
+    ENCRYPTED_PREFIX,
+    encrypt,
+    encrypt_batch,
+    field_encryption_settings,
+)
+from core.tasks import encrypt_identifiers
+from core.tests.data_test import SUPERVISOR_DATA_TEST, USER_DATA_TEST
+from jobs.models import Job
+
+TOKEN_URL = reverse('core:token')
+USERS_URL = reverse('core:user-list')
+USERS_BULK_URL = reverse('core:user-bulk-update')
+FALLBACK = {**settings.FIELD_ENCRYPTION, 'PLAINTEXT_FALLBACK': True}
+NO_FALLBACK = {**settings.FIELD_ENCRYPTION, 'PLAINTEXT_FALLBACK': False}
+NO_KEYS = {'KEYS': [], 'BLIND_INDEX_KEY': ''}
+OTHER_CPF = '98765432100'
+
+
+def create_user(**params):
+    """
+    Helper function to create a user.
+    """
+    return get_user_model().objects.create_user(**params)
+
+
+def stored_cpf(user) -> tuple:
+    """Return the stored CPF and blind index of `user`."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT cpf, cpf_index FROM core_user WHERE id = %s', [user.pk])
+        return cursor.fetchone()
+
+
+def store_plaintext(user):
+    """Store the CPF of `user` in plaintext, as before encryption."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE core_user SET cpf = %s, cpf_index = NULL WHERE id = %s',
+            [user.cpf, user.pk])
+
+
+class EncryptedFieldTests(TestCase):
+    """Tests for the encrypted CPF of users."""
+
+    def setUp(self) -> None:
+        self.user = create_user(**USER_DATA_TEST)
+        return super().setUp()
+
+    def test_stored_encrypted(self):
+        """Test the CPF is stored encrypted, with its blind index."""
+        cpf, index = stored_cpf(self.user)
+
+        self.assertTrue(cpf.startswith(ENCRYPTED_PREFIX))
+        self.assertNotIn(USER_DATA_TEST['cpf'], cpf)
+        self.assertEqual(len(index), 64)
+        self.assertEqual(
+            get_user_model().objects.get(pk=self.user.pk).cpf,
+            USER_DATA_TEST['cpf'])
+
+    def test_equal_values_have_different_ciphertexts(self):
+        """Test encryption is randomized, the blind index is not."""
+        first = stored_cpf(self.user)
+        self.user.save()
+        second = stored_cpf(self.user)
+
+        self.assertNotEqual(first[0], second[0])
+        self.assertEqual(first[1], second[1])
+
+    def test_lookup_by_blind_index(self):
+        """Test lookups compare blind indexes, never the plaintext."""
+        with CaptureQueriesContext(connection) as queries:
+            user = get_user_model().objects.get(cpf=USER_DATA_TEST['cpf'])
+
+        self.assertEqual(user, self.user)
+        self.assertNotIn(USER_DATA_TEST['cpf'], queries[0]['sql'])
+        self.assertFalse(get_user_model().objects.filter(
+            cpf=OTHER_CPF).exists())
+
+    def test_unsupported_lookups(self):
+        """Test lookups other than exact and isnull are refused."""
+        with self.assertRaises(FieldError):
+            get_user_model().objects.filter(cpf__startswith='123').exists()
+
+    def test_unique(self):
+        """Test a CPF can only be used once."""
+        with self.assertRaises(IntegrityError):
+            create_user(**{**USER_DATA_TEST, 'email': 'other@domain.com'})
+
+    def test_unique_validation(self):
+        """Test a used CPF is refused by the serializer, not the database."""
+        client = APIClient()
+        client.force_authenticate(
+            get_user_model().objects.create_superuser(**SUPERVISOR_DATA_TEST))
+
+        res = client.post(USERS_URL, {
+            **USER_DATA_TEST, 'email': 'other@domain.com'}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('cpf', res.data)
+
+    def test_key_rotation(self):
+        """Test values encrypted with a previous key are still read."""
+        old_keys = field_encryption_settings()['KEYS']
+        new_key = Fernet.generate_key().decode()
+
+        with override_settings(FIELD_ENCRYPTION={
+                **settings.FIELD_ENCRYPTION, 'KEYS': [new_key, *old_keys]}):
+            user = get_user_model().objects.get(pk=self.user.pk)
+            self.assertEqual(user.cpf, USER_DATA_TEST['cpf'])
+            user.save()
+        with override_settings(FIELD_ENCRYPTION={
+                **settings.FIELD_ENCRYPTION, 'KEYS': [new_key]}):
+            user = get_user_model().objects.get(cpf=USER_DATA_TEST['cpf'])
+            self.assertEqual(user.cpf, USER_DATA_TEST['cpf'])
+
+    def test_login(self):
+        """Test users log in with their CPF."""
+        res = APIClient().post(TOKEN_URL, {
+            'cpf': USER_DATA_TEST['cpf'],
+            'password': USER_DATA_TEST['password'],
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_bulk_update_sets_blind_index(self):
+        """Test CPFs changed in bulk are looked up by their new value."""
+        client = APIClient()
+        client.force_authenticate(create_user(**SUPERVISOR_DATA_TEST))
+
+        res = client.patch(USERS_BULK_URL, [
+            {'id': self.user.id, 'cpf': OTHER_CPF},
+        ], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user = get_user_model().objects.get(cpf=OTHER_CPF)
+        self.assertEqual(user, self.user)
+        self.assertEqual(user.cpf, OTHER_CPF)
+        self.assertFalse(get_user_model().objects.filter(
+            cpf=USER_DATA_TEST['cpf']).exists())
+
+
+class EncryptionKeysTests(SimpleTestCase):
+    """Tests for the settings of the encryption keys."""
+
+    @override_settings(FIELD_ENCRYPTION=NO_KEYS)
+    def test_keys_are_required(self):
+        """Test nothing is encrypted without keys."""
+        with self.assertRaises(ImproperlyConfigured):
+            encrypt(USER_DATA_TEST['cpf'])
+
+    def test_check(self):
+        """Test keys missing outside DEBUG fail the system checks."""
+        with override_settings(DEBUG=False, FIELD_ENCRYPTION=NO_KEYS):
+            self.assertEqual(
+                [error.id for error in check_field_encryption_keys(None)],
+                ['core.E001', 'core.E001'])
+        with override_settings(DEBUG=True, FIELD_ENCRYPTION=NO_KEYS):
+            self.assertEqual(check_field_encryption_keys(None), [])
+        with override_settings(DEBUG=False, FIELD_ENCRYPTION={
+                'KEYS': [Fernet.generate_key().decode()],
+                'BLIND_INDEX_KEY': Fernet.generate_key().decode()}):
+            self.assertEqual(check_field_encryption_keys(None), [])
+
+    @override_settings(FIELD_ENCRYPTION={**NO_KEYS,
+                                         'DEVELOPMENT_KEYS': True})
+    def test_development_keys(self):
+        """Test development keys are derived from SECRET_KEY."""
+        options = field_encryption_settings()
+        self.assertEqual(len(options['KEYS']), 1)
+        self.assertTrue(options['BLIND_INDEX_KEY'])
+        with override_settings(SECRET_KEY='other'):
+            self.assertNotEqual(field_encryption_settings()['KEYS'],
+                                options['KEYS'])
+
+
+@override_settings(FIELD_ENCRYPTION=FALLBACK)
+class PlaintextMigrationTests(TestCase):
+    """Tests for the encryption of rows stored in plaintext."""
+
+    def setUp(self) -> None:
+        self.user = create_user(**USER_DATA_TEST)
+        store_plaintext(self.user)
+        return super().setUp()
+
+    def test_plaintext_fallback(self):
+        """Test plaintext rows are found until they are encrypted."""
+        self.assertEqual(
+            get_user_model().objects.get(cpf=USER_DATA_TEST['cpf']),
+            self.user)
+        with override_settings(FIELD_ENCRYPTION=NO_FALLBACK):
+            self.assertFalse(get_user_model().objects.filter(
+                cpf=USER_DATA_TEST['cpf']).exists())
+
+    def test_encrypt_batch(self):
+        """Test batches encrypt plaintext rows and set their index."""
+        other = create_user(**{**USER_DATA_TEST,
+                               'cpf': OTHER_CPF,
+                               'email': 'other@domain.com'})
+        store_plaintext(other)
+        encrypted = create_user(**SUPERVISOR_DATA_TEST)
+        ciphertext = stored_cpf(encrypted)
+
+        self.assertEqual(encrypt_batch(get_user_model(), 1), 1)
+        self.assertEqual(encrypt_batch(get_user_model(), 5), 1)
+        self.assertEqual(encrypt_batch(get_user_model(), 5), 0)
+
+        cpf, index = stored_cpf(self.user)
+        self.assertTrue(cpf.startswith(ENCRYPTED_PREFIX))
+        self.assertIsNotNone(index)
+        self.assertEqual(
+            [user.cpf for user in get_user_model().objects.order_by('pk')],
+            [USER_DATA_TEST['cpf'], OTHER_CPF, SUPERVISOR_DATA_TEST['cpf']])
+        self.assertEqual(stored_cpf(encrypted), ciphertext)
+        with override_settings(FIELD_ENCRYPTION=NO_FALLBACK):
+            self.assertEqual(
+                get_user_model().objects.get(cpf=USER_DATA_TEST['cpf']),
+                self.user)
+
+    def test_data_migration(self):
+        """Test migrating encrypts the rows stored in plaintext."""
+        loader = MigrationLoader(connection)
+        migration = loader.get_migration('core', '0008_encrypt_cpf_rows')
+        state = loader.project_state(('core', '0008_encrypt_cpf_rows'))
+
+        migration.operations[0].code(state.apps,
+                                     mock.Mock(connection=connection))
+
+        self.assertTrue(stored_cpf(self.user)[0].startswith(ENCRYPTED_PREFIX))
+        with override_settings(FIELD_ENCRYPTION=NO_FALLBACK):
+            self.assertEqual(
+                get_user_model().objects.get(cpf=USER_DATA_TEST['cpf']),
+                self.user)
+
+    def test_command(self):
+        """Test the command encrypts every plaintext row."""
+        out = StringIO()
+        call_command('encrypt_identifiers', batch_size=10, stdout=out)
+
+        self.assertIn('core.User: 1 rows encrypted.', out.getvalue())
+        self.assertTrue(stored_cpf(self.user)[0].startswith(ENCRYPTED_PREFIX))
+
+    def test_task_queues_next_batch(self):
+        """Test the task queues itself again while rows are left."""
+        self.assertEqual(encrypt_identifiers(batch_size=10), 1)
+        self.assertEqual(Job.objects.filter(
+            name='core.tasks.encrypt_identifiers').count(), 1)
+
+        self.assertEqual(encrypt_identifiers(batch_size=10), 0)
+        self.assertEqual(Job.objects.filter(
+            name='core.tasks.encrypt_identifiers').count(), 1)
@@ -0,0 +1,123 @@
+"""
+Tests for the values() based read-only serializers.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import serializers
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from core.fast_serializers import ValuesSerializer
+from core.models import User, UserProfile
+from core.serializers import UserProfileSerializer, UserSerializer
+from core.tests.data_test import (
+    SUPERVISOR_DATA_TEST,
+    USER_DATA_TEST,
+    USER_DATA_TEST_SAMPLE,
+)
+
+
+def create_user(**params):
+    """
+    Helper function to create a user.
+    """
+    return get_user_model().objects.create_user(**params)
+
+
+def api_request(path='/'):
+    """
+    Return a DRF request, used to build absolute URLs.
+    """
+    return Request(APIRequestFactory().get(path))
+
+
+class ValuesSerializerParityTests(TestCase):
+    """Tests the output matches the ModelSerializer output."""
+
+    def setUp(self) -> None:
+        self.user = create_user(**USER_DATA_TEST)
+        self.other = create_user(**USER_DATA_TEST_SAMPLE)
+        self.supervisor = create_user(**SUPERVISOR_DATA_TEST)
+        UserProfile.objects.create(
+            user=self.user, name='With image',
+            image='uploads/images/profile.jpg')
+        UserProfile.objects.create(user=self.other, name='Without image')
+        UserProfile.objects.create(user=None, name='Orphan profile')
+        return super().setUp()
+
+    def assert_parity(self, serializer_class, queryset, context=None):
+        """Assert both serializers produce the same list."""
+        context = context or {}
+        expected = serializer_class(
+            queryset.order_by('id'), many=True, context=context).data
+        fast = ValuesSerializer(serializer_class).serialize(
+            queryset.order_by('id'), context)
+
+        self.assertEqual(fast, [dict(item) for item in expected])
+
+    def test_user_serializer_parity(self):
+        """Test UserSerializer output parity."""
+        self.assert_parity(UserSerializer, User.objects.all())
+
+    def test_user_profile_serializer_parity(self):
+        """Test UserProfileSerializer output parity, nested user included."""
+        self.assert_parity(UserProfileSerializer, UserProfile.objects.all())
+
+    def test_user_profile_parity_with_request(self):
+        """Test image URLs are absolute when a request is in the context."""
+        context = {'request': api_request()}
+        self.assert_parity(
+            UserProfileSerializer, UserProfile.objects.all(), context)
+
+    def test_nested_list_is_a_single_query(self):
+        """Test the nested user is read with a join."""
+        fast = ValuesSerializer(UserProfileSerializer)
+
+        with self.assertNumQueries(1):
+            fast.serialize(UserProfile.objects.all())
+
+    def test_password_is_not_read(self):
+        """Test write only fields are not selected."""
+        self.assertNotIn('password', ValuesSerializer(UserSerializer).lookups)
+
+    def test_unsupported_field_raises(self):
+        """Test fields that need model instances are rejected."""
+
+        class MethodSerializer(serializers.ModelSerializer):
+            label = serializers.SerializerMethodField()
+
+            class Meta:
+                model = User
+                fields = ('id', 'label')
+
+        with self.assertRaises(ImproperlyConfigured):
+            ValuesSerializer(MethodSerializer).lookups
+
+
+class ValuesListApiTests(TestCase):
+    """Tests the list endpoints use the values() serializers."""
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = create_user(**USER_DATA_TEST)
+        UserProfile.objects.create(user=self.user, name='Test bio')
+        self.client.force_authenticate(self.user)
+        return super().setUp()
+
+    def test_list_users(self):
+        """Test the users list matches UserSerializer."""
+        res = self.client.get(reverse('core:user-list'))
+
+        self.assertEqual(
+            res.json(), UserSerializer(User.objects.all(), many=True).data)
+
+    def test_list_user_profiles(self):
+        """Test the user profiles list matches UserProfileSerializer."""
+        res = self.client.get(reverse('core:user-profile-list'))
+        expected = UserProfileSerializer(
+            UserProfile.objects.all(), many=True,
+            context={'request': res.wsgi_request}).data
+
+        self.assertEqual(res.json(), expected)
@@ -0,0 +1,87 @@
+"""
+Tests for the API routing WSGI handler.
+"""
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.handlers import APIRoutingWSGIHandler, MiddlewareStackHandler
+from core.tests.data_test import USER_DATA_TEST
+
+
+def create_user(**params):
+    """
+    Helper function to create a user.
+    """
+    return get_user_model().objects.create_user(**params)
+
+
+class APIRoutingWSGIHandlerTests(TestCase):
+    """Tests API requests skip the browser oriented middleware."""
+
+    def setUp(self) -> None:
+        self.handler = APIRoutingWSGIHandler()
+        self.factory = RequestFactory()
+        self.user = create_user(**USER_DATA_TEST)
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+        return super().setUp()
+
+    def test_api_request_uses_lean_stack(self):
+        """Test API requests do not run session or clickjacking middleware."""
+        request = self.factory.get(
+            reverse('core:me'), HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        res = self.handler.get_response(request)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertFalse(hasattr(request, 'session'))
+        self.assertNotIn('X-Frame-Options', res)
+        self.assertEqual(res['X-Content-Type-Options'], 'nosniff')
+
+    def test_api_request_requires_token(self):
+        """Test API requests without a token are rejected."""
+        request = self.factory.get(reverse('core:me'))
+        res = self.handler.get_response(request)
+
+        self.assertEqual(res.status_code, 401)
+
+    def test_api_request_cors(self):
+        """Test CORS headers are still added to API responses."""
+        request = self.factory.get(
+            reverse('core:me'),
+            HTTP_ORIGIN='http://localhost:3000',
+            HTTP_AUTHORIZATION=f'Bearer {self.token}',
+        )
+        res = self.handler.get_response(request)
+
+        self.assertEqual(
+            res['Access-Control-Allow-Origin'], 'http://localhost:3000')
+
+    def test_admin_request_uses_full_stack(self):
+        """Test admin requests keep sessions and clickjacking protection."""
+        request = self.factory.get('/admin/login/')
+        res = self.handler.get_response(request)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(hasattr(request, 'session'))
+        self.assertEqual(res['X-Frame-Options'], 'DENY')
+
+    def test_stack_handler_skips_unused_middleware(self):
+        """Test middleware raising MiddlewareNotUsed is left out."""
+        handler = MiddlewareStackHandler([
+            'django.middleware.security.SecurityMiddleware',
+            'core.tests.test_handlers.UnusedMiddleware',
+        ])
+        request = self.factory.get(
+            reverse('core:me'), HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        res = handler.get_response(request)
+
+        self.assertEqual(res.status_code, 200)
+
+
+class UnusedMiddleware:
+    """Middleware disabling itself, used by the tests."""
+
+    def __init__(self, get_response):
+        raise MiddlewareNotUsed()
@@ -0,0 +1,144 @@
+"""
+Tests for the database checks and health probes.
+"""
+import io
+import json
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError
+from django.test import RequestFactory, SimpleTestCase, TestCase, \
+    override_settings
+
+from core import health
+from core.checks import check_connection_budget
+from core.handlers import APIRoutingWSGIHandler
+
+
+class ProbeTests(TestCase):
+    """Tests for /healthz and /readyz."""
+
+    def setUp(self) -> None:
+        self.handler = APIRoutingWSGIHandler()
+        self.factory = RequestFactory()
+        return super().setUp()
+
+    def get(self, path):
+        return self.handler.get_response(self.factory.get(path))
+
+    def test_healthz_skips_middleware(self):
+        """Test the liveness probe answers before any middleware."""
+        res = self.get('/healthz')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.content), {'status': 'ok'})
+        self.assertNotIn('X-Content-Type-Options', res)
+        self.assertEqual(res['Cache-Control'], 'no-store')
+
+    def test_readyz(self):
+        """Test the readiness probe checks database and migrations."""
+        res = self.get('/readyz')
+
+        self.assertEqual(res.status_code, 200)
+        body = json.loads(res.content)
+        self.assertEqual(body['checks'], {
+            'database:default': 'ok',
+            'migrations': 'ok',
+        })
+
+    def test_readyz_database_down(self):
+        """Test the readiness probe fails when the database is down."""
+        with patch.object(health, 'check_database',
+                          return_value=OperationalError('down')), \
+                self.assertLogs('core.health', 'WARNING') as logs:
+            res = self.get('/readyz')
+
+        self.assertEqual(res.status_code, 503)
+        body = json.loads(res.content)
+        self.assertEqual(body['checks']['database:default'], 'unavailable')
+        self.assertIn('down', logs.output[0])
+
+    def test_readyz_pending_migrations(self):
+        """Test the readiness probe fails with unapplied migrations."""
+        with patch.object(health, 'pending_migrations',
+                          return_value=['core.9999_next']):
+            res = self.get('/readyz')
+
+        self.assertEqual(res.status_code, 503)
+        body = json.loads(res.content)
+        self.assertEqual(body['checks']['migrations'], '1 pending')
+
+    def test_url_probes(self):
+        """Test the probes are also routed for other servers."""
+        self.assertEqual(self.client.get('/healthz').status_code, 200)
+        self.assertEqual(self.client.get('/readyz').status_code, 200)
+
+
+@patch.object(health.time, 'sleep')
+class WaitForDatabaseTests(SimpleTestCase):
+    """Tests for wait_for_database and the wait_for_db command."""
+    databases = {'default'}
+
+    def test_retries_with_backoff(self, sleep):
+        """Test attempts are retried with growing delays."""
+        errors = iter([OperationalError('down')] * 3 + [None])
+        with patch.object(health, 'check_database',
+                          side_effect=lambda alias: next(errors)):
+            attempts = health.wait_for_database(
+                initial_delay=1, max_delay=4)
+
+        self.assertEqual(attempts, 4)
+        delays = [c.args[0] for c in sleep.call_args_list]
+        self.assertTrue(0.5 <= delays[0] <= 1)
+        self.assertTrue(1 <= delays[1] <= 2)
+        self.assertTrue(2 <= delays[2] <= 4)
+
+    def test_deadline(self, sleep):
+        """Test waiting stops once the deadline passes."""
+        with patch.object(health, 'check_database',
+                          return_value=OperationalError('down')):
+            with self.assertRaises(TimeoutError):
+                health.wait_for_database(timeout=0)
+
+    def test_command(self, sleep):
+        """Test the command waits and checks migrations."""
+        out = io.StringIO()
+        call_command('wait_for_db', '--check-migrations', stdout=out)
+
+        self.assertIn('Migrations applied', out.getvalue())
+
+    def test_command_pending_migrations(self, sleep):
+        """Test the command fails on unapplied migrations."""
+        with patch('core.management.commands.wait_for_db.pending_migrations',
+                   return_value=['core.9999_next']):
+            with self.assertRaisesMessage(CommandError, 'core.9999_next'):
+                call_command('wait_for_db', '--check-migrations',
+                             stdout=io.StringIO())
+
+
+class ConnectionBudgetCheckTests(SimpleTestCase):
+    """Tests for the connection budget system check."""
+
+    @override_settings(WEB_CONCURRENCY=4, WEB_THREADS=8,
+                       DB_MAX_CONNECTIONS=20)
+    def test_over_budget(self):
+        """Test a warning when workers may exceed the connections."""
+        warnings = check_connection_budget(None)
+
+        self.assertEqual([w.id for w in warnings], ['core.W001'])
+
+    @override_settings(WEB_CONCURRENCY=2, WEB_THREADS=4,
+                       DB_MAX_CONNECTIONS=12, BATCH={'MAX_WORKERS': 4})
+    def test_batch_pool_counts(self):
+        """Test the connections of the batch thread pool are counted."""
+        warnings = check_connection_budget(None)
+
+        self.assertEqual([w.id for w in warnings], ['core.W001'])
+        self.assertIn('16 connections', warnings[0].msg)
+
+    @override_settings(WEB_CONCURRENCY=2, WEB_THREADS=4,
+                       DB_MAX_CONNECTIONS=20, BATCH={'MAX_WORKERS': 1})
+    def test_within_budget(self):
+        """Test no warning within the budget."""
+        self.assertEqual(check_connection_budget(None), [])
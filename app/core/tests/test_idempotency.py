@@ -0,0 +1,228 @@
+"""
+Tests for Idempotency-Key support.
+"""
+import io
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image as PILImage
+from rest_framework import status
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core import idempotency
+from core.models import IdempotencyKey
+from core.tests.data_test import (
+    SUPERVISOR_DATA_TEST,
+    USER_DATA_TEST,
+    USER_DATA_TEST_SAMPLE,
+)
+
+CREATE_USER_URL = reverse('core:user-list')
+
+
+def create_user(**params):
+    """
+    Helper function to create a user.
+    """
+    return get_user_model().objects.create_user(**params)
+
+
+def client_for(user) -> APIClient:
+    """Return a client sending the JWT of `user`."""
+    token = RefreshToken.for_user(user).access_token
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    return client
+
+
+class IdempotencyTests(TestCase):
+    """Tests for IdempotencyMiddleware."""
+
+    def setUp(self) -> None:
+        self.staff = create_user(**SUPERVISOR_DATA_TEST)
+        self.client = client_for(self.staff)
+        return super().setUp()
+
+    def post_user(self, key='key-1', data=USER_DATA_TEST_SAMPLE, client=None):
+        return (client or self.client).post(
+            CREATE_USER_URL, data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_is_replayed(self):
+        """Test a retried create returns the first response only once."""
+        first = self.post_user()
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn(idempotency.REPLAYED_HEADER, first)
+
+        with mock.patch('core.views.UserViewSet.create') as create:
+            retry = self.post_user()
+            create.assert_not_called()
+
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry[idempotency.REPLAYED_HEADER], 'true')
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry['Content-Type'], first['Content-Type'])
+        self.assertEqual(get_user_model().objects.filter(
+            cpf=USER_DATA_TEST_SAMPLE['cpf']).count(), 1)
+
+    def test_replay_has_cors_headers(self):
+        """Test browsers can read replayed responses and their header."""
+        origin = 'http://localhost:3000'
+        first = self.client.post(
+            CREATE_USER_URL, USER_DATA_TEST_SAMPLE, format='json',
+            HTTP_IDEMPOTENCY_KEY='key-1', HTTP_ORIGIN=origin)
+
+        retry = self.client.post(
+            CREATE_USER_URL, USER_DATA_TEST_SAMPLE, format='json',
+            HTTP_IDEMPOTENCY_KEY='key-1', HTTP_ORIGIN=origin)
+        conflict = self.client.post(
+            CREATE_USER_URL, USER_DATA_TEST, format='json',
+            HTTP_IDEMPOTENCY_KEY='key-1', HTTP_ORIGIN=origin)
+
+        self.assertEqual(retry[idempotency.REPLAYED_HEADER], 'true')
+        for res in (first, retry, conflict):
+            self.assertEqual(res['Access-Control-Allow-Origin'], origin)
+        self.assertIn(idempotency.REPLAYED_HEADER.lower(),
+                      retry['Access-Control-Expose-Headers'].lower())
+        self.assertEqual(conflict.status_code, 422)
+
+    def test_other_key_runs_the_view(self):
+        """Test a new key runs the view again."""
+        self.post_user()
+
+        res = self.post_user(key='key-2')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn(idempotency.REPLAYED_HEADER, res)
+
+    def test_keys_are_per_user(self):
+        """Test the same key of another user is another request."""
+        self.post_user()
+        other = create_user(**{**SUPERVISOR_DATA_TEST, 'cpf': '98765432100',
+                               'email': 'other@domain.com'})
+
+        res = self.post_user(client=client_for(other))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_key_reused_for_other_request(self):
+        """Test a key sent with another body is refused."""
+        self.post_user()
+
+        res = self.post_user(data=USER_DATA_TEST)
+
+        self.assertEqual(res.status_code, 422)
+
+    def test_without_key_or_token(self):
+        """Test requests without key or JWT are not recorded."""
+        self.client.post(CREATE_USER_URL, USER_DATA_TEST_SAMPLE, format='json')
+        anonymous = APIClient()
+        res = self.post_user(client=anonymous)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_key_too_long(self):
+        """Test overlong keys are refused."""
+        res = self.post_user(key='k' * 300)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_server_errors_are_not_stored(self):
+        """Test requests failing on the server can be retried."""
+        with mock.patch('core.views.UserViewSet.create',
+                        side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                self.post_user()
+
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.post_user().status_code, 201)
+
+    def in_progress(self, created_at=None):
+        """Store the key of a request still running."""
+        record, created = idempotency.acquire(
+            idempotency.key_hash(self.staff.id, 'key-1'), '',
+            idempotency.idempotency_settings())
+        record.fingerprint = idempotency.fingerprint(
+            APIRequestFactory().post(
+                CREATE_USER_URL, USER_DATA_TEST_SAMPLE, format='json'),
+            64 * 1024)
+        record.created_at = created_at or timezone.now()
+        record.save()
+        return record
+
+    @override_settings(IDEMPOTENCY={'WAIT': 0})
+    def test_concurrent_duplicate_conflict(self):
+        """Test a duplicate of a running request gets 409."""
+        self.in_progress()
+
+        res = self.post_user()
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res['Retry-After'], '1')
+
+    def test_concurrent_duplicate_waits(self):
+        """Test a duplicate waits for the response of the running request."""
+        record = self.in_progress()
+
+        def finish(seconds):
+            IdempotencyKey.objects.filter(pk=record.pk).update(
+                status_code=201, body=idempotency.zlib.compress(b'{}'),
+                headers={'Content-Type': 'application/json'})
+
+        with mock.patch.object(idempotency.time, 'sleep',
+                               side_effect=finish) as sleep:
+            res = self.post_user()
+
+        sleep.assert_called_once()
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.content, b'{}')
+        self.assertEqual(res[idempotency.REPLAYED_HEADER], 'true')
+
+    def test_stale_key_is_taken_over(self):
+        """Test keys of requests that died are reused."""
+        self.in_progress(timezone.now() - timedelta(minutes=5))
+
+        res = self.post_user()
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn(idempotency.REPLAYED_HEADER, res)
+
+    def test_purge_expired_keys(self):
+        """Test expired keys are purged by the task."""
+        from core.tasks import purge_idempotency_keys
+
+        self.post_user()
+        self.post_user(key='key-2', data=USER_DATA_TEST)
+        IdempotencyKey.objects.filter(pk=IdempotencyKey.objects.first().pk) \
+            .update(expires_at=timezone.now())
+
+        self.assertEqual(purge_idempotency_keys(), 1)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    def test_upload_is_replayed(self):
+        """Test a retried image upload is not written twice."""
+        user = create_user(**USER_DATA_TEST)
+        client = client_for(user)
+        url = reverse('core:user-upload-image', args=[user.id])
+        buffer = io.BytesIO()
+        PILImage.new('RGB', (10, 10)).save(buffer, format='JPEG')
+
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root):
+            responses = []
+            for _ in range(2):
+                buffer.seek(0)
+                buffer.name = 'image.jpg'
+                responses.append(client.post(
+                    url, {'image': buffer}, format='multipart',
+                    HTTP_IDEMPOTENCY_KEY='upload-1'))
+
+        self.assertEqual(responses[0].status_code, status.HTTP_200_OK)
+        self.assertEqual(responses[1][idempotency.REPLAYED_HEADER], 'true')
+        self.assertEqual(responses[1].content, responses[0].content)
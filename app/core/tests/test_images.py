@@ -0,0 +1,150 @@
+"""
+Tests for bounded image validation.
+"""
+import io
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image as PILImage
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import images
+from core.tests.data_test import USER_DATA_TEST
+
+
+def create_user(**params):
+    """
+    Helper function to create a user.
+    """
+    return get_user_model().objects.create_user(**params)
+
+
+def image_file(size=(20, 20), format='PNG', name='image.png'):
+    """Return an uploaded image file."""
+    buffer = io.BytesIO()
+    PILImage.new('RGB', size).save(buffer, format=format)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+class ValidateImageTests(SimpleTestCase):
+    """Tests for `validate_image`."""
+
+    def test_valid_image(self):
+        """Test valid images are decoded in the pool."""
+        self.assertEqual(images.validate_image(image_file()),
+                         ('PNG', (20, 20)))
+
+    def test_temporary_file(self):
+        """Test images streamed to disk are decoded from their path."""
+        upload = image_file()
+        with tempfile.NamedTemporaryFile(suffix='.png') as file:
+            file.write(upload.read())
+            file.flush()
+            upload.temporary_file_path = lambda: file.name
+
+            self.assertEqual(images.validate_image(upload)[0], 'PNG')
+
+    @override_settings(IMAGES={'MAX_DIMENSION': 10})
+    def test_max_dimension(self):
+        """Test images wider or higher than the limit are rejected."""
+        with self.assertRaisesRegex(images.ImageError, '20x20'):
+            images.inspect_image(image_file())
+
+    @override_settings(IMAGES={'MAX_PIXELS': 399})
+    def test_max_pixels(self):
+        """Test images with too many pixels are rejected before decoding."""
+        with self.assertRaisesRegex(images.ImageError, '400 pixels'):
+            images.validate_image(image_file())
+
+    @override_settings(IMAGES={'MAX_BYTES': 10})
+    def test_max_bytes(self):
+        """Test files larger than the limit are rejected."""
+        with self.assertRaisesRegex(images.ImageError, 'bytes'):
+            images.validate_image(image_file())
+
+    def test_unsupported_format(self):
+        """Test formats outside of FORMATS are rejected."""
+        with self.assertRaisesRegex(images.ImageError, 'valid image'):
+            images.validate_image(image_file(format='GIF', name='a.gif'))
+
+    def test_truncated_image(self):
+        """Test images with a valid header but broken data fail to decode."""
+        data = image_file(size=(200, 200), format='JPEG').read()
+        upload = SimpleUploadedFile('image.jpg', data[:len(data) // 2])
+
+        with self.assertRaisesRegex(images.ImageError, 'decoded'):
+            images.validate_image(upload)
+
+    @override_settings(IMAGES={'TIMEOUT': 0})
+    def test_timeout_kills_decoder(self):
+        """Test a decoder which times out is killed and not reused."""
+        with self.assertRaisesRegex(images.ImageError, 'too long'):
+            images.validate_image(image_file(size=(3000, 3000)))
+
+        self.assertTrue(all(decoder.alive
+                            for decoder in images._decoders.queue))
+
+    def test_timeout_kills_only_its_decoder(self):
+        """Test a timeout leaves the other decoders running."""
+        source = image_file().read()
+        slow, other = images.Decoder(0), images.Decoder(0)
+        self.addCleanup(other.kill)
+
+        with self.assertRaisesRegex(images.ImageError, 'too long'):
+            slow.decode(source, 400, timeout=0)
+
+        self.assertFalse(slow.alive)
+        self.assertEqual(other.decode(source, 400, timeout=30),
+                         ('PNG', (20, 20)))
+
+    def test_dead_decoder(self):
+        """Test a decoder killed while decoding is reported and dropped."""
+        decoder = images.Decoder(0)
+        decoder.process.kill()
+        decoder.process.join()
+
+        with self.assertRaisesRegex(images.ImageError, 'could not'):
+            decoder.decode(image_file().read(), 400, timeout=30)
+        self.assertFalse(decoder.alive)
+
+
+class BoundedUploadTests(TestCase):
+    """Tests for bounded image uploads through the API."""
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = create_user(**USER_DATA_TEST)
+        self.client.force_authenticate(self.user)
+        self.url = reverse('core:user-upload-image', args=[self.user.id])
+        return super().setUp()
+
+    @override_settings(IMAGES={'MAX_BYTES': 50})
+    def test_oversized_upload(self):
+        """Test files past MAX_BYTES are not buffered and are rejected."""
+        handler = images.MaxSizeUploadHandler()
+        handler.new_file('image', 'image.png', 'image/png', 1000)
+        self.assertEqual(handler.receive_data_chunk(b'x' * 50, 0), b'x' * 50)
+        self.assertIsNone(handler.receive_data_chunk(b'x' * 50, 50))
+        self.assertEqual(handler.file_complete(100).size, 100)
+
+        res = self.client.post(
+            self.url, {'image': image_file()}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('maximum is 50', str(res.data['image']))
+
+    @override_settings(IMAGES={'MAX_PIXELS': 1_000_000})
+    def test_decompression_bomb(self):
+        """Test small files of huge images are rejected."""
+        res = self.client.post(
+            self.url, {'image': image_file(size=(2000, 2000))},
+            format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('pixels', str(res.data['image']))
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.image)
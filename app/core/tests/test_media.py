@@ -0,0 +1,221 @@
+"""
+Tests for media serving.
+"""
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils.http import http_date
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core import media
+from core.models import UserProfile
+from core.tests.data_test import (
+    SUPERVISOR_DATA_TEST,
+    USER_DATA_TEST,
+    USER_DATA_TEST_SAMPLE,
+)
+
+IMAGE_NAME = 'uploads/images/0b7e6a6c-8f1e-4a52-9d3c-6f1b2a3c4d5e.jpg'
+CONTENT = bytes(range(256)) * 4
+
+
+def create_user(**params):
+    """
+    Helper function to create a user.
+    """
+    return get_user_model().objects.create_user(**params)
+
+
+def bearer(user) -> str:
+    """Return the Authorization header of `user`."""
+    return f'Bearer {RefreshToken.for_user(user).access_token}'
+
+
+class ParseRangeTests(SimpleTestCase):
+    """Tests for `parse_range`."""
+
+    def test_ranges(self):
+        """Test single ranges are parsed and clamped to the file."""
+        self.assertEqual(media.parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(media.parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(media.parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(media.parse_range('bytes=-500', 100), (0, 99))
+        self.assertEqual(media.parse_range('bytes=50-500', 100), (50, 99))
+
+    def test_ignored_and_invalid_ranges(self):
+        """Test multiple ranges are ignored and out of file ones fail."""
+        self.assertIsNone(media.parse_range('bytes=0-1,5-6', 100))
+        self.assertIsNone(media.parse_range('items=0-1', 100))
+        for header in ('bytes=100-', 'bytes=9-1', 'bytes=-0'):
+            with self.assertRaises(ValueError):
+                media.parse_range(header, 100)
+
+    def test_is_immutable(self):
+        """Test generated upload names are immutable."""
+        self.assertTrue(media.is_immutable(IMAGE_NAME))
+        self.assertFalse(media.is_immutable('uploads/images/photo.jpg'))
+
+
+class ServeMediaTests(TestCase):
+    """Tests for `serve_media`."""
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.tmpdir.name)
+        self.settings_override.enable()
+        path = os.path.join(self.tmpdir.name, IMAGE_NAME)
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as file:
+            file.write(CONTENT)
+        self.mtime = os.stat(path).st_mtime
+        self.url = f'/static/media/{IMAGE_NAME}'
+        self.public_owner = create_user(**USER_DATA_TEST_SAMPLE,
+                                        image=IMAGE_NAME)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        self.tmpdir.cleanup()
+        return super().tearDown()
+
+    def test_serve_public_image(self):
+        """Test user images are public, with immutable caching."""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(b''.join(res.streaming_content), CONTENT)
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', res['Cache-Control'])
+        self.assertIn('public', res['Cache-Control'])
+        self.assertTrue(res['ETag'])
+
+    def test_conditional_requests(self):
+        """Test matching validators are answered with 304."""
+        tag = self.client.get(self.url)['ETag']
+
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res['ETag'], tag)
+
+        res = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=http_date(self.mtime + 1))
+        self.assertEqual(res.status_code, 304)
+
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(res.status_code, 200)
+
+    def test_range_requests(self):
+        """Test single ranges are answered with 206."""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(b''.join(res.streaming_content), CONTENT[10:20])
+        self.assertEqual(res['Content-Range'], f'bytes 10-19/{len(CONTENT)}')
+        self.assertEqual(res['Content-Length'], '10')
+
+        res = self.client.get(self.url, HTTP_RANGE='bytes=-16')
+        self.assertEqual(b''.join(res.streaming_content), CONTENT[-16:])
+
+    def test_unsatisfiable_range(self):
+        """Test ranges outside of the file are answered with 416."""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=5000-')
+
+        self.assertEqual(res.status_code, 416)
+        self.assertEqual(res['Content-Range'], f'bytes */{len(CONTENT)}')
+
+    def test_if_range(self):
+        """Test ranges of a changed file serve the whole file."""
+        tag = self.client.get(self.url)['ETag']
+
+        res = self.client.get(
+            self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=tag)
+        self.assertEqual(res.status_code, 206)
+
+        res = self.client.get(
+            self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(res.status_code, 200)
+
+    def test_not_found(self):
+        """Test missing files and paths outside MEDIA_ROOT are 404."""
+        for path in ('uploads/images/missing.jpg', '../settings.py',
+                     'uploads/images'):
+            res = self.client.get(f'/static/media/{path}')
+            self.assertEqual(res.status_code, 404)
+
+    def test_head_and_methods(self):
+        """Test only safe methods are allowed."""
+        self.assertEqual(self.client.head(self.url).status_code, 200)
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+
+    @override_settings(MEDIA={'SENDFILE': 'x-accel-redirect'})
+    def test_x_accel_redirect(self):
+        """Test nginx is told to send the file."""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['X-Accel-Redirect'],
+                         f'/protected-media/{IMAGE_NAME}')
+        self.assertEqual(res.content, b'')
+        self.assertNotIn('Content-Type', res)
+
+    @override_settings(MEDIA={'SENDFILE': 'x-sendfile'})
+    def test_x_sendfile(self):
+        """Test Apache is told to send the file."""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res['X-Sendfile'],
+                         os.path.join(self.tmpdir.name, IMAGE_NAME))
+
+    def test_private_profile_image(self):
+        """Test profile images are only served to the owner and staff."""
+        user = create_user(**USER_DATA_TEST)
+        staff = create_user(**SUPERVISOR_DATA_TEST)
+        other = create_user(**{
+            **USER_DATA_TEST,
+            'cpf': '98765432100',
+            'email': 'other@domain.com',
+            'phone': '99999999990',
+        })
+        self.public_owner.delete()
+        UserProfile.objects.create(user=user, name='Profile', image=IMAGE_NAME)
+
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        res = self.client.get(self.url, HTTP_AUTHORIZATION=bearer(other))
+        self.assertEqual(res.status_code, 404)
+        res = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer invalid')
+        self.assertEqual(res.status_code, 404)
+
+        res = self.client.get(self.url, HTTP_AUTHORIZATION=bearer(user))
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('private', res['Cache-Control'])
+        self.assertNotIn('public', res['Cache-Control'])
+        self.assertIn('Authorization', res['Vary'])
+
+        res = self.client.get(self.url, HTTP_AUTHORIZATION=bearer(staff))
+        self.assertEqual(res.status_code, 200)
+
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_unknown_files_are_private(self):
+        """Test files no user image refers to are only served to staff."""
+        self.public_owner.image = 'uploads/images/replaced.jpg'
+        self.public_owner.save()
+        profile = UserProfile.objects.create(name='Orphan', image=IMAGE_NAME)
+        staff = create_user(**SUPERVISOR_DATA_TEST)
+
+        for owner in (None, profile):
+            if owner is not None:
+                owner.delete()
+            self.assertEqual(self.client.get(self.url).status_code, 404)
+            res = self.client.get(
+                self.url, HTTP_AUTHORIZATION=bearer(self.public_owner))
+            self.assertEqual(res.status_code, 404)
+            res = self.client.get(self.url, HTTP_AUTHORIZATION=bearer(staff))
+            self.assertEqual(res.status_code, 200)
+            self.assertIn('private', res['Cache-Control'])
@@ -0,0 +1,176 @@
+"""
+Tests for the request metrics middleware and endpoint.
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.metrics import (
+    MetricsRegistry,
+    merge_snapshots,
+    registry,
+    remove_dead_snapshots,
+    remove_snapshot,
+    render_prometheus,
+)
+from core.tests.data_test import USER_DATA_TEST
+
+METRICS_URL = reverse('metrics')
+
+
+def create_user(**params):
+    """
+    Helper function to create a user.
+    """
+    return get_user_model().objects.create_user(**params)
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    """Tests for the in-process registry and the text format."""
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test histogram buckets, sum and count are rendered."""
+        metrics = MetricsRegistry()
+        labels = ('core:user-list', 'GET')
+        metrics.observe('http_request_duration_seconds', labels, 0.003)
+        metrics.observe('http_request_duration_seconds', labels, 0.2)
+        text = render_prometheus(merge_snapshots([metrics.snapshot()]))
+
+        self.assertIn(
+            'http_request_duration_seconds_bucket{route="core:user-list",'
+            'method="GET",le="0.005"} 1', text)
+        self.assertIn(
+            'http_request_duration_seconds_bucket{route="core:user-list",'
+            'method="GET",le="+Inf"} 2', text)
+        self.assertIn(
+            'http_request_duration_seconds_count{route="core:user-list",'
+            'method="GET"} 2', text)
+
+    def test_merge_snapshots_sums_processes(self):
+        """Test snapshots of several workers are added up."""
+        first, second = MetricsRegistry(), MetricsRegistry()
+        labels = ('core:me', 'GET', '200')
+        first.inc('http_requests_total', labels)
+        second.inc('http_requests_total', labels, 2)
+        merged = merge_snapshots([first.snapshot(), second.snapshot()])
+
+        self.assertEqual(merged['http_requests_total'][labels], 3)
+
+    def test_dead_worker_snapshots_are_removed(self):
+        """Test snapshots of processes which exited are deleted."""
+        dead = subprocess.Popen([sys.executable, '-c', ''])
+        dead.wait()
+        with tempfile.TemporaryDirectory() as directory:
+            for pid in (os.getpid(), dead.pid):
+                path = os.path.join(directory, f'metrics-{pid}.json')
+                with open(path, 'w') as f:
+                    json.dump(MetricsRegistry().snapshot(), f)
+
+            self.assertEqual(remove_dead_snapshots(directory), 1)
+            self.assertEqual(os.listdir(directory),
+                             [f'metrics-{os.getpid()}.json'])
+            remove_snapshot(os.getpid(), directory)
+            self.assertEqual(os.listdir(directory), [])
+
+    def test_label_values_are_escaped(self):
+        """Test quotes in label values are escaped."""
+        metrics = MetricsRegistry()
+        metrics.inc('http_requests_total', ('a"b', 'GET', '200'))
+        text = render_prometheus(merge_snapshots([metrics.snapshot()]))
+
+        self.assertIn('route="a\\"b"', text)
+
+
+class MetricsMiddlewareTests(TestCase):
+    """Tests requests are recorded and exposed on metrics/."""
+
+    def setUp(self) -> None:
+        registry.clear()
+        self.client = APIClient()
+        self.user = create_user(**USER_DATA_TEST)
+        self.client.force_authenticate(self.user)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        registry.clear()
+        return super().tearDown()
+
+    def test_request_is_recorded_by_route_name(self):
+        """Test latency, status and queries are labelled by URL name."""
+        self.client.get(reverse('core:user-detail', args=[self.user.id]))
+        text = self.client.get(METRICS_URL).content.decode()
+
+        self.assertIn(
+            'http_requests_total{route="core:user-detail",method="GET",'
+            'status="200"} 1', text)
+        self.assertIn(
+            'http_request_db_queries_count{route="core:user-detail",'
+            'method="GET"} 1', text)
+        self.assertNotIn(f'/users/{self.user.id}/', text)
+
+    def test_queries_are_counted(self):
+        """Test SQL queries run by the view are counted."""
+        self.client.get(reverse('core:user-list'))
+        values = merge_snapshots([registry.snapshot()])
+        counts, _ = values['http_request_db_queries'][
+            ('core:user-list', 'GET')]
+
+        self.assertEqual(sum(counts), 1)
+        self.assertEqual(counts[0], 0)
+
+    def test_unresolved_route(self):
+        """Test unknown paths share a single label."""
+        self.client.get('/does-not-exist/')
+        values = merge_snapshots([registry.snapshot()])
+
+        self.assertIn(
+            ('<unresolved>', 'GET', '404'), values['http_requests_total'])
+
+    def test_unknown_methods_share_a_label(self):
+        """Test methods outside the standard are labelled other."""
+        self.client.generic('BREW', reverse('core:me'))
+        values = merge_snapshots([registry.snapshot()])
+
+        self.assertEqual(
+            [labels[1] for labels in values['http_requests_total']],
+            ['other'])
+
+    def test_remote_clients_need_token(self):
+        """Test only local clients are answered without a token."""
+        res = self.client.get(METRICS_URL, REMOTE_ADDR='10.0.0.1')
+
+        self.assertEqual(res.status_code, 403)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        """Test the bearer token is required when configured."""
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 403)
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer secret')
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_metrics_from_every_worker(self):
+        """Test snapshots written by other workers are merged."""
+        with tempfile.TemporaryDirectory() as directory:
+            other = MetricsRegistry()
+            other.inc('http_requests_total', ('core:me', 'GET', '200'), 5)
+            with open(os.path.join(directory, 'metrics-1.json'), 'w') as f:
+                json.dump(other.snapshot(), f)
+
+            with override_settings(METRICS_DIR=directory):
+                self.client.get(reverse('core:me'))
+                text = self.client.get(METRICS_URL).content.decode()
+
+            self.assertTrue(os.path.exists(
+                os.path.join(directory, f'metrics-{os.getpid()}.json')))
+
+        self.assertIn(
+            'http_requests_total{route="core:me",method="GET",'
+            'status="200"} 6', text)
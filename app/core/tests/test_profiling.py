@@ -0,0 +1,192 @@
+"""
+Tests for the per-request profiler.
+"""
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.profiling import (
+    PROFILE_ID_HEADER,
+    AllocationTracker,
+    SamplingProfiler,
+    profile_path,
+)
+from core.tests.data_test import SUPERVISOR_DATA_TEST, USER_DATA_TEST
+
+
+def create_user(**params):
+    """
+    Helper function to create a user.
+    """
+    return get_user_model().objects.create_user(**params)
+
+
+def busy_wait(seconds: float):
+    """Burn CPU for `seconds`."""
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class SamplingProfilerTests(SimpleTestCase):
+    """Tests for SamplingProfiler."""
+
+    def test_samples_the_running_thread(self):
+        """Test stacks of the profiled thread are collected."""
+        with SamplingProfiler(interval=0.001) as profiler:
+            busy_wait(0.05)
+
+        self.assertGreater(sum(profiler.samples.values()), 0)
+        folded = profiler.folded()
+        self.assertIn('busy_wait (test_profiling.py:', folded)
+        stack, count = folded.splitlines()[0].rsplit(' ', 1)
+        self.assertIn(';', stack)
+        self.assertGreater(int(count), 0)
+
+
+class AllocationTrackerTests(SimpleTestCase):
+    """Tests for AllocationTracker."""
+
+    def test_concurrent_blocks(self):
+        """Test overlapping blocks never stop tracing under each other."""
+        entered, release = threading.Barrier(2), threading.Event()
+        trackers, errors = [], []
+
+        def track():
+            try:
+                with AllocationTracker() as tracker:
+                    trackers.append(tracker)
+                    entered.wait(5)
+                    release.wait(5)
+                    data = [bytearray(1024) for _ in range(100)]
+                    del data
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=track) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(tracker.allocations is None
+                                for tracker in trackers), [False, True])
+        self.assertFalse(tracemalloc.is_tracing())
+        with AllocationTracker() as tracker:
+            pass
+        self.assertIsNotNone(tracker.allocations)
+
+
+class ProfilingMiddlewareTests(TestCase):
+    """Tests for ProfilingMiddleware and the download endpoints."""
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(PROFILING={
+            'DIR': self.tmpdir.name,
+            'INTERVAL': 0.001,
+            'SAMPLE_RATE': 0.0,
+        })
+        self.settings_override.enable()
+        self.staff = create_user(**SUPERVISOR_DATA_TEST)
+        self.user = create_user(**USER_DATA_TEST)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        self.tmpdir.cleanup()
+        return super().tearDown()
+
+    def client_for(self, user):
+        """Return a client authenticated with a JWT for `user`."""
+        client = APIClient()
+        token = RefreshToken.for_user(user).access_token
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client
+
+    def test_staff_request_with_header_is_profiled(self):
+        """Test a staff request asking for a profile stores one."""
+        res = self.client_for(self.staff).get(
+            reverse('core:user-list'), HTTP_X_PROFILE='1')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        profile_id = res[PROFILE_ID_HEADER]
+        self.assertTrue(os.path.exists(profile_path(profile_id, 'folded')))
+
+        res = self.client_for(self.staff).get(
+            reverse('core:profile-detail', args=[profile_id]))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['route'], 'core:user-list')
+        self.assertTrue(
+            any('core_user' in q['sql'] for q in res.data['sql']))
+        self.assertIn('allocations', res.data)
+
+    def test_session_staff_request_is_profiled(self):
+        """Test staff logged in with a session can profile pages."""
+        self.client.force_login(self.staff)
+
+        res = self.client.get('/admin/', HTTP_X_PROFILE='1')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn(PROFILE_ID_HEADER, res)
+
+    def test_non_staff_request_is_not_profiled(self):
+        """Test the header is ignored for regular users."""
+        res = self.client_for(self.user).get(
+            reverse('core:me'), HTTP_X_PROFILE='1')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn(PROFILE_ID_HEADER, res)
+
+    def test_request_without_header_is_not_profiled(self):
+        """Test staff requests are not profiled without the header."""
+        res = self.client_for(self.staff).get(reverse('core:me'))
+
+        self.assertNotIn(PROFILE_ID_HEADER, res)
+
+    def test_sampled_request_is_profiled(self):
+        """Test requests picked by the sample rate are profiled."""
+        with override_settings(PROFILING={
+                'DIR': self.tmpdir.name, 'SAMPLE_RATE': 1.0}):
+            res = self.client_for(self.user).get(reverse('core:me'))
+
+        self.assertIn(PROFILE_ID_HEADER, res)
+
+    def test_list_and_download_folded(self):
+        """Test profiles are listed and folded stacks downloaded."""
+        profile_id = self.client_for(self.staff).get(
+            reverse('core:me'), HTTP_X_PROFILE='1')[PROFILE_ID_HEADER]
+        client = self.client_for(self.staff)
+
+        res = client.get(reverse('core:profile-list'))
+        self.assertEqual([p['id'] for p in res.data], [profile_id])
+        self.assertNotIn('sql', res.data[0])
+
+        res = client.get(reverse('core:profile-folded', args=[profile_id]))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('attachment', res['Content-Disposition'])
+        b''.join(res.streaming_content)
+
+    def test_download_invalid_id(self):
+        """Test ids that are not profile ids are rejected."""
+        res = self.client_for(self.staff).get(
+            reverse('core:profile-detail', args=['..%2Fsettings']))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_download_requires_staff(self):
+        """Test regular users can not list profiles."""
+        res = self.client_for(self.user).get(reverse('core:profile-list'))
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,148 @@
+"""
+Tests for the N+1, slow query and full scan detector.
+"""
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import User, UserProfile
+from core.query_inspector import (
+    HEADER,
+    QueryInspector,
+    QueryProblemError,
+    fingerprint,
+)
+from core.serializers import UserProfileSerializer
+from core.tests.data_test import USER_DATA_TEST
+
+
+def create_user(**params):
+    """
+    Helper function to create a user.
+    """
+    return get_user_model().objects.create_user(**params)
+
+
+def create_profiles(count: int):
+    """
+    Helper function to create `count` users, each with a profile.
+    """
+    for i in range(count):
+        user = create_user(
+            cpf=f'{i:011d}', email=f'user{i}@domain.com',
+            name=f'User {i}', password='testpass123')
+        UserProfile.objects.create(user=user, name=f'Profile {i}')
+
+
+def inspector_settings(**options) -> dict:
+    """Return QUERY_INSPECTOR settings enabling the middleware."""
+    return {
+        'ENABLED': True,
+        'RAISE': False,
+        'N_PLUS_ONE_THRESHOLD': 5,
+        'SLOW_QUERY_MS': 100,
+        'EXPLAIN': True,
+        **options,
+    }
+
+
+class FingerprintTests(SimpleTestCase):
+    """Tests for SQL fingerprints."""
+
+    def test_literals_and_placeholders_are_normalised(self):
+        """Test statements differing only by values share a fingerprint."""
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id = 1 AND name = \'a\''),
+            fingerprint('SELECT * FROM t  WHERE id = %s AND name = %s'),
+        )
+
+    def test_in_lists_are_collapsed(self):
+        """Test IN lists of any size share a fingerprint."""
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s)'),
+            fingerprint('SELECT * FROM t WHERE id IN (%s)'),
+        )
+
+
+class QueryInspectorTests(TestCase):
+    """Tests for QueryInspector."""
+
+    def test_nested_serializer_n_plus_one(self):
+        """Test one query per row for the nested user is reported."""
+        create_profiles(3)
+        with QueryInspector(N_PLUS_ONE_THRESHOLD=3, EXPLAIN=False) as qi:
+            UserProfileSerializer(UserProfile.objects.all(), many=True).data
+
+        findings = qi.findings()
+        self.assertEqual([f.kind for f in findings], ['n+1'])
+        self.assertIn('core_user', findings[0].sql)
+        self.assertTrue(findings[0].location.startswith('core'))
+
+    def test_slow_query(self):
+        """Test queries over the threshold are reported."""
+        with QueryInspector(SLOW_QUERY_MS=0, EXPLAIN=False) as qi:
+            list(User.objects.all())
+
+        self.assertEqual([f.kind for f in qi.findings()], ['slow'])
+
+    def test_full_scan(self):
+        """Test a filter on a column without index is reported."""
+        with QueryInspector() as qi:
+            list(UserProfile.objects.filter(name='Profile'))
+
+        findings = qi.findings()
+        self.assertEqual([f.kind for f in findings], ['scan'])
+        self.assertIn('core_userprofile', findings[0].message)
+
+    def test_index_lookup_is_clean(self):
+        """Test a lookup on a unique column is not reported."""
+        with QueryInspector() as qi:
+            list(User.objects.filter(cpf='12345678901'))
+
+        self.assertEqual(qi.findings(), [])
+        qi.assert_clean()
+
+    def test_assert_clean_raises(self):
+        """Test assert_clean fails on findings."""
+        with QueryInspector(SLOW_QUERY_MS=0) as qi:
+            list(User.objects.all())
+
+        with self.assertRaises(QueryProblemError):
+            qi.assert_clean()
+
+
+class QueryInspectorMiddlewareTests(TestCase):
+    """Tests for QueryInspectorMiddleware."""
+
+    def setUp(self) -> None:
+        self.user = create_user(**USER_DATA_TEST)
+        return super().setUp()
+
+    def client_for(self):
+        """Return an authenticated client, created after the override."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client
+
+    @override_settings(QUERY_INSPECTOR={'ENABLED': False})
+    def test_disabled(self):
+        """Test no header is added when the inspector is off."""
+        res = self.client_for().get(reverse('core:user-list'))
+
+        self.assertNotIn(HEADER, res)
+
+    @override_settings(QUERY_INSPECTOR=inspector_settings())
+    def test_header(self):
+        """Test the findings summary header."""
+        res = self.client_for().get(reverse('core:user-list'))
+
+        self.assertEqual(res[HEADER], 'queries=1; n+1=0; slow=0; scan=0')
+
+    @override_settings(QUERY_INSPECTOR=inspector_settings(
+        RAISE=True, N_PLUS_ONE_THRESHOLD=1))
+    def test_raise(self):
+        """Test findings fail the request when set to raise."""
+        with self.assertLogs('core.query_inspector', level='WARNING'):
+            with self.assertRaises(QueryProblemError):
+                self.client_for().get(reverse('core:user-list'))
@@ -0,0 +1,115 @@
+"""
+Tests for the fast JSON renderer and parser.
+"""
+import datetime
+import decimal
+import io
+import json
+import uuid
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from core.renderers import FastJSONParser, FastJSONRenderer
+
+
+def sample_payload() -> dict:
+    """Return a payload mixing types the stdlib json can not encode."""
+    return {
+        'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'birth_date': datetime.date(2023, 1, 2),
+        'weight': decimal.Decimal('3.25'),
+        'name': 'Gestante \u2028 Teste',
+        'items': [1, 2, 3],
+    }
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    """Tests for FastJSONRenderer."""
+
+    def test_render_matches_stock_renderer(self):
+        """Test the rendered document decodes to the stock output."""
+        data = sample_payload()
+        fast = json.loads(FastJSONRenderer().render(data))
+        stock = json.loads(JSONRenderer().render(data))
+
+        self.assertEqual(fast, stock)
+        self.assertEqual(fast['birth_date'], '2023-01-02')
+        self.assertEqual(fast['id'], str(data['id']))
+        self.assertEqual(fast['weight'], 3.25)
+
+    def test_render_same_bytes_as_stock_renderer(self):
+        """Test datetimes and integers beyond 64 bits render as DRF does."""
+        sao_paulo = datetime.timezone(datetime.timedelta(hours=-3))
+        for data in (
+            {'at': datetime.datetime(2024, 1, 2, 3, 4, 5,
+                                     tzinfo=datetime.timezone.utc)},
+            {'at': datetime.datetime(2024, 1, 2, 3, 4, 5, 123456,
+                                     tzinfo=datetime.timezone.utc)},
+            {'at': datetime.datetime(2024, 1, 2, 3, 4, 5, tzinfo=sao_paulo)},
+            {'at': datetime.datetime(2024, 1, 2, 3, 4, 5)},
+            {'at': datetime.time(1, 2, 3, 5), 'id': 2 ** 63 - 1},
+            {'id': 2 ** 64, 'at': datetime.date(2024, 1, 2)},
+            {'ids': [-2 ** 70, 1]},
+        ):
+            self.assertEqual(FastJSONRenderer().render(data),
+                             JSONRenderer().render(data), data)
+
+    def test_render_escapes_line_separators(self):
+        """Test U+2028 is escaped like the stock renderer does."""
+        ret = FastJSONRenderer().render(sample_payload())
+
+        self.assertIn(b'\\u2028', ret)
+        self.assertNotIn('\u2028'.encode('utf-8'), ret)
+
+    def test_render_none_is_empty(self):
+        """Test rendering None returns an empty body."""
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    def test_render_indent_from_media_type(self):
+        """Test the indent media type parameter is honoured."""
+        ret = FastJSONRenderer().render(
+            {'a': 1}, 'application/json; indent=4')
+
+        self.assertIn(b'\n', ret)
+
+    @patch('core.renderers.orjson', None)
+    def test_render_without_orjson_falls_back(self):
+        """Test the renderer works when orjson is not installed."""
+        data = sample_payload()
+        ret = FastJSONRenderer().render(data)
+
+        self.assertEqual(ret, JSONRenderer().render(data))
+
+
+class FastJSONParserTests(SimpleTestCase):
+    """Tests for FastJSONParser."""
+
+    def test_parse_json(self):
+        """Test a JSON body is parsed."""
+        stream = io.BytesIO('{"name": "Gestação", "n": [1, 2]}'.encode())
+        data = FastJSONParser().parse(stream)
+
+        self.assertEqual(data, {'name': 'Gestação', 'n': [1, 2]})
+
+    def test_parse_other_encoding(self):
+        """Test a body declared in another charset is decoded first."""
+        stream = io.BytesIO('{"name": "Gestação"}'.encode('latin-1'))
+        data = FastJSONParser().parse(
+            stream, parser_context={'encoding': 'latin-1'})
+
+        self.assertEqual(data, {'name': 'Gestação'})
+
+    def test_parse_invalid_json_raises_parse_error(self):
+        """Test invalid JSON raises ParseError."""
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b'{"name": '))
+
+    @patch('core.renderers.orjson', None)
+    def test_parse_without_orjson_falls_back(self):
+        """Test the parser works when orjson is not installed."""
+        data = FastJSONParser().parse(io.BytesIO(b'{"a": 1}'))
+
+        self.assertEqual(data, {'a': 1})
@@ -0,0 +1,240 @@
+"""
+Tests for the revocation of JWTs.
+"""
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core import db_router, revocation
+from core.db_router import use_replica
+from core.models import TokenRevocation
+from core.tasks import purge_token_revocations
+from core.tests.data_test import SUPERVISOR_DATA_TEST, USER_DATA_TEST
+
+ME_URL = reverse('core:me')
+REFRESH_URL = reverse('core:refresh-token')
+REVOKE_URL = reverse('core:revoke-token')
+VERIFY_URL = reverse('core:verify-token')
+USERS_BULK_URL = reverse('core:user-bulk-update')
+
+
+def create_user(**params):
+    """
+    Helper function to create a user.
+    """
+    return get_user_model().objects.create_user(**params)
+
+
+def client_for(token) -> APIClient:
+    """Return a client sending the access token `token`."""
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    return client
+
+
+class RevocationTestCase(TestCase):
+    """Base test case starting with an empty revocation list."""
+
+    def setUp(self) -> None:
+        revocation.revocation_list.clear()
+        self.addCleanup(revocation.revocation_list.clear)
+        self.user = create_user(**USER_DATA_TEST)
+        self.refresh = RefreshToken.for_user(self.user)
+        self.access = self.refresh.access_token
+        return super().setUp()
+
+
+class RevocationListTests(RevocationTestCase):
+    """Tests for the in-process revocation list."""
+
+    def test_revoke_token(self):
+        """Test a token revoked by jti is refused, not the others."""
+        with self.captureOnCommitCallbacks(execute=True):
+            revocation.revoke_token(self.access)
+
+        self.assertTrue(revocation.is_revoked(self.access))
+        self.assertFalse(revocation.is_revoked(self.refresh))
+
+    def test_revoke_user(self):
+        """Test the tokens issued before a user revocation are refused."""
+        with self.captureOnCommitCallbacks(execute=True):
+            revocation.revoke_user(self.user)
+
+        self.assertTrue(revocation.is_revoked(self.access))
+        self.assertTrue(revocation.is_revoked(self.refresh))
+        later = RefreshToken.for_user(self.user)
+        later['iat'] = int(timezone.now().timestamp()) + 1
+        self.assertFalse(revocation.is_revoked(later))
+
+    def test_checks_do_not_query(self):
+        """Test checking tokens between refreshes runs no query."""
+        revocation.revocation_list.refresh(force=True)
+
+        with self.assertNumQueries(0):
+            for _ in range(100):
+                revocation.is_revoked(self.access)
+
+    def test_refresh_keeps_replica_reads(self):
+        """Test a refresh reads the primary without pinning the request."""
+        with use_replica():
+            revocation.revocation_list.refresh(force=True)
+            state = db_router._state.get()
+
+        self.assertTrue(state.replica)
+        self.assertFalse(state.wrote)
+
+    @override_settings(REVOCATION={'REFRESH_INTERVAL': 60})
+    def test_refresh_reads_other_processes(self):
+        """Test revocations of other processes apply after a refresh."""
+        revocation.revocation_list.refresh(force=True)
+        now = timezone.now()
+        TokenRevocation.objects.create(
+            jti=self.access['jti'], expires_at=now + timedelta(hours=1),
+            created_at=now)
+
+        self.assertFalse(revocation.is_revoked(self.access))
+        revocation.revocation_list.next_refresh = 0.0
+        with self.assertNumQueries(1):
+            self.assertTrue(revocation.is_revoked(self.access))
+
+    def test_expired_revocations_are_dropped(self):
+        """Test revocations of expired tokens are not kept."""
+        now = timezone.now()
+        TokenRevocation.objects.create(
+            jti='expired', expires_at=now - timedelta(seconds=1),
+            created_at=now - timedelta(hours=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            revocation.revoke_token(self.access)
+        revocation.revocation_list.refresh(force=True)
+
+        self.assertEqual(list(revocation.revocation_list.jtis),
+                         [self.access['jti']])
+        self.assertEqual(purge_token_revocations(), 1)
+        self.assertEqual(TokenRevocation.objects.count(), 1)
+
+    def test_database_error_keeps_revocations(self):
+        """Test a failing refresh keeps the revocations read before."""
+        with self.captureOnCommitCallbacks(execute=True):
+            revocation.revoke_token(self.access)
+        revocation.revocation_list.refresh(force=True)
+
+        with mock.patch.object(revocation.RevocationList, 'read',
+                               side_effect=DatabaseError), \
+                self.assertLogs('core.revocation', 'ERROR'):
+            revocation.revocation_list.refresh(force=True)
+
+        self.assertTrue(revocation.is_revoked(self.access))
+
+    def test_reload_keeps_revocations_while_reading(self):
+        """Test checks during a reload still see the revocations."""
+        with self.captureOnCommitCallbacks(execute=True):
+            revocation.revoke_token(self.access)
+        revocation.revocation_list.refresh(force=True)
+        add = revocation.RevocationList._add
+        seen = []
+
+        def check_and_add(*args):
+            seen.append(self.access['jti'] in revocation.revocation_list.jtis)
+            add(*args)
+
+        with mock.patch.object(revocation.RevocationList, '_add',
+                               side_effect=check_and_add):
+            revocation.revocation_list.refresh(force=True)
+
+        self.assertEqual(seen, [True])
+        self.assertTrue(revocation.is_revoked(self.access))
+
+    @override_settings(REVOCATION={'ENABLED': False})
+    def test_disabled(self):
+        """Test nothing is revoked when revocation is disabled."""
+        with self.captureOnCommitCallbacks(execute=True):
+            revocation.revoke_token(self.access)
+
+        self.assertFalse(revocation.is_revoked(self.access))
+
+
+class RevocationApiTests(RevocationTestCase):
+    """Tests for the revocation of the tokens used by the API."""
+
+    def test_revoke_endpoint(self):
+        """Test revoked tokens can not authenticate nor be refreshed."""
+        with self.captureOnCommitCallbacks(execute=True):
+            res = APIClient().post(REVOKE_URL, {
+                'refresh': str(self.refresh), 'access': str(self.access),
+            }, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = client_for(self.access).get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        res = APIClient().post(VERIFY_URL, {'token': str(self.access)},
+                               format='json')
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        res = APIClient().post(REFRESH_URL, {'refresh': str(self.refresh)},
+                               format='json')
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoke_tokens_of_another_user(self):
+        """Test a refresh and an access token of two users are refused."""
+        other = create_user(**SUPERVISOR_DATA_TEST)
+
+        res = APIClient().post(REVOKE_URL, {
+            'refresh': str(self.refresh),
+            'access': str(RefreshToken.for_user(other).access_token),
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(TokenRevocation.objects.exists())
+
+    def test_disabled_user_tokens_are_revoked(self):
+        """Test disabling a user revokes their tokens at once."""
+        self.assertEqual(
+            APIClient().post(VERIFY_URL, {'token': str(self.access)},
+                             format='json').status_code,
+            status.HTTP_200_OK)
+
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        res = APIClient().post(VERIFY_URL, {'token': str(self.access)},
+                               format='json')
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_saving_active_user_does_not_revoke(self):
+        """Test saving other changes revokes nothing."""
+        self.user.name = 'Renamed'
+        self.user.save()
+        self.user.is_active = False
+        self.user.save(update_fields=['name'])
+
+        self.assertFalse(TokenRevocation.objects.exists())
+
+    def test_saving_inactive_user_does_not_revoke_again(self):
+        """Test only the save disabling a user revokes their tokens."""
+        self.user.is_active = False
+        self.user.save()
+        self.user.save()
+        user = get_user_model().objects.get(pk=self.user.pk)
+        user.save(update_fields=['is_active'])
+
+        self.assertEqual(TokenRevocation.objects.count(), 1)
+
+    def test_bulk_disabled_users_are_revoked(self):
+        """Test users disabled in bulk have their tokens revoked."""
+        staff = create_user(**SUPERVISOR_DATA_TEST)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = client_for(RefreshToken.for_user(staff).access_token).patch(
+                USERS_BULK_URL, [{'id': self.user.id, 'is_active': False}],
+                format='json')
+
+        self.assertEqual(res.data['results'][0]['status'], 200)
+        self.assertTrue(revocation.is_revoked(self.access))
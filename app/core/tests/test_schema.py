@@ -0,0 +1,127 @@
+"""
+Tests for the precomputed OpenAPI schema.
+"""
+import gzip
+import io
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core.schema import clear_schema_cache, generate_schema, render_schema
+
+SCHEMA_URL = reverse('api-schema')
+
+
+class CachedSchemaTests(TestCase):
+    """Tests for the api/schema/ endpoint."""
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.schema_file = os.path.join(self.tmpdir.name, 'openapi.json')
+        self.settings_override = override_settings(
+            OPENAPI_SCHEMA_FILE=self.schema_file)
+        self.settings_override.enable()
+        clear_schema_cache()
+        call_command('build_schema', stdout=io.StringIO())
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        clear_schema_cache()
+        self.settings_override.disable()
+        self.tmpdir.cleanup()
+        return super().tearDown()
+
+    def test_schema_served_from_file(self):
+        """Test the schema file is served, not a live generation."""
+        with open(self.schema_file) as schema_file:
+            schema = json.load(schema_file)
+        schema['info']['title'] = 'Built schema'
+        with open(self.schema_file, 'w') as schema_file:
+            json.dump(schema, schema_file)
+        clear_schema_cache()
+
+        res = self.client.get(SCHEMA_URL, {'format': 'json'})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.content), schema)
+
+    def test_schema_served_without_file(self):
+        """Test the schema is generated in process when the file is missing."""
+        os.remove(self.schema_file)
+        with self.assertLogs('core.schema', level='WARNING'):
+            res = self.client.get(SCHEMA_URL, {'format': 'json'})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('/api/v1/users/', json.loads(res.content)['paths'])
+
+    def test_schema_defaults_to_yaml(self):
+        """Test YAML is served by default, as before."""
+        res = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res['Content-Type'].startswith(
+            'application/vnd.oai.openapi'))
+        self.assertTrue(res.content.startswith(b'openapi:'))
+
+    def test_schema_not_modified(self):
+        """Test a matching If-None-Match returns 304."""
+        res = self.client.get(SCHEMA_URL, {'format': 'json'})
+        etag = res['ETag']
+        res = self.client.get(
+            SCHEMA_URL, {'format': 'json'}, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res['ETag'], etag)
+        self.assertEqual(res.content, b'')
+
+    def test_schema_gzip(self):
+        """Test the schema is gzipped when the client accepts it."""
+        plain = self.client.get(SCHEMA_URL, {'format': 'json'})
+        res = self.client.get(
+            SCHEMA_URL, {'format': 'json'}, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertNotEqual(res['ETag'], plain['ETag'])
+        self.assertEqual(gzip.decompress(res.content), plain.content)
+        self.assertIn('Accept-Encoding', res['Vary'])
+
+
+class SchemaFileTests(SimpleTestCase):
+    """Tests for the schema file built with the image."""
+
+    def test_schema_file_is_current(self):
+        """
+        Test the built schema file matches the code. The test step builds
+        it first, see .github/workflows/checks.yml.
+        """
+        self.assertTrue(
+            os.path.exists(settings.OPENAPI_SCHEMA_FILE),
+            f'{settings.OPENAPI_SCHEMA_FILE} is missing, run '
+            '`manage.py build_schema`.')
+        with open(settings.OPENAPI_SCHEMA_FILE, 'rb') as schema_file:
+            built = json.load(schema_file)
+        live = json.loads(render_schema(generate_schema(), 'json'))
+
+        self.assertEqual(
+            built, live,
+            f'{settings.OPENAPI_SCHEMA_FILE} is stale, run '
+            '`manage.py build_schema`.')
+
+
+class SchemaSecurityTests(TestCase):
+    """Tests for the security schemes of the schema."""
+
+    def test_jwt_security_scheme(self):
+        """Test the API is documented as authenticated by bearer JWT."""
+        schema = generate_schema()
+
+        self.assertEqual(
+            schema['components']['securitySchemes']['jwtAuth']['scheme'],
+            'bearer')
+        me = schema['paths']['/api/v1/detail/me/']['get']
+        self.assertIn({'jwtAuth': []}, me['security'])
@@ -0,0 +1,47 @@
+"""
+Tests for the SQLite tuning mode.
+"""
+import os
+import tempfile
+import unittest
+
+from django.conf import settings
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite only.')
+class SQLiteTuningTests(SimpleTestCase):
+    """Tests for settings.SQLITE_OPTIONS on a database file."""
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.wrapper = DatabaseWrapper({
+            **connection.settings_dict,
+            'NAME': os.path.join(self.tmpdir.name, 'db.sqlite3'),
+            'OPTIONS': settings.SQLITE_OPTIONS,
+        }, alias='tuning')
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.wrapper.close()
+        self.tmpdir.cleanup()
+        return super().tearDown()
+
+    def pragma(self, name):
+        with self.wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas(self):
+        """Test every connection runs in WAL mode with the pragmas."""
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 20000)
+        self.assertEqual(self.pragma('cache_size'), -20000)
+
+    def test_immediate_transactions(self):
+        """Test write transactions start with BEGIN IMMEDIATE."""
+        self.wrapper.ensure_connection()
+        self.assertEqual(self.wrapper.transaction_mode, 'IMMEDIATE')
@@ -0,0 +1,77 @@
+"""
+Tests for the cold start budget of a worker.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+from rest_framework import viewsets
+from rest_framework.decorators import action
+
+from benchmarks.bench_imports import run_startup
+from core import views
+from core.mixins import ExtraActionsMixin
+
+# New pods take traffic as soon as they start, see
+# benchmarks/bench_imports.py for the breakdown.
+STARTUP_BUDGET_SECONDS = float(os.environ.get('STARTUP_BUDGET_SECONDS', 2.0))
+
+DEFERRED_MODULES = (
+    'PIL',
+    'drf_spectacular.openapi',
+    'drf_spectacular.views',
+)
+
+
+class StartupTests(SimpleTestCase):
+    """Tests starting a fresh interpreter serving one API request."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reports = [run_startup()[0] for _ in range(3)]
+
+    def test_first_request_within_budget(self):
+        """Test the first request is served within the startup budget."""
+        seconds = min(report['seconds'] for report in self.reports)
+
+        self.assertEqual(self.reports[0]['status'], '401 Unauthorized')
+        self.assertLess(seconds, STARTUP_BUDGET_SECONDS)
+
+    def test_heavy_modules_are_deferred(self):
+        """Test Pillow and the schema generator are not imported."""
+        modules = set(self.reports[0]['modules'])
+
+        for module in DEFERRED_MODULES:
+            self.assertNotIn(module, modules)
+
+
+class ExtraActionsTests(SimpleTestCase):
+    """Tests for ExtraActionsMixin, which reimplements a DRF scan."""
+
+    def test_same_actions_as_drf(self):
+        """Test the actions found are those DRF finds, across upgrades."""
+        for viewset in (views.UserViewSet, views.AdminUserViewSet,
+                        views.UserProfileModelView):
+            self.assertEqual(
+                viewset.get_extra_actions(),
+                viewsets.ViewSetMixin.get_extra_actions.__func__(viewset),
+                viewset)
+        self.assertIn(views.UserProfileModelView.upload_image,
+                      views.UserProfileModelView.get_extra_actions())
+
+    def test_unwrapped_decorator(self):
+        """Test actions hidden by a decorator without `wraps` are refused."""
+        def decorate(method):
+            def wrapper(*args, **kwargs):
+                return method(*args, **kwargs)
+            return wrapper
+
+        class ViewSet(ExtraActionsMixin, viewsets.ViewSet):
+            @action(detail=False)
+            @decorate
+            def unwrapped(self, request):
+                pass
+
+        with self.assertRaises(ImproperlyConfigured):
+            ViewSet.get_extra_actions()
@@ -0,0 +1,175 @@
+"""
+Tests for the throttling of login attempts.
+"""
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.throttling import TokenBucket, is_valid_cpf
+from core.tests.data_test import USER_DATA_TEST, USER_DATA_TEST_SAMPLE
+
+TOKEN_URL = reverse('core:token')
+THROTTLE = {
+    'CACHE': 'throttle',
+    'IP_CAPACITY': 5,
+    'IP_REFILL_SECONDS': 60,
+    'CPF_CAPACITY': 2,
+    'CPF_REFILL_SECONDS': 60,
+}
+UNKNOWN_CPF = '98765432100'
+AUTHENTICATE = 'rest_framework_simplejwt.serializers.authenticate'
+
+
+def create_user(**params):
+    """
+    Helper function to create a user.
+    """
+    return get_user_model().objects.create_user(**params)
+
+
+class CpfTests(SimpleTestCase):
+    """Tests for the CPF check digits."""
+
+    def test_valid_cpf(self):
+        """Test CPFs with valid check digits."""
+        for cpf in ('12345678909', '98765432100', '11144477735'):
+            self.assertTrue(is_valid_cpf(cpf), cpf)
+
+    def test_invalid_cpf(self):
+        """Test malformed CPFs and wrong check digits."""
+        for cpf in ('12345678901', '11111111111', '1234567890', '123456789090',
+                    '123.456.789-09', '１２３４５６７８９０９', None, 12345678909):
+            self.assertFalse(is_valid_cpf(cpf), cpf)
+
+
+class TokenBucketTests(SimpleTestCase):
+    """Tests for the token buckets."""
+
+    def setUp(self) -> None:
+        self.cache = caches['throttle']
+        self.cache.clear()
+        self.addCleanup(self.cache.clear)
+        self.bucket = TokenBucket(self.cache, 'test', 3, 10)
+        return super().setUp()
+
+    def test_capacity(self):
+        """Test a bucket allows `capacity` attempts, then a wait."""
+        with mock.patch('core.throttling.time.time', return_value=1000.0):
+            self.assertEqual([self.bucket.wait('ident') for _ in range(3)],
+                             [0, 0, 0])
+            self.assertAlmostEqual(self.bucket.wait('ident'), 10)
+            self.assertEqual(self.bucket.wait('other'), 0)
+
+    def test_refill(self):
+        """Test a token is added back every refill period."""
+        with mock.patch('core.throttling.time.time', return_value=1000.0):
+            for _ in range(3):
+                self.bucket.wait('ident')
+        with mock.patch('core.throttling.time.time', return_value=1004.0):
+            self.assertAlmostEqual(self.bucket.wait('ident'), 6)
+        with mock.patch('core.throttling.time.time', return_value=1010.0):
+            self.assertEqual(self.bucket.wait('ident'), 0)
+            self.assertAlmostEqual(self.bucket.wait('ident'), 10)
+
+    def test_check_without_taking(self):
+        """Test checking a bucket does not take its tokens."""
+        for _ in range(5):
+            self.assertEqual(self.bucket.wait('ident', take=False), 0)
+
+
+@override_settings(LOGIN_THROTTLE=THROTTLE)
+class LoginThrottleTests(TestCase):
+    """Tests for the throttling of token/."""
+
+    def setUp(self) -> None:
+        caches['throttle'].clear()
+        self.addCleanup(caches['throttle'].clear)
+        self.user = create_user(**USER_DATA_TEST)
+        self.client = APIClient()
+        return super().setUp()
+
+    def login(self, cpf, password='wrongpassword', ip='10.0.0.1'):
+        """Post a login attempt, return the response."""
+        return self.client.post(TOKEN_URL, {'cpf': cpf, 'password': password},
+                                format='json', REMOTE_ADDR=ip)
+
+    def test_failed_logins_lock_cpf(self):
+        """Test failed attempts on a CPF are throttled before hashing."""
+        for _ in range(THROTTLE['CPF_CAPACITY']):
+            res = self.login(USER_DATA_TEST['cpf'])
+            self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        with mock.patch(AUTHENTICATE) as authenticate:
+            res = self.login(USER_DATA_TEST['cpf'],
+                             USER_DATA_TEST['password'], ip='10.0.0.2')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', res)
+        authenticate.assert_not_called()
+
+    def test_successful_logins_do_not_lock_cpf(self):
+        """Test successful attempts keep the CPF bucket full."""
+        for _ in range(THROTTLE['CPF_CAPACITY'] + 1):
+            res = self.login(USER_DATA_TEST['cpf'], USER_DATA_TEST['password'])
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_attempts_lock_ip(self):
+        """Test every attempt from an IP takes from its bucket."""
+        for _ in range(THROTTLE['IP_CAPACITY']):
+            self.login(UNKNOWN_CPF)
+
+        self.assertEqual(self.login(UNKNOWN_CPF).status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(
+            self.login(USER_DATA_TEST['cpf'], USER_DATA_TEST['password'],
+                       ip='10.0.0.2').status_code,
+            status.HTTP_200_OK)
+
+    def test_forwarded_for_does_not_reset_ip_bucket(self):
+        """Test clients can not get new IP buckets with X-Forwarded-For."""
+        for index in range(THROTTLE['IP_CAPACITY'] + 1):
+            res = self.client.post(
+                TOKEN_URL, {'cpf': '12345678901', 'password': 'wrongpassword'},
+                format='json', REMOTE_ADDR='10.0.0.1',
+                HTTP_X_FORWARDED_FOR=f'192.0.2.{index}')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_invalid_cpf_is_refused_without_hash(self):
+        """Test unknown CPFs with wrong check digits are refused at once."""
+        with self.assertNumQueries(1), \
+                mock.patch(AUTHENTICATE) as authenticate:
+            res = self.login('12345678901')
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res.data['detail'].code, 'no_active_account')
+        authenticate.assert_not_called()
+
+    def test_stored_invalid_cpf_logs_in(self):
+        """Test users stored with wrong check digits can still log in."""
+        create_user(**{**USER_DATA_TEST_SAMPLE, 'cpf': '12345678901'})
+
+        res = self.login('12345678901', USER_DATA_TEST_SAMPLE['password'])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_unknown_cpf_hashes_password(self):
+        """Test unknown CPFs cost a hash like wrong passwords."""
+        with mock.patch('django.contrib.auth.base_user.make_password',
+                        return_value='!') as make_password:
+            res = self.login(UNKNOWN_CPF)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        make_password.assert_called_once()
+
+    @override_settings(LOGIN_THROTTLE={**THROTTLE, 'ENABLED': False})
+    def test_disabled(self):
+        """Test nothing is throttled when throttling is disabled."""
+        for _ in range(THROTTLE['IP_CAPACITY'] + 1):
+            res = self.login(USER_DATA_TEST['cpf'])
+            self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,197 @@
+"""
+Tests for request tracing.
+"""
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image as PILImage
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core import tracing
+from core.tests.data_test import USER_DATA_TEST
+
+TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+PARENT_ID = '00f067aa0ba902b7'
+
+
+def create_user(**params):
+    """
+    Helper function to create a user.
+    """
+    return get_user_model().objects.create_user(**params)
+
+
+def read_spans(path) -> list:
+    """Return the spans of every trace exported to `path`."""
+    spans = []
+    with open(path) as trace_file:
+        for line in trace_file:
+            payload = json.loads(line)
+            for resource in payload['resourceSpans']:
+                for scope in resource['scopeSpans']:
+                    spans.extend(scope['spans'])
+    return spans
+
+
+class SpanTests(SimpleTestCase):
+    """Tests for span()."""
+
+    def test_span_without_trace_is_noop(self):
+        """Test span() is a shared no-op outside of a trace."""
+        with tracing.span('anything') as current:
+            self.assertIsNone(current)
+        self.assertIs(tracing.span('other'), tracing.span('anything'))
+
+    def test_nested_spans(self):
+        """Test spans are nested through the active span."""
+        trace = tracing.Trace()
+        with tracing.Span(trace, 'root') as root:
+            with tracing.span('child', key='value') as child:
+                self.assertIs(tracing.current_span(), child)
+        self.assertIsNone(tracing.current_span())
+
+        self.assertEqual(child.parent_id, root.span_id)
+        self.assertEqual([s.name for s in trace.spans], ['child', 'root'])
+        self.assertEqual(
+            child.to_otlp()['attributes'],
+            [{'key': 'key', 'value': {'stringValue': 'value'}}])
+
+
+class TracingMiddlewareTests(TestCase):
+    """Tests for TracingMiddleware with the file exporter."""
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.trace_file = os.path.join(self.tmpdir.name, 'traces.jsonl')
+        self.settings_override = override_settings(TRACING={
+            'EXPORTER': 'file',
+            'FILE': self.trace_file,
+            'SAMPLE_RATE': 0.0,
+            'TRUST_PARENT': True,
+        })
+        self.settings_override.enable()
+        self.user = create_user(**USER_DATA_TEST)
+        self.client = APIClient()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        self.tmpdir.cleanup()
+        return super().tearDown()
+
+    def test_request_is_not_traced_by_default(self):
+        """Test requests are not traced unless sampled."""
+        res = self.client.get(reverse('core:me'))
+
+        self.assertNotIn(tracing.TRACE_ID_HEADER, res)
+        self.assertFalse(os.path.exists(self.trace_file))
+
+    def test_unsampled_traceparent_is_not_traced(self):
+        """Test a traceparent without the sampled flag is not traced."""
+        res = self.client.get(
+            reverse('core:me'),
+            HTTP_TRACEPARENT=f'00-{TRACE_ID}-{PARENT_ID}-00')
+
+        self.assertNotIn(tracing.TRACE_ID_HEADER, res)
+
+    def test_untrusted_traceparent_is_not_traced(self):
+        """Test the sampled flag is ignored unless parents are trusted."""
+        with override_settings(TRACING={
+                'EXPORTER': 'file', 'FILE': self.trace_file}):
+            res = self.client.get(
+                reverse('core:me'),
+                HTTP_TRACEPARENT=f'00-{TRACE_ID}-{PARENT_ID}-01')
+
+        self.assertNotIn(tracing.TRACE_ID_HEADER, res)
+        self.assertFalse(os.path.exists(self.trace_file))
+
+    def test_sampled_traceparent_records_layers(self):
+        """Test the incoming trace is continued with a span per layer."""
+        res = self.client.get(
+            reverse('core:user-detail', args=[self.user.id]),
+            HTTP_TRACEPARENT=f'00-{TRACE_ID}-{PARENT_ID}-01')
+
+        self.assertEqual(res[tracing.TRACE_ID_HEADER], TRACE_ID)
+        spans = read_spans(self.trace_file)
+        names = {s['name'] for s in spans}
+        for name in ('view.dispatch', 'view.authenticate',
+                     'view.check_permissions', 'permissions.get_object',
+                     'serializer.data', 'db.query'):
+            self.assertIn(name, names)
+
+        root = [s for s in spans if s['kind'] == tracing.SPAN_KIND_SERVER]
+        self.assertEqual(len(root), 1)
+        self.assertEqual(root[0]['parentSpanId'], PARENT_ID)
+        self.assertEqual(root[0]['name'], 'GET core:user-detail')
+        span_ids = {s['spanId'] for s in spans}
+        for span in spans:
+            self.assertEqual(span['traceId'], TRACE_ID)
+            if span is not root[0]:
+                self.assertIn(span['parentSpanId'], span_ids)
+
+    def test_storage_write_span(self):
+        """Test image uploads record a storage span."""
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            PILImage.new('RGB', (10, 10)).save(ntf, format='JPEG')
+            ntf.seek(0)
+            with override_settings(TRACING={
+                    'EXPORTER': 'file', 'FILE': self.trace_file,
+                    'SAMPLE_RATE': 1.0}):
+                res = self.client.post(
+                    reverse('core:user-upload-image', args=[self.user.id]),
+                    {'image': ntf}, format='multipart')
+
+        self.assertEqual(res.status_code, 200)
+        names = [s['name'] for s in read_spans(self.trace_file)]
+        self.assertIn('storage.save', names)
+        self.assertIn('serializer.is_valid', names)
+        self.user.refresh_from_db()
+        self.user.image.delete()
+
+
+class CollectorHandler(BaseHTTPRequestHandler):
+    """OTLP/HTTP collector stand-in keeping the received payloads."""
+    payloads = []
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        self.payloads.append(json.loads(self.rfile.read(length)))
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class OTLPExporterTests(SimpleTestCase):
+    """Tests for the OTLP/HTTP exporter."""
+
+    def test_export_posts_to_collector(self):
+        """Test traces are posted to the collector endpoint."""
+        server = HTTPServer(('127.0.0.1', 0), CollectorHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            exporter = tracing.OTLPExporter(
+                f'http://127.0.0.1:{server.server_port}/v1/traces')
+            trace = tracing.Trace(TRACE_ID)
+            with tracing.Span(trace, 'root'):
+                pass
+            exporter.export(tracing.to_otlp(trace, 'test'))
+            exporter.queue.join()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        spans = CollectorHandler.payloads[0]['resourceSpans'][0][
+            'scopeSpans'][0]['spans']
+        self.assertEqual(spans[0]['traceId'], TRACE_ID)
@@ -0,0 +1,177 @@
+"""
+Tests for direct-to-storage image uploads.
+"""
+import io
+import os
+import tempfile
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image as PILImage
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import UserProfile
+from core.tasks import cleanup_pending_uploads
+from core.tests.data_test import SUPERVISOR_DATA_TEST, USER_DATA_TEST
+
+TICKET_URL = reverse('core:upload-ticket')
+FINALIZE_URL = reverse('core:upload-finalize')
+
+
+def create_user(**params):
+    """
+    Helper function to create a user.
+    """
+    return get_user_model().objects.create_user(**params)
+
+
+def jpeg_bytes() -> bytes:
+    """Return a small JPEG image."""
+    buffer = io.BytesIO()
+    PILImage.new('RGB', (10, 10)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+class UploadTests(TestCase):
+    """Tests for the upload ticket flow."""
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.tmpdir.name)
+        self.settings_override.enable()
+        self.user = create_user(**USER_DATA_TEST)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        self.tmpdir.cleanup()
+        return super().tearDown()
+
+    def ticket(self, data=None, **params):
+        """Request a ticket for a JPEG of the given size."""
+        payload = {'target': 'user', 'content_type': 'image/jpeg',
+                   'size': len(data or b'x'), **params}
+        return self.client.post(TICKET_URL, payload, format='json')
+
+    def put(self, res, data, content_type='image/jpeg'):
+        """PUT `data` to the upload URL of a ticket response."""
+        return self.client.generic(
+            'PUT', urlsplit(res.data['upload_url']).path, data,
+            content_type=content_type)
+
+    def test_upload_flow(self):
+        """Test an image uploaded with a ticket is attached to the user."""
+        data = jpeg_bytes()
+        res = self.ticket(data)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['method'], 'PUT')
+
+        upload = self.put(res, data)
+        self.assertEqual(upload.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(upload.json()['size'], len(data))
+
+        final = self.client.post(
+            FINALIZE_URL, {'ticket': res.data['ticket']}, format='json')
+        self.assertEqual(final.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.image.name.startswith('uploads/images/'))
+        self.assertTrue(os.path.exists(self.user.image.path))
+        self.assertFalse(os.listdir(
+            os.path.join(self.tmpdir.name, 'uploads', 'pending')))
+        self.assertIn(self.user.image.name, final.data['image'])
+
+    def test_profile_target(self):
+        """Test tickets without id target the own profile."""
+        profile = UserProfile.objects.create(user=self.user, name='Profile')
+        data = jpeg_bytes()
+        res = self.ticket(data, target='user-profile')
+        self.put(res, data)
+
+        final = self.client.post(
+            FINALIZE_URL, {'ticket': res.data['ticket']}, format='json')
+
+        self.assertEqual(final.status_code, status.HTTP_200_OK)
+        profile.refresh_from_db()
+        self.assertTrue(profile.image.name)
+
+    def test_ticket_validation(self):
+        """Test oversized and non image uploads are refused a ticket."""
+        res = self.ticket(size=100 * 1024 * 1024)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.ticket(content_type='application/pdf')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_user_target(self):
+        """Test users can not upload images of other users."""
+        other = create_user(**SUPERVISOR_DATA_TEST)
+
+        res = self.ticket(id=other.id)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_upload_rejections(self):
+        """Test the receiver enforces the ticket."""
+        data = jpeg_bytes()
+        res = self.ticket(data)
+
+        self.assertEqual(self.put(res, data, 'image/png').status_code, 400)
+        self.assertEqual(self.put(res, data + b'x').status_code, 400)
+        tampered = self.client.generic(
+            'PUT', urlsplit(res.data['upload_url']).path + 'x', data,
+            content_type='image/jpeg')
+        self.assertEqual(tampered.status_code, 400)
+        self.assertEqual(self.put(res, data).status_code, 201)
+        self.assertEqual(self.put(res, data).status_code, 400)
+
+    def test_finalize_rejects_invalid_image(self):
+        """Test files that are not images are deleted on finalize."""
+        data = b'\xff\xd8\xff' + b'not a jpeg' * 10
+        res = self.ticket(data)
+        self.put(res, data)
+
+        final = self.client.post(
+            FINALIZE_URL, {'ticket': res.data['ticket']}, format='json')
+
+        self.assertEqual(final.status_code, status.HTTP_400_BAD_REQUEST)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.image)
+        self.assertFalse(os.listdir(
+            os.path.join(self.tmpdir.name, 'uploads', 'pending')))
+
+    def test_finalize_before_upload(self):
+        """Test finalizing a ticket without upload fails."""
+        res = self.ticket()
+
+        final = self.client.post(
+            FINALIZE_URL, {'ticket': res.data['ticket']}, format='json')
+
+        self.assertEqual(final.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_finalize_ticket_of_other_user(self):
+        """Test tickets can only be finalized by their user."""
+        res = self.ticket()
+        other = APIClient()
+        other.force_authenticate(create_user(**SUPERVISOR_DATA_TEST))
+
+        final = other.post(
+            FINALIZE_URL, {'ticket': res.data['ticket']}, format='json')
+
+        self.assertEqual(final.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_cleanup_pending_uploads(self):
+        """Test uploads never finalized are deleted by the cleanup task."""
+        data = jpeg_bytes()
+        self.put(self.ticket(data), data)
+        self.put(self.ticket(data), data)
+        pending = os.path.join(self.tmpdir.name, 'uploads', 'pending')
+        old, recent = sorted(os.listdir(pending))
+        os.utime(os.path.join(pending, old), (0, 0))
+
+        self.assertEqual(cleanup_pending_uploads(), 1)
+        self.assertEqual(os.listdir(pending), [recent])
@@ -0,0 +1,45 @@
+"""
+Tests for the warmup and the production server settings.
+"""
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core import server
+from core.warmup import warmup
+
+
+class WarmupTests(TestCase):
+    """Tests for warmup()."""
+
+    def test_warmup(self):
+        """Test URL patterns and serializers are warmed up."""
+        summary = warmup()
+
+        self.assertGreater(summary['patterns'], 10)
+        self.assertGreaterEqual(summary['serializers'], 2)
+
+    def test_no_connection_outside_request_threads(self):
+        """Test the workers hold no connection outside their threads."""
+        self.assertNotIn('post_fork', server.server_options())
+
+
+class ServerOptionsTests(SimpleTestCase):
+    """Tests for the gunicorn settings."""
+
+    def test_cpu_count(self):
+        """Test at least one CPU is reported."""
+        self.assertGreaterEqual(server.cpu_count(), 1)
+
+    @override_settings(WEB_CONCURRENCY=0, WEB_THREADS=4)
+    def test_defaults_from_cpu_count(self):
+        """Test workers default to 2 x CPUs + 1 and the app is preloaded."""
+        options = server.server_options()
+
+        self.assertEqual(options['workers'], 2 * server.cpu_count() + 1)
+        self.assertEqual(options['threads'], 4)
+        self.assertTrue(options['preload_app'])
+
+    @override_settings(WEB_CONCURRENCY=3)
+    def test_overrides(self):
+        """Test settings and options override the defaults."""
+        self.assertEqual(server.worker_count(), 3)
+        self.assertEqual(server.server_options(workers=5)['workers'], 5)
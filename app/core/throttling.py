@@ -0,0 +1,143 @@
+"""
+Cheap rejection of abusive login attempts.
+
+Every attempt on `token/` that reaches the authentication backend costs a
+full PBKDF2 hash, whether the CPF exists or not (`ModelBackend` hashes
+the password of a dummy user for unknown CPFs, so both paths take the
+same time). Credential stuffing would burn the CPU real users need, so
+`LoginThrottle` rejects attempts before any lookup or hash:
+
+* each client IP has a token bucket of `IP_CAPACITY` attempts, refilled
+  one every `IP_REFILL_SECONDS`; every attempt takes a token. The IP is
+  `REMOTE_ADDR`, or the X-Forwarded-For entry of the nearest of
+  `REST_FRAMEWORK['NUM_PROXIES']` trusted proxies;
+* each CPF has a bucket of `CPF_CAPACITY` attempts, refilled one every
+  `CPF_REFILL_SECONDS`; only failed attempts take a token, so the owner
+  of a CPF under attack is only locked out for as long as it lasts;
+* with `VALIDATE_CPF`, a CPF with an invalid format or check digits is
+  refused as a wrong password by `MyTokenObtainPairSerializer`, after a
+  single indexed lookup and without a hash. The lookup lets users
+  stored before `UserSerializer` validated CPFs log in.
+
+Throttled attempts get `429` with a `Retry-After` header. Buckets are
+stored in the `settings.LOGIN_THROTTLE['CACHE']` cache, a local memory
+cache for a single process, or a file or database cache shared by the
+processes of a node. Updates are not atomic, so concurrent attempts may
+overshoot a bucket by a few attempts.
+"""
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+CPF_LENGTH = 11
+
+
+def login_throttle_settings() -> dict:
+    """Return the login throttling settings with their defaults."""
+    return {
+        'ENABLED': True,
+        'VALIDATE_CPF': True,
+        'CACHE': 'default',
+        'IP_CAPACITY': 30,
+        'IP_REFILL_SECONDS': 2,
+        'CPF_CAPACITY': 5,
+        'CPF_REFILL_SECONDS': 60,
+        **getattr(settings, 'LOGIN_THROTTLE', {}),
+    }
+
+
+def is_valid_cpf(value) -> bool:
+    """Return whether `value` is 11 digits with valid CPF check digits."""
+    if not isinstance(value, str) or len(value) != CPF_LENGTH or \
+            not value.isascii() or not value.isdigit():
+        return False
+    digits = [int(digit) for digit in value]
+    if len(set(digits)) == 1:
+        return False
+    for position in (9, 10):
+        total = sum(digit * weight for digit, weight in zip(
+            digits, range(position + 1, 1, -1)))
+        if (total * 10) % 11 % 10 != digits[position]:
+            return False
+    return True
+
+
+class TokenBucket:
+    """
+    Token bucket of `capacity` tokens refilled one every `refill`
+    seconds, stored in a cache as the time it will be full again.
+    """
+
+    def __init__(self, cache, prefix: str, capacity: int, refill: float):
+        self.cache = cache
+        self.prefix = prefix
+        self.capacity = capacity
+        self.refill = refill
+
+    def key(self, ident: str) -> str:
+        """Return the cache key of the bucket of `ident`."""
+        digest = hashlib.sha256(ident.encode()).hexdigest()
+        return f'throttle:{self.prefix}:{digest}'
+
+    def wait(self, ident: str, take=True) -> float:
+        """
+        Take a token from the bucket of `ident`, or only check there is
+        one without `take`. Return 0, or the seconds until a token is
+        available when the bucket is empty.
+        """
+        key = self.key(ident)
+        now = time.time()
+        full_at = max(self.cache.get(key, now), now)
+        wait = full_at + self.refill - now - self.capacity * self.refill
+        if wait > 0:
+            return wait
+        if take:
+            full_at += self.refill
+            self.cache.set(key, full_at, timeout=math.ceil(full_at - now))
+        return 0
+
+
+def get_buckets() -> tuple:
+    """Return the IP and CPF buckets."""
+    options = login_throttle_settings()
+    cache = caches[options['CACHE']]
+    return (
+        TokenBucket(cache, 'login-ip', options['IP_CAPACITY'],
+                    options['IP_REFILL_SECONDS']),
+        TokenBucket(cache, 'login-cpf', options['CPF_CAPACITY'],
+                    options['CPF_REFILL_SECONDS']),
+    )
+
+
+def login_cpf(request):
+    """Return the CPF of a login request, or None."""
+    data = request.data
+    return data.get('cpf') if hasattr(data, 'get') else None
+
+
+class LoginThrottle(BaseThrottle):
+    """Throttle login attempts by client IP and by CPF."""
+
+    def allow_request(self, request, view):
+        if not login_throttle_settings()['ENABLED']:
+            return True
+        ip_bucket, cpf_bucket = get_buckets()
+        cpf = login_cpf(request)
+        self.delay = ip_bucket.wait(self.get_ident(request))
+        if not self.delay and is_valid_cpf(cpf):
+            self.delay = cpf_bucket.wait(cpf, take=False)
+        return not self.delay
+
+    def wait(self):
+        return self.delay
+
+    @staticmethod
+    def failed(request):
+        """Take a token from the CPF bucket of a failed login."""
+        cpf = login_cpf(request)
+        if login_throttle_settings()['ENABLED'] and is_valid_cpf(cpf):
+            get_buckets()[1].wait(cpf)
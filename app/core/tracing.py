@@ -0,0 +1,334 @@
+"""
+Lightweight request tracing.
+
+`TracingMiddleware` starts a trace for sampled requests: either the
+request is picked by `settings.TRACING['SAMPLE_RATE']`, or, with
+`TRUST_PARENT`, the incoming W3C `traceparent` header is flagged as
+sampled. Clients can set the flag, so it is only trusted behind a proxy
+or gateway which sets the header itself. The trace id of the header is
+kept either way. Nested spans are then recorded for:
+
+* view dispatch, authentication and permission checks
+  (`TracedViewMixin`),
+* serializer validation and representation (`TracedSerializerMixin`),
+* each SQL statement (`connection.execute_wrapper`),
+* storage writes (`core.storage.TracedFileSystemStorage`),
+* any block wrapped in `span()`.
+
+Finished traces are exported in the OTLP/JSON format, either appended to
+a local file (one trace per line) or posted from a background thread to
+an OTLP/HTTP collector. When a request is not sampled `span()` returns a
+shared no-op context manager, so instrumentation costs a context variable
+lookup.
+"""
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+from contextlib import ExitStack, nullcontext
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_RE = re.compile(
+    r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+TRACE_ID_HEADER = 'X-Trace-Id'
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+_NOOP = nullcontext()
+
+
+def tracing_settings() -> dict:
+    """Return the tracing settings with their defaults."""
+    return {
+        'SAMPLE_RATE': 0.0,
+        'TRUST_PARENT': False,
+        'EXPORTER': None,
+        'FILE': None,
+        'OTLP_ENDPOINT': 'http://localhost:4318/v1/traces',
+        'SERVICE_NAME': 'pre-natal-digital-api',
+        **getattr(settings, 'TRACING', {}),
+    }
+
+
+class Trace:
+    """Spans recorded for one request."""
+
+    def __init__(self, trace_id=None):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.spans = []
+
+
+class Span:
+    """A timed operation within a trace."""
+
+    def __init__(self, trace, name, parent=None, kind=SPAN_KIND_INTERNAL,
+                 parent_id=None, attributes=None):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.start = time.time_ns()
+        self.end = None
+        self.error = False
+        self._token = None
+
+    def set_attribute(self, key, value):
+        """Set an attribute of the span."""
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.time_ns()
+        if exc_type is not None:
+            self.error = True
+            self.attributes['exception.type'] = exc_type.__name__
+        _current_span.reset(self._token)
+        self.trace.spans.append(self)
+
+    def to_otlp(self) -> dict:
+        """Return the span in the OTLP/JSON format."""
+        data = {
+            'traceId': self.trace.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start),
+            'endTimeUnixNano': str(self.end),
+            'attributes': [
+                {'key': key, 'value': _otlp_value(value)}
+                for key, value in self.attributes.items()
+            ],
+        }
+        if self.parent_id:
+            data['parentSpanId'] = self.parent_id
+        if self.error:
+            data['status'] = {'code': 2}
+        return data
+
+
+def _otlp_value(value) -> dict:
+    """Return an attribute value in the OTLP/JSON format."""
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def current_span():
+    """Return the active span, or None when the request is not traced."""
+    return _current_span.get()
+
+
+def span(name: str, kind=SPAN_KIND_INTERNAL, **attributes):
+    """Return a context manager recording a child of the active span."""
+    parent = _current_span.get()
+    if parent is None:
+        return _NOOP
+    return Span(parent.trace, name, parent, kind, attributes=attributes)
+
+
+def to_otlp(trace: Trace, service_name: str) -> dict:
+    """Return a finished trace as an OTLP/JSON export request."""
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [{
+                'key': 'service.name',
+                'value': {'stringValue': service_name},
+            }]},
+            'scopeSpans': [{
+                'scope': {'name': __name__},
+                'spans': [s.to_otlp() for s in trace.spans],
+            }],
+        }],
+    }
+
+
+class FileExporter:
+    """Append traces to a file, one OTLP/JSON document per line."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+
+    def export(self, payload: dict):
+        line = json.dumps(payload, separators=(',', ':')) + '\n'
+        with self._lock:
+            with open(self.path, 'a') as trace_file:
+                trace_file.write(line)
+
+
+class OTLPExporter:
+    """Post traces to an OTLP/HTTP collector from a background thread."""
+
+    def __init__(self, endpoint, max_queue=1000, timeout=2):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(
+            target=self._run, name='otlp-exporter', daemon=True)
+        self._thread.start()
+
+    def export(self, payload: dict):
+        try:
+            self.queue.put_nowait(payload)
+        except queue.Full:
+            logger.warning('Trace export queue full, dropping a trace.')
+
+    def _run(self):
+        while True:
+            payload = self.queue.get()
+            request = urllib.request.Request(
+                self.endpoint,
+                data=json.dumps(payload).encode(),
+                headers={'Content-Type': 'application/json'},
+                method='POST',
+            )
+            try:
+                urllib.request.urlopen(request, timeout=self.timeout).close()
+            except OSError as exc:
+                logger.warning('Trace export to %s failed: %s',
+                               self.endpoint, exc)
+            finally:
+                self.queue.task_done()
+
+
+_exporters = {}
+_exporters_lock = threading.Lock()
+
+
+def get_exporter(options: dict):
+    """Return the configured exporter, or None."""
+    kind = options['EXPORTER']
+    if kind == 'file':
+        key = (kind, str(options['FILE']))
+    elif kind == 'otlp':
+        key = (kind, options['OTLP_ENDPOINT'])
+    else:
+        return None
+    exporter = _exporters.get(key)
+    if exporter is None:
+        with _exporters_lock:
+            exporter = _exporters.get(key)
+            if exporter is None:
+                exporter = _exporters[key] = (
+                    FileExporter(key[1]) if kind == 'file'
+                    else OTLPExporter(key[1]))
+    return exporter
+
+
+class SQLSpans:
+    """`execute_wrapper` recording a span per SQL statement."""
+
+    def __call__(self, execute, sql, params, many, context):
+        connection = context['connection']
+        with span('db.query', SPAN_KIND_CLIENT,
+                  **{'db.system': connection.vendor,
+                     'db.name': connection.alias,
+                     'db.statement': sql}):
+            return execute(sql, params, many, context)
+
+
+class TracingMiddleware:
+    """Trace sampled requests and export them."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        options = tracing_settings()
+        trace_id = parent_id = None
+        sampled = False
+        match = TRACEPARENT_RE.match(request.META.get('HTTP_TRACEPARENT', ''))
+        if match:
+            trace_id, parent_id, flags = match.groups()
+            sampled = options['TRUST_PARENT'] and bool(int(flags, 16) & 1)
+        if not sampled:
+            rate = options['SAMPLE_RATE']
+            sampled = rate > 0 and random.random() < rate
+        if not sampled:
+            return self.get_response(request)
+
+        trace = Trace(trace_id)
+        root = Span(
+            trace, f'{request.method} {request.path}', kind=SPAN_KIND_SERVER,
+            parent_id=parent_id, attributes={
+                'http.method': request.method,
+                'http.target': request.path,
+            })
+        with root, ExitStack() as stack:
+            sql_spans = SQLSpans()
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(sql_spans))
+            response = self.get_response(request)
+            resolver_match = getattr(request, 'resolver_match', None)
+            if resolver_match:
+                root.name = f'{request.method} {resolver_match.view_name}'
+                root.set_attribute('http.route', resolver_match.route)
+            root.set_attribute('http.status_code', response.status_code)
+
+        response[TRACE_ID_HEADER] = trace.trace_id
+        exporter = get_exporter(options)
+        if exporter is not None:
+            try:
+                exporter.export(to_otlp(trace, options['SERVICE_NAME']))
+            except OSError as exc:
+                logger.warning('Trace export failed: %s', exc)
+        return response
+
+
+class TracedViewMixin:
+    """Record spans for DRF dispatch, authentication and permissions."""
+
+    def dispatch(self, request, *args, **kwargs):
+        with span('view.dispatch', view=type(self).__name__) as view_span:
+            response = super().dispatch(request, *args, **kwargs)
+            if view_span is not None:
+                view_span.set_attribute(
+                    'action', getattr(self, 'action', None) or request.method)
+            return response
+
+    def perform_authentication(self, request):
+        with span('view.authenticate'):
+            return super().perform_authentication(request)
+
+    def check_permissions(self, request):
+        with span('view.check_permissions'):
+            return super().check_permissions(request)
+
+    def check_object_permissions(self, request, obj):
+        with span('view.check_object_permissions'):
+            return super().check_object_permissions(request, obj)
+
+
+class TracedSerializerMixin:
+    """Record spans for serializer validation and representation."""
+
+    def is_valid(self, *args, **kwargs):
+        with span('serializer.is_valid', serializer=type(self).__name__):
+            return super().is_valid(*args, **kwargs)
+
+    @property
+    def data(self):
+        with span('serializer.data', serializer=type(self).__name__):
+            return super().data
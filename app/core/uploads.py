@@ -0,0 +1,208 @@
+"""
+Direct-to-storage image uploads.
+
+Instead of streaming image bytes through the multipart parser of an API
+worker, clients:
+
+1. ask `api/v1/uploads/` for an upload ticket, declaring the target
+   (`user` or `user-profile`), the content type and the size,
+2. PUT the bytes to the signed `upload_url` of the ticket, which points
+   at the storage layer,
+3. POST the ticket to `api/v1/uploads/finalize/`, which validates the
+   stored file and attaches it to `User.image` or `UserProfile.image`.
+
+Tickets are signed with `django.core.signing` and expire after
+`settings.UPLOADS['TICKET_TTL']` seconds. Files are written under
+`uploads/pending/` and moved next to the other images on finalize.
+
+The upload URL comes from `settings.UPLOADS['BACKEND']`. An object
+storage backend presigns a PUT to the bucket; `LocalUploadBackend` stands
+in for it with `receive_upload`, a view streaming the body to the default
+storage, which can run on dedicated workers or behind a proxy buffering
+request bodies.
+"""
+import os
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils.module_loading import import_string
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from core.images import ImageError, validate_image
+
+SALT = 'core.uploads'
+PENDING_DIR = 'uploads/pending'
+CHUNK_SIZE = 64 * 1024
+
+# Leading bytes of the accepted image formats.
+SIGNATURES = {
+    'image/jpeg': (b'\xff\xd8\xff',),
+    'image/png': (b'\x89PNG\r\n\x1a\n',),
+    'image/webp': (b'RIFF',),
+}
+
+
+class UploadError(Exception):
+    """The upload or its ticket is not acceptable."""
+
+
+def uploads_settings() -> dict:
+    """Return the upload settings with their defaults."""
+    return {
+        'BACKEND': 'core.uploads.LocalUploadBackend',
+        'TICKET_TTL': 600,
+        'FINALIZE_TTL': 3600,
+        'MAX_SIZE': 5 * 1024 * 1024,
+        'CONTENT_TYPES': {
+            'image/jpeg': 'jpg',
+            'image/png': 'png',
+            'image/webp': 'webp',
+        },
+        **getattr(settings, 'UPLOADS', {}),
+    }
+
+
+class LocalUploadBackend:
+    """Receive uploads with `receive_upload` into the default storage."""
+
+    storage = default_storage
+
+    def upload_url(self, request, token: str) -> str:
+        """Return the URL the client PUTs the file to."""
+        return request.build_absolute_uri(
+            reverse('core:upload-receive', args=[token]))
+
+
+def get_backend():
+    """Return an instance of the configured upload backend."""
+    return import_string(uploads_settings()['BACKEND'])()
+
+
+def create_ticket(user, target: str, object_id: int, content_type: str,
+                  size: int) -> dict:
+    """Return the ticket of a new upload."""
+    extension = uploads_settings()['CONTENT_TYPES'][content_type]
+    return {
+        'key': f'{PENDING_DIR}/{uuid.uuid4()}.{extension}',
+        'user': user.pk,
+        'target': target,
+        'object': object_id,
+        'content_type': content_type,
+        'size': size,
+    }
+
+
+def sign_ticket(ticket: dict) -> str:
+    """Return `ticket` as a signed token."""
+    return signing.dumps(ticket, salt=SALT, compress=True)
+
+
+def load_ticket(token: str, max_age: int) -> dict:
+    """Return the ticket of a signed token, raising UploadError."""
+    try:
+        return signing.loads(token, salt=SALT, max_age=max_age)
+    except signing.SignatureExpired:
+        raise UploadError('The upload ticket expired.')
+    except signing.BadSignature:
+        raise UploadError('Invalid upload ticket.')
+
+
+class LimitedReader:
+    """File-like wrapper failing when more than `limit` bytes are read."""
+
+    def __init__(self, stream, limit: int):
+        self.stream = stream
+        self.limit = limit
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(CHUNK_SIZE if size is None or size < 0
+                                else size)
+        self.size += len(data)
+        if self.size > self.limit:
+            raise UploadError('The file is larger than declared.')
+        return data
+
+
+def store_upload(ticket: dict, stream, content_type: str,
+                 content_length: int, storage=None) -> int:
+    """Stream an upload to the pending key of `ticket`, return its size."""
+    storage = storage or get_backend().storage
+    if content_type != ticket['content_type']:
+        raise UploadError('The content type does not match the ticket.')
+    if content_length > ticket['size']:
+        raise UploadError('The file is larger than declared.')
+    if storage.exists(ticket['key']):
+        raise UploadError('The file was already uploaded.')
+
+    reader = LimitedReader(stream, ticket['size'])
+    try:
+        name = storage.save(ticket['key'], File(reader, name=ticket['key']))
+    except UploadError:
+        storage.delete(ticket['key'])
+        raise
+    if name != ticket['key']:
+        storage.delete(name)
+        raise UploadError('The file was already uploaded.')
+    return reader.size
+
+
+@csrf_exempt
+@require_http_methods(['PUT'])
+def receive_upload(request, token):
+    """Store the body PUT to a signed upload URL of LocalUploadBackend."""
+    try:
+        ticket = load_ticket(token, uploads_settings()['TICKET_TTL'])
+        size = store_upload(
+            ticket, request, request.content_type,
+            int(request.META.get('CONTENT_LENGTH') or 0))
+    except (UploadError, ValueError) as exc:
+        return JsonResponse({'detail': str(exc)}, status=400)
+    return JsonResponse({'key': ticket['key'], 'size': size}, status=201)
+
+
+def check_image(head: bytes, content_type: str):
+    """Raise UploadError unless `head` starts like `content_type`."""
+    if not head.startswith(SIGNATURES[content_type]) or (
+            content_type == 'image/webp' and head[8:12] != b'WEBP'):
+        raise UploadError(f'The file is not a valid {content_type} image.')
+
+
+def finalize_upload(ticket: dict, instance, field: str = 'image',
+                    storage=None):
+    """
+    Validate the pending file of `ticket` and attach it to `instance`.
+
+    The pending file is deleted whether it is accepted or not.
+    """
+    storage = storage or get_backend().storage
+    key = ticket['key']
+    if not storage.exists(key):
+        raise UploadError('The file was not uploaded.')
+
+    file_field = getattr(instance, field)
+    try:
+        if storage.size(key) > ticket['size']:
+            raise UploadError('The file is larger than declared.')
+        with storage.open(key, 'rb') as pending:
+            check_image(pending.read(16), ticket['content_type'])
+            try:
+                validate_image(pending)
+            except ImageError as exc:
+                raise UploadError(str(exc))
+            pending.seek(0)
+            name = file_field.storage.save(
+                file_field.field.generate_filename(
+                    instance, os.path.basename(key)),
+                pending)
+    finally:
+        storage.delete(key)
+    file_field.name = name
+    instance.save(update_fields=[field])
+    return instance
@@ -3,11 +3,11 @@ URLs for core app
 """
 from django.urls import path, include
 from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
+    TokenBlacklistView,
     TokenRefreshView,
     TokenVerifyView
 )
-from core import views
+from core import uploads, views
 
 from rest_framework import routers
 
@@ -31,10 +31,14 @@ router.register(
 
 urlpatterns = [
     path('', include(router.urls)),
-    path('token/', TokenObtainPairView.as_view(), name='token'),
+    path('token/', views.TokenObtainPairView.as_view(), name='token'),
     path('token/refresh/', TokenRefreshView.as_view(), name='refresh-token'),
     path('token/verify/', TokenVerifyView.as_view(), name='verify-token'),
+    path('token/revoke/', TokenBlacklistView.as_view(), name='revoke-token'),
     path('detail/me/', views.MeView.as_view(), name='me'),
+    path('cep/', views.CepView.as_view(), name='cep-search'),
+    path('cep/<str:code>/', views.CepView.as_view(), name='cep-detail'),
+    path('batch/', views.BatchView.as_view(), name='batch'),
     path('user-profiles/', views.UserProfileUpdateView.as_view(),
          name='user-profile-update'),
     path('user-profiles/me', views.UserProfileView.as_view(),
@@ -42,4 +46,17 @@ urlpatterns = [
     path('user-profiles/image-upload',
          views.UserProfileImageUploadView.as_view(),
          name='image-upload'),
+    path('uploads/', views.UploadTicketView.as_view(),
+         name='upload-ticket'),
+    path('uploads/finalize/', views.UploadFinalizeView.as_view(),
+         name='upload-finalize'),
+    path('uploads/receive/<str:token>', uploads.receive_upload,
+         name='upload-receive'),
+    path('admin/profiles/', views.ProfileListView.as_view(),
+         name='profile-list'),
+    path('admin/profiles/<str:profile_id>/',
+         views.ProfileDetailView.as_view(), name='profile-detail'),
+    path('admin/profiles/<str:profile_id>/folded',
+         views.ProfileDetailView.as_view(), {'folded': True},
+         name='profile-folded'),
 ]
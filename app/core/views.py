@@ -1,7 +1,12 @@
 """
 Views for the core app.
 """
+import json
+
 from django.contrib.auth import get_user_model
+from django.http import FileResponse, Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control
 from rest_framework import (
     viewsets,
     status,
@@ -10,24 +15,39 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import (
+    IsAdminUser,
     IsAuthenticated
 )
 from rest_framework.exceptions import (
+    AuthenticationFailed,
     PermissionDenied,
     ValidationError
 )
+from rest_framework_simplejwt import views as jwt_views
 from core.serializers import UserSerializer
 
-from core import serializers
+from core import batch, cep, profiling, serializers, uploads
+from core.fast_serializers import ValuesSerializer
+from core.mixins import (
+    BulkUpdateModelMixin,
+    ExtraActionsMixin,
+    ValuesListModelMixin,
+)
 from core.models import UserProfile
+from core.revocation import revoke_users, was_disabled
+from core.throttling import LoginThrottle
+from core.tracing import TracedViewMixin, span
 from django.utils import timezone
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(
+        TracedViewMixin, ExtraActionsMixin, ValuesListModelMixin,
+        BulkUpdateModelMixin, viewsets.ModelViewSet):
     """
     Manage users in the database.
     """
     serializer_class = serializers.UserSerializer
+    values_serializer = ValuesSerializer(serializers.UserSerializer)
     permission_classes = (IsAuthenticated,)
     queryset = get_user_model().objects.all()
 
@@ -44,14 +64,15 @@ class UserViewSet(viewsets.ModelViewSet):
         """
         Retrieve the user for the authenticated request.
         """
-        if self.request.user.is_staff:
-            return super().get_object()
-        else:
-            if self.request.user.id != int(self.kwargs['pk']):
-                raise PermissionDenied(
-                    "You don't have permission to access this user.")
+        with span('permissions.get_object'):
+            if self.request.user.is_staff:
+                return super().get_object()
+            else:
+                if self.request.user.id != int(self.kwargs['pk']):
+                    raise PermissionDenied(
+                        "You don't have permission to access this user.")
 
-        return self.request.user
+            return self.request.user
 
     def perform_create(self, serializer):
         """
@@ -97,6 +118,35 @@ class UserViewSet(viewsets.ModelViewSet):
 
         raise PermissionDenied("Users only can change their own data.")
 
+    def get_bulk_queryset(self):
+        """
+        Return the users the authenticated user may change in bulk.
+        """
+        queryset = super().get_bulk_queryset()
+        if self.request.user.is_staff:
+            return queryset
+        return queryset.filter(pk=self.request.user.pk)
+
+    def bulk_apply(self, instance, validated_data):
+        """
+        Set the changes of a user, hashing a new password.
+        """
+        password = validated_data.pop('password', None)
+        fields = super().bulk_apply(instance, validated_data)
+        if password is not None:
+            instance.set_password(password)
+            fields.add('password')
+        return fields
+
+    def bulk_updated(self, instances):
+        """
+        Revoke the tokens of the disabled users, bulk_update sends no
+        post_save signal.
+        """
+        revoke_users([user for user in instances if was_disabled(user)])
+        for user in instances:
+            user._was_active = user.is_active
+
     def perform_destroy(self, instance):
         """
         Delete a user.
@@ -107,7 +157,8 @@ class UserViewSet(viewsets.ModelViewSet):
             raise PermissionDenied("Only superuser can delete users.")
 
 
-class AdminUserViewSet(viewsets.ModelViewSet):
+class AdminUserViewSet(
+        TracedViewMixin, ExtraActionsMixin, viewsets.ModelViewSet):
     """
     Manage users in the database.
     """
@@ -152,7 +203,57 @@ class AdminUserViewSet(viewsets.ModelViewSet):
             raise PermissionDenied("Only admin can delete admins.")
 
 
-class MeView(APIView):
+class TokenObtainPairView(jwt_views.TokenObtainPairView):
+    """
+    Obtain a token pair, throttling login attempts before hashing, see
+    core.throttling.
+    """
+    throttle_classes = (LoginThrottle,)
+
+    def post(self, request, *args, **kwargs):
+        try:
+            return super().post(request, *args, **kwargs)
+        except AuthenticationFailed:
+            LoginThrottle.failed(request)
+            raise
+
+
+class CepView(TracedViewMixin, APIView):
+    """
+    Look up addresses by CEP in the local index, see core.cep.
+    """
+    permission_classes = (IsAuthenticated,)
+    # Lookups of an index rebuilt at most once per deploy.
+    max_age = 24 * 60 * 60
+
+    def get(self, request, code=None):
+        """
+        Return the address of CEP `code`, or the addresses of the first
+        CEPs starting with the `q` query parameter.
+        """
+        index = cep.get_index()
+        if index is None:
+            return Response({'detail': 'CEP lookup is not available.'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        options = cep.cep_settings()
+        if code is not None:
+            address = index.get(cep.normalize_cep(code) or '')
+            if address is None:
+                raise Http404
+            response = Response(address)
+        else:
+            prefix = cep.cep_digits(request.query_params.get('q', ''))
+            if prefix is None or len(prefix) < options['MIN_PREFIX']:
+                raise ValidationError({'q': [
+                    f'Type at least {options["MIN_PREFIX"]} digits of '
+                    'a CEP.']})
+            response = Response(
+                index.search(prefix, options['AUTOCOMPLETE_LIMIT']))
+        patch_cache_control(response, private=True, max_age=self.max_age)
+        return response
+
+
+class MeView(TracedViewMixin, APIView):
     """
     Manage the authenticated user.
     """
@@ -167,12 +268,15 @@ class MeView(APIView):
         return Response(serializer.data)
 
 
-class UserProfileModelView(viewsets.ModelViewSet):
+class UserProfileModelView(
+        TracedViewMixin, ExtraActionsMixin, ValuesListModelMixin,
+        BulkUpdateModelMixin, viewsets.ModelViewSet):
     """
     Viewsets for user profile model
     """
     permission_classes = (IsAuthenticated,)
     serializer_class = serializers.UserProfileSerializer
+    values_serializer = ValuesSerializer(serializers.UserProfileSerializer)
     queryset = UserProfile.objects.all()
 
     def get_serializer_class(self):
@@ -200,15 +304,33 @@ class UserProfileModelView(viewsets.ModelViewSet):
                 "You already have a profile created.")
         return serializer.save(user=self.request.user)
 
+    def may_change_all(self) -> bool:
+        """
+        Return whether the authenticated user may change every profile,
+        as supervisors do; other users only change their own.
+        """
+        return self.request.user.is_staff
+
     def perform_update(self, serializer):
         """
         Update a user profile.
         """
-        if self.request.user.id == serializer.instance.user.id:
+        if self.may_change_all() or \
+                self.request.user.id == serializer.instance.user_id:
             return serializer.save()
         else:
             raise PermissionDenied("Users only can change their own data.")
 
+    def get_bulk_queryset(self):
+        """
+        Return the profiles the authenticated user may change in bulk,
+        the set `perform_update` allows one by one.
+        """
+        queryset = super().get_bulk_queryset().select_related('user')
+        if self.may_change_all():
+            return queryset
+        return queryset.filter(user=self.request.user)
+
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
         """
@@ -247,7 +369,7 @@ class UserProfileModelView(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class UserProfileImageUploadView(APIView):
+class UserProfileImageUploadView(TracedViewMixin, APIView):
     """View for uploading images to user profile"""
     permission_classes = (IsAuthenticated,)
     serializer_class = serializers.UserProfileImageSerializer
@@ -277,7 +399,7 @@ class UserProfileImageUploadView(APIView):
         )
 
 
-class UserProfileUpdateView(APIView):
+class UserProfileUpdateView(TracedViewMixin, APIView):
     """View for updating user profile"""
     permission_classes = (IsAuthenticated,)
     serializer_class = serializers.UserProfileSerializer
@@ -307,7 +429,7 @@ class UserProfileUpdateView(APIView):
         )
 
 
-class UserProfileView(APIView):
+class UserProfileView(TracedViewMixin, APIView):
     """
     Retrieve a user profile.
     without pk, by token
@@ -328,3 +450,170 @@ class UserProfileView(APIView):
             )
         serializer = self.serializer_class(profile)
         return Response(serializer.data)
+
+
+class ProfileListView(TracedViewMixin, APIView):
+    """
+    List the stored request profiles, newest first.
+    """
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        """
+        Return the summary of every stored profile, without SQL details.
+        """
+        summaries = []
+        for profile_id in profiling.list_profiles():
+            try:
+                with open(profiling.profile_path(profile_id, 'json')) as f:
+                    summary = json.load(f)
+            except FileNotFoundError:
+                continue
+            summary.pop('sql', None)
+            summary.pop('allocations', None)
+            summaries.append(summary)
+        return Response(summaries)
+
+
+class ProfileDetailView(TracedViewMixin, APIView):
+    """
+    Download a stored request profile.
+    """
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, profile_id, folded=False):
+        """
+        Return the profile summary, or its folded stacks.
+        """
+        try:
+            path = profiling.profile_path(
+                profile_id, 'folded' if folded else 'json')
+            profile_file = open(path, 'rb')
+        except (ValueError, FileNotFoundError):
+            raise Http404('Profile not found.')
+
+        if folded:
+            return FileResponse(
+                profile_file,
+                as_attachment=True,
+                filename=f'{profile_id}.folded',
+                content_type='text/plain; charset=utf-8',
+            )
+        with profile_file:
+            return Response(json.load(profile_file))
+
+
+UPLOAD_SERIALIZERS = {
+    'user': serializers.UserImageSerializer,
+    'user-profile': serializers.UserProfileImageSerializer,
+}
+
+
+def get_upload_target(request, target, object_id=None):
+    """
+    Return the user or user profile an image is uploaded to.
+    """
+    user = request.user
+    if target == 'user':
+        instance = get_object_or_404(
+            get_user_model(), pk=object_id or user.id)
+        owner_id = instance.id
+    elif object_id is None:
+        instance = UserProfile.objects.filter(user=user).first()
+        if instance is None:
+            raise ValidationError("You don't have a profile created.")
+        owner_id = user.id
+    else:
+        instance = get_object_or_404(UserProfile, pk=object_id)
+        owner_id = instance.user_id
+
+    if owner_id != user.id and not user.is_staff:
+        raise PermissionDenied("Users only can change their own data.")
+    return instance
+
+
+class UploadTicketView(TracedViewMixin, APIView):
+    """
+    Issue tickets to upload images straight to storage.
+    """
+    permission_classes = (IsAuthenticated,)
+    serializer_class = serializers.UploadTicketSerializer
+
+    def post(self, request):
+        """
+        Return a signed upload URL for an image of a user or profile.
+        """
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        instance = get_upload_target(request, data['target'], data.get('id'))
+
+        ticket = uploads.create_ticket(
+            request.user, data['target'], instance.pk,
+            data['content_type'], data['size'])
+        token = uploads.sign_ticket(ticket)
+        return Response(
+            {
+                'ticket': token,
+                'upload_url': uploads.get_backend().upload_url(
+                    request, token),
+                'method': 'PUT',
+                'headers': {'Content-Type': data['content_type']},
+                'expires_in': uploads.uploads_settings()['TICKET_TTL'],
+            },
+            status=status.HTTP_201_CREATED
+        )
+
+
+class UploadFinalizeView(TracedViewMixin, APIView):
+    """
+    Attach an image uploaded with a ticket to its user or profile.
+    """
+    permission_classes = (IsAuthenticated,)
+    serializer_class = serializers.UploadFinalizeSerializer
+
+    def post(self, request):
+        """
+        Validate the uploaded image and attach it.
+        """
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            ticket = uploads.load_ticket(
+                serializer.validated_data['ticket'],
+                uploads.uploads_settings()['FINALIZE_TTL'])
+        except uploads.UploadError as exc:
+            raise ValidationError({'ticket': [str(exc)]})
+        if ticket['user'] != request.user.pk:
+            raise PermissionDenied("The ticket belongs to another user.")
+
+        instance = get_upload_target(
+            request, ticket['target'], ticket['object'])
+        try:
+            uploads.finalize_upload(ticket, instance)
+        except uploads.UploadError as exc:
+            raise ValidationError({'ticket': [str(exc)]})
+
+        serializer_class = UPLOAD_SERIALIZERS[ticket['target']]
+        return Response(
+            serializer_class(instance, context={'request': request}).data,
+            status=status.HTTP_200_OK
+        )
+
+
+class BatchView(TracedViewMixin, APIView):
+    """
+    Run several API requests in one, see core.batch.
+    """
+    permission_classes = (IsAuthenticated,)
+    serializer_class = serializers.BatchSerializer
+    batchable = False
+
+    def post(self, request):
+        """Run the sub-requests and return all their responses."""
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = batch.execute(
+            request, serializer.validated_data['requests'])
+        return HttpResponse(
+            batch.render_results(results), content_type='application/json')
@@ -0,0 +1,78 @@
+"""
+Warm up a process before it accepts traffic.
+
+A fresh process pays on its first requests for lazy imports, URL pattern
+compilation, model `_meta` caches, serializer field construction, the
+schema load. `warmup()` does that work up front; run in the server
+master before forking, the result is shared copy-on-write by every
+worker. Database connections are not warmed up: Django keeps them per
+thread and gthread workers serve requests from pool threads, so each
+thread opens its own on its first request and keeps it (CONN_MAX_AGE).
+"""
+import logging
+import time
+
+from django.apps import apps
+from django.contrib.auth.hashers import get_hashers
+from django.urls import get_resolver
+from django.utils.module_loading import autodiscover_modules
+
+logger = logging.getLogger(__name__)
+
+WARMUP_MODULES = ('serializers', 'views', 'urls', 'admin')
+
+
+def iter_patterns(patterns):
+    """Yield the URL patterns of a resolver tree, compiling them."""
+    for pattern in patterns:
+        pattern.pattern.regex
+        if hasattr(pattern, 'url_patterns'):
+            yield from iter_patterns(pattern.url_patterns)
+        else:
+            yield pattern
+
+
+def warm_serializers(patterns) -> int:
+    """Build the fields of the serializers of DRF views, return a count."""
+    serializer_classes = set()
+    for pattern in patterns:
+        callback = pattern.callback
+        view_class = getattr(callback, 'cls', None)
+        if view_class is None:
+            continue
+        initkwargs = getattr(callback, 'initkwargs', {})
+        for serializer_class in (
+                initkwargs.get('serializer_class'),
+                getattr(view_class, 'serializer_class', None)):
+            if serializer_class is not None:
+                serializer_classes.add(serializer_class)
+        values_serializer = getattr(view_class, 'values_serializer', None)
+        if values_serializer is not None:
+            values_serializer.lookups
+    for serializer_class in serializer_classes:
+        serializer_class().fields
+    return len(serializer_classes)
+
+
+def warmup() -> dict:
+    """Fill the import, URL, model and serializer caches of the process."""
+    from core.schema import get_cached_schema
+
+    start = time.perf_counter()
+    autodiscover_modules(*WARMUP_MODULES)
+    for model in apps.get_models():
+        model._meta.get_fields()
+    resolver = get_resolver()
+    patterns = list(iter_patterns(resolver.url_patterns))
+    resolver.reverse_dict
+    serializers = warm_serializers(patterns)
+    get_hashers()
+    get_cached_schema()
+    summary = {
+        'patterns': len(patterns),
+        'serializers': serializers,
+        'duration_ms': (time.perf_counter() - start) * 1000,
+    }
+    logger.info('Warmup done in %(duration_ms).0fms: %(patterns)d URL '
+                'patterns, %(serializers)d serializers.', summary)
+    return summary
@@ -0,0 +1,90 @@
+"""
+Django command to run the job queue workers.
+"""
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs.queue import jobs_settings, work
+
+
+def worker_process(queues, stop, burst, poll_interval):
+    """Run jobs in a forked process until `stop` is set."""
+    # Ctrl-C reaches the whole process group: let the parent decide, so
+    # the job being run is finished.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    try:
+        work(queues, stop=stop, burst=burst, poll_interval=poll_interval)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    """Run jobs of the database queue in several worker processes."""
+    help = 'Run queued jobs, see jobs.queue.'
+
+    def add_arguments(self, parser):
+        options = jobs_settings()
+        parser.add_argument(
+            '--processes', type=int, default=options['PROCESSES'],
+            help='Worker processes to run.',
+        )
+        parser.add_argument(
+            '--queue', action='append', dest='queues',
+            help='Queue to take jobs from, may be repeated. Defaults to '
+                 'JOBS["QUEUES"].',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=options['POLL_INTERVAL'],
+            help='Seconds to wait when the queues are empty.',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit once the queues are empty.',
+        )
+
+    def handle(self, *args, **options):
+        queues = options['queues'] or jobs_settings()['QUEUES']
+        if options['processes'] <= 1:
+            count = work(queues, burst=options['burst'],
+                         poll_interval=options['poll_interval'])
+            self.stdout.write(self.style.SUCCESS(f'Ran {count} jobs.'))
+            return
+
+        # Forked workers must not share the connections of the parent.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        stop = context.Event()
+
+        def start():
+            process = context.Process(
+                target=worker_process,
+                args=(queues, stop, options['burst'],
+                      options['poll_interval']),
+                daemon=True)
+            process.start()
+            return process
+
+        def shutdown(signum, frame):
+            self.stdout.write('Stopping, waiting for the running jobs.')
+            stop.set()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        processes = [start() for _ in range(options['processes'])]
+        self.stdout.write(
+            f'Started {len(processes)} workers on {", ".join(queues)}.')
+        while any(process.is_alive() for process in processes):
+            for index, process in enumerate(processes):
+                process.join(timeout=1)
+                if (process.exitcode not in (None, 0)
+                        and not stop.is_set() and not options['burst']):
+                    self.stderr.write(
+                        f'Worker {process.pid} exited with '
+                        f'{process.exitcode}, restarting it.')
+                    processes[index] = start()
+        self.stdout.write(self.style.SUCCESS('Workers stopped.'))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['name', 'created_at'], name='jobs_job_name_idx'),
+        ),
+    ]
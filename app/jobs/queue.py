@@ -0,0 +1,285 @@
+"""
+Database-backed job queue.
+
+Heavy work (thumbnails, imports, exports, notifications) is written as a
+task function and enqueued from a request; `manage.py run_jobs` runs it
+in separate worker processes. The queue lives in the `jobs_job` table,
+so it needs no broker beyond the database the clinic already has.
+
+    from jobs.queue import enqueue, task
+
+    @task(queue='exports', priority=5, max_attempts=3)
+    def export_profiles(user_id):
+        ...
+
+    job = enqueue(export_profiles, {'user_id': request.user.id},
+                  user=request.user)
+
+Tasks are looked up by their dotted path, so only functions decorated
+with `@task` can be run. Task arguments and results must be JSON
+serializable.
+
+Workers claim the queued job with the highest priority, then the oldest
+`run_at`. On PostgreSQL the candidate row is selected `FOR UPDATE SKIP
+LOCKED`, so workers never wait for each other. SQLite has no row locks:
+the write transaction of the claim holds the database lock, and the
+claim is a conditional UPDATE retried when another worker won the row.
+
+A failing job is retried after an exponential backoff with jitter until
+`max_attempts`, then marked failed. Jobs left running by a dead worker
+are queued again after `settings.JOBS['LOCK_TIMEOUT']` seconds, or
+marked failed on their last attempt; a worker finishing a job requeued
+meanwhile does not record its outcome.
+
+Idle workers also queue the tasks of `settings.JOBS['PERIODIC']`, a dict
+of task dotted path to interval in seconds, when no job of the task is
+pending and none was created within the interval. Two workers may both
+queue one, so periodic tasks must be safe to run twice.
+"""
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+CLAIM_RETRIES = 5
+# Seconds between two checks of the periodic tasks by a worker.
+SCHEDULE_INTERVAL = 60
+
+
+class TaskError(Exception):
+    """The job does not name a task."""
+
+
+def jobs_settings() -> dict:
+    """Return the job queue settings with their defaults."""
+    return {
+        'QUEUES': ['default'],
+        'PROCESSES': 2,
+        'POLL_INTERVAL': 1.0,
+        'MAX_ATTEMPTS': 5,
+        'BACKOFF_BASE': 5,
+        'BACKOFF_MAX': 60 * 60,
+        'LOCK_TIMEOUT': 10 * 60,
+        'PERIODIC': {},
+        **getattr(settings, 'JOBS', {}),
+    }
+
+
+def task(func=None, *, queue='default', priority=0, max_attempts=None):
+    """
+    Mark `func` as a task and set the defaults of its jobs.
+
+    The decorated function gets an `enqueue(kwargs=None, **options)`
+    shortcut.
+    """
+    def decorator(func):
+        func.job_options = {
+            'queue': queue,
+            'priority': priority,
+            'max_attempts': max_attempts,
+        }
+        func.enqueue = lambda kwargs=None, **options: enqueue(
+            func, kwargs, **options)
+        return func
+
+    return decorator(func) if func is not None else decorator
+
+
+def task_name(func) -> str:
+    """Return the dotted path of a task function."""
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def get_task(name: str):
+    """Return the task function of dotted path `name`."""
+    try:
+        func = import_string(name)
+    except ImportError as exc:
+        raise TaskError(str(exc))
+    if not hasattr(func, 'job_options'):
+        raise TaskError(f'{name} is not a task.')
+    return func
+
+
+def enqueue(func, kwargs=None, *, queue=None, priority=None, delay=0,
+            max_attempts=None, user=None) -> Job:
+    """
+    Queue a call of task `func` (a function or its dotted path) with
+    `kwargs`, to run after `delay` seconds.
+
+    Inside a transaction the job can only be claimed once it commits.
+    """
+    if isinstance(func, str):
+        func = get_task(func)
+    elif not hasattr(func, 'job_options'):
+        raise TaskError(f'{task_name(func)} is not a task.')
+    options = func.job_options
+    if max_attempts is None:
+        max_attempts = (options['max_attempts']
+                        or jobs_settings()['MAX_ATTEMPTS'])
+    return Job.objects.create(
+        name=task_name(func),
+        kwargs=kwargs or {},
+        queue=queue or options['queue'],
+        priority=options['priority'] if priority is None else priority,
+        max_attempts=max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        created_by=user if user is not None and user.is_authenticated
+        else None,
+    )
+
+
+def worker_name() -> str:
+    """Return the name identifying the current worker process."""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(queues=None, worker=None):
+    """Mark the next due job of `queues` as running and return it."""
+    queues = queues or jobs_settings()['QUEUES']
+    worker = worker or worker_name()
+    using = router.db_for_write(Job)
+    skip_locked = connections[using].features.has_select_for_update_skip_locked
+    for _ in range(CLAIM_RETRIES):
+        now = timezone.now()
+        with transaction.atomic(using=using):
+            candidates = Job.objects.using(using).filter(
+                status=Job.QUEUED, queue__in=queues, run_at__lte=now,
+            ).order_by('-priority', 'run_at', 'pk')
+            if skip_locked:
+                candidates = candidates.select_for_update(skip_locked=True)
+            pk = candidates.values_list('pk', flat=True).first()
+            if pk is None:
+                return None
+            claimed = Job.objects.using(using).filter(
+                pk=pk, status=Job.QUEUED,
+            ).update(
+                status=Job.RUNNING, locked_by=worker, locked_at=now,
+                attempts=F('attempts') + 1,
+            )
+        if claimed:
+            return Job.objects.using(using).get(pk=pk)
+    return None
+
+
+def backoff(attempt: int) -> float:
+    """Return the delay in seconds before retrying a failed attempt."""
+    options = jobs_settings()
+    delay = min(options['BACKOFF_BASE'] * 2 ** (attempt - 1),
+                options['BACKOFF_MAX'])
+    return delay * random.uniform(0.5, 1.0)
+
+
+def run_job(job: Job) -> Job:
+    """Run a claimed job and record its outcome."""
+    try:
+        result = get_task(job.name)(**job.kwargs)
+    except Exception as exc:
+        now = timezone.now()
+        job.error = ''.join(traceback.format_exception(exc))
+        if job.attempts < job.max_attempts and not isinstance(
+                exc, TaskError):
+            job.status = Job.QUEUED
+            job.run_at = now + timedelta(seconds=backoff(job.attempts))
+            logger.warning('Job %s failed, attempt %d of %d: %s', job,
+                           job.attempts, job.max_attempts, exc)
+        else:
+            job.status = Job.FAILED
+            job.finished_at = now
+            logger.error('Job %s failed: %s', job, exc)
+    else:
+        job.status = Job.SUCCEEDED
+        job.result = result
+        job.error = ''
+        job.finished_at = timezone.now()
+    job.locked_by = ''
+    job.locked_at = None
+    # Only record the outcome of the current claim: a job requeued as
+    # stale meanwhile belongs to the worker that claimed it again.
+    updated = Job.objects.filter(
+        pk=job.pk, status=Job.RUNNING, attempts=job.attempts,
+    ).update(**{field: getattr(job, field) for field in (
+        'status', 'result', 'error', 'run_at', 'finished_at', 'locked_by',
+        'locked_at')})
+    if not updated:
+        logger.warning('Job %s was requeued while running, its outcome is '
+                       'dropped.', job)
+    return job
+
+
+def requeue_stale(timeout=None) -> int:
+    """
+    Queue again the jobs running for longer than `timeout` seconds, and
+    mark failed those without attempts left. Return the number of jobs
+    released.
+    """
+    if timeout is None:
+        timeout = jobs_settings()['LOCK_TIMEOUT']
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.RUNNING, locked_at__lt=now - timedelta(seconds=timeout))
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=now, locked_by='', locked_at=None,
+        error=f'Worker lost: the job ran for more than {timeout} seconds.')
+    return failed + stale.update(
+        status=Job.QUEUED, locked_by='', locked_at=None)
+
+
+def schedule_periodic() -> list:
+    """
+    Queue the periodic tasks without a pending job nor a job created
+    within their interval. Return the jobs queued.
+    """
+    now = timezone.now()
+    jobs = []
+    for name, interval in jobs_settings()['PERIODIC'].items():
+        recent = Job.objects.filter(name=name).filter(
+            Q(status__in=[Job.QUEUED, Job.RUNNING])
+            | Q(created_at__gt=now - timedelta(seconds=interval)))
+        if not recent.exists():
+            jobs.append(enqueue(name))
+    return jobs
+
+
+def work(queues=None, stop=None, burst=False, poll_interval=None) -> int:
+    """
+    Claim and run jobs until `stop` (a threading or multiprocessing
+    Event) is set, or until the queues are empty with `burst`.
+
+    Return the number of jobs run.
+    """
+    if poll_interval is None:
+        poll_interval = jobs_settings()['POLL_INTERVAL']
+    worker = worker_name()
+    count = 0
+    next_schedule = 0.0
+    while stop is None or not stop.is_set():
+        job = claim(queues, worker)
+        if job is not None:
+            run_job(job)
+            count += 1
+            continue
+        if burst:
+            break
+        requeue_stale()
+        if time.monotonic() >= next_schedule:
+            schedule_periodic()
+            next_schedule = time.monotonic() + SCHEDULE_INTERVAL
+        if stop is not None:
+            stop.wait(poll_interval)
+        else:
+            time.sleep(poll_interval)
+    return count
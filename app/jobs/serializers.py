@@ -0,0 +1,28 @@
+"""
+Serializers for the jobs app.
+"""
+from rest_framework import serializers
+
+from jobs.models import Job
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Serializer for the status of a job."""
+
+    class Meta:
+        model = Job
+        fields = (
+            'id',
+            'name',
+            'queue',
+            'priority',
+            'status',
+            'attempts',
+            'max_attempts',
+            'run_at',
+            'created_at',
+            'finished_at',
+            'result',
+            'error',
+        )
+        read_only_fields = fields
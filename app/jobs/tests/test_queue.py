@@ -0,0 +1,207 @@
+"""
+Tests for the job queue.
+"""
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from jobs import queue
+from jobs.models import Job
+
+
+@queue.task
+def add(a, b):
+    return a + b
+
+
+@queue.task(queue='exports', priority=5, max_attempts=2)
+def explode():
+    raise ValueError('boom')
+
+
+def not_a_task():
+    pass
+
+
+class EnqueueTests(TestCase):
+    """Tests for `enqueue`."""
+
+    def test_enqueue(self):
+        """Test jobs get the defaults of their task."""
+        job = add.enqueue({'a': 1, 'b': 2})
+
+        self.assertEqual(job.name, 'jobs.tests.test_queue.add')
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(job.queue, 'default')
+        self.assertEqual(job.max_attempts, 5)
+
+        job = queue.enqueue('jobs.tests.test_queue.explode', priority=1)
+        self.assertEqual((job.queue, job.priority, job.max_attempts),
+                         ('exports', 1, 2))
+
+    def test_enqueue_not_a_task(self):
+        """Test only task functions can be enqueued."""
+        with self.assertRaises(queue.TaskError):
+            queue.enqueue(not_a_task)
+        with self.assertRaises(queue.TaskError):
+            queue.enqueue('jobs.tests.test_queue.not_a_task')
+        with self.assertRaises(queue.TaskError):
+            queue.enqueue('jobs.tests.test_queue.missing')
+
+
+class ClaimTests(TestCase):
+    """Tests for `claim`."""
+
+    def test_claim_order(self):
+        """Test jobs are claimed by priority, then by run_at."""
+        first = add.enqueue({'a': 1, 'b': 1})
+        urgent = add.enqueue({'a': 1, 'b': 1}, priority=10)
+        later = add.enqueue({'a': 1, 'b': 1})
+        add.enqueue({'a': 1, 'b': 1}, delay=60)
+        explode.enqueue()
+
+        claimed = [queue.claim(['default'], 'test') for _ in range(4)]
+
+        self.assertEqual(claimed[:3], [urgent, first, later])
+        self.assertIsNone(claimed[3])
+        urgent.refresh_from_db()
+        self.assertEqual(urgent.status, Job.RUNNING)
+        self.assertEqual(urgent.attempts, 1)
+        self.assertEqual(urgent.locked_by, 'test')
+
+    def test_requeue_stale(self):
+        """Test jobs of dead workers are queued again."""
+        add.enqueue({'a': 1, 'b': 1})
+        job = queue.claim()
+        Job.objects.filter(pk=job.pk).update(
+            locked_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(queue.requeue_stale(), 1)
+        self.assertEqual(queue.claim(), job)
+
+    def test_requeue_stale_last_attempt(self):
+        """Test stale jobs without attempts left are marked failed."""
+        explode.enqueue()
+        Job.objects.update(attempts=1)
+        job = queue.claim(['exports'])
+        Job.objects.filter(pk=job.pk).update(
+            locked_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(queue.requeue_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIn('Worker lost', job.error)
+        self.assertIsNotNone(job.finished_at)
+        self.assertIsNone(queue.claim(['exports']))
+
+    def test_stale_run_does_not_overwrite(self):
+        """Test a run requeued as stale does not record its outcome."""
+        add.enqueue({'a': 1, 'b': 2})
+        stale = queue.claim(worker='dead')
+        Job.objects.filter(pk=stale.pk).update(
+            locked_at=timezone.now() - timedelta(hours=1))
+        queue.requeue_stale()
+        current = queue.claim(worker='alive')
+
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            queue.run_job(stale)
+
+        current.refresh_from_db()
+        self.assertEqual((current.status, current.locked_by, current.result),
+                         (Job.RUNNING, 'alive', None))
+        queue.run_job(current)
+        current.refresh_from_db()
+        self.assertEqual((current.status, current.result),
+                         (Job.SUCCEEDED, 3))
+
+
+class RunJobTests(TestCase):
+    """Tests for `run_job`."""
+
+    def test_success(self):
+        """Test the result of a job is stored."""
+        add.enqueue({'a': 1, 'b': 2})
+
+        job = queue.run_job(queue.claim())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.result, 3)
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(job.locked_by, '')
+
+    @override_settings(JOBS={'BACKOFF_BASE': 10})
+    def test_retry_then_fail(self):
+        """Test failed jobs are retried with backoff, then fail."""
+        explode.enqueue()
+
+        job = queue.run_job(queue.claim(['exports']))
+
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertIn('ValueError: boom', job.error)
+        self.assertGreaterEqual(
+            job.run_at, timezone.now() + timedelta(seconds=4))
+        self.assertIsNone(queue.claim(['exports']))
+
+        Job.objects.update(run_at=timezone.now())
+        job = queue.run_job(queue.claim(['exports']))
+
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_backoff(self):
+        """Test the backoff doubles up to BACKOFF_MAX."""
+        with override_settings(JOBS={'BACKOFF_BASE': 4, 'BACKOFF_MAX': 10}):
+            self.assertTrue(2 <= queue.backoff(1) <= 4)
+            self.assertTrue(4 <= queue.backoff(2) <= 8)
+            self.assertTrue(5 <= queue.backoff(5) <= 10)
+
+    def test_run_jobs_command(self):
+        """Test the worker command runs the queued jobs."""
+        for value in range(3):
+            add.enqueue({'a': value, 'b': 1})
+        out = StringIO()
+
+        call_command('run_jobs', processes=1, burst=True, stdout=out)
+
+        self.assertIn('Ran 3 jobs', out.getvalue())
+        self.assertEqual(
+            sorted(Job.objects.values_list('result', flat=True)), [1, 2, 3])
+
+
+PERIODIC_ADD = {'PERIODIC': {'jobs.tests.test_queue.add': 60}}
+
+
+class SchedulePeriodicTests(TestCase):
+    """Tests for `schedule_periodic`."""
+
+    @override_settings(JOBS=PERIODIC_ADD)
+    def test_schedule_periodic(self):
+        """Test periodic tasks are queued once per interval."""
+        job, = queue.schedule_periodic()
+        self.assertEqual(job.name, 'jobs.tests.test_queue.add')
+
+        self.assertEqual(queue.schedule_periodic(), [])
+        Job.objects.update(status=Job.SUCCEEDED)
+        self.assertEqual(queue.schedule_periodic(), [])
+
+        Job.objects.update(created_at=timezone.now() - timedelta(minutes=2))
+        self.assertEqual(len(queue.schedule_periodic()), 1)
+
+    @override_settings(JOBS=PERIODIC_ADD)
+    def test_pending_job_is_not_queued_again(self):
+        """Test a task is not queued while its last job is pending."""
+        add.enqueue({'a': 1, 'b': 1})
+        Job.objects.update(created_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(queue.schedule_periodic(), [])
+
+    def test_configured_tasks_exist(self):
+        """Test the periodic tasks of the settings are tasks."""
+        self.assertTrue(settings.JOBS['PERIODIC'])
+        for name in settings.JOBS['PERIODIC']:
+            queue.get_task(name)
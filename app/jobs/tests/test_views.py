@@ -0,0 +1,81 @@
+"""
+Tests for the job status API.
+"""
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.tests.data_test import SUPERVISOR_DATA_TEST, USER_DATA_TEST
+from jobs.models import Job
+from jobs.tests.test_queue import add
+
+JOBS_URL = reverse('jobs:job-list')
+
+
+def create_user(**params):
+    """
+    Helper function to create a user.
+    """
+    return get_user_model().objects.create_user(**params)
+
+
+def detail_url(job_id):
+    """
+    Return the status URL of a job.
+    """
+    return reverse('jobs:job-detail', args=[job_id])
+
+
+class JobApiTests(TestCase):
+    """Tests for the job status endpoints."""
+
+    def setUp(self) -> None:
+        self.user = create_user(**USER_DATA_TEST)
+        self.staff = create_user(**SUPERVISOR_DATA_TEST)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.job = add.enqueue({'a': 1, 'b': 2}, user=self.user)
+        self.other_job = add.enqueue({'a': 1, 'b': 2}, user=self.staff)
+        return super().setUp()
+
+    def test_auth_required(self):
+        """Test the job status needs authentication."""
+        res = APIClient().get(JOBS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_list_own_jobs(self):
+        """Test users only list their jobs."""
+        res = self.client.get(JOBS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([job['id'] for job in res.data], [self.job.id])
+        self.assertEqual(res.data[0]['status'], Job.QUEUED)
+
+    def test_staff_lists_all_jobs(self):
+        """Test staff list every job and can filter them."""
+        Job.objects.filter(pk=self.job.pk).update(status=Job.SUCCEEDED)
+        self.client.force_authenticate(self.staff)
+
+        res = self.client.get(JOBS_URL)
+        self.assertEqual(len(res.data), 2)
+
+        res = self.client.get(JOBS_URL, {'status': Job.SUCCEEDED})
+        self.assertEqual([job['id'] for job in res.data], [self.job.id])
+
+    def test_retrieve(self):
+        """Test users get the status of their jobs only."""
+        res = self.client.get(detail_url(self.job.id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['name'], 'jobs.tests.test_queue.add')
+
+        res = self.client.get(detail_url(self.other_job.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_read_only(self):
+        """Test jobs can not be changed through the API."""
+        res = self.client.delete(detail_url(self.job.id))
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
@@ -0,0 +1,16 @@
+"""
+URLs for the jobs app.
+"""
+from django.urls import path, include
+from rest_framework import routers
+
+from jobs import views
+
+app_name = 'jobs'
+
+router = routers.SimpleRouter()
+router.register('jobs', views.JobViewSet, basename='job')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
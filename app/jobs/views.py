@@ -0,0 +1,34 @@
+"""
+Views for the jobs app.
+"""
+from rest_framework import viewsets
+from rest_framework.permissions import IsAuthenticated
+
+from core.mixins import ExtraActionsMixin
+from core.tracing import TracedViewMixin
+from jobs.models import Job
+from jobs.serializers import JobSerializer
+
+
+class JobViewSet(
+        TracedViewMixin, ExtraActionsMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Status of the jobs enqueued by the user, or of every job for staff.
+
+    The `status` and `queue` query parameters filter the list.
+    """
+    serializer_class = JobSerializer
+    permission_classes = (IsAuthenticated,)
+    queryset = Job.objects.order_by('-pk')
+
+    def get_queryset(self):
+        """Return the jobs visible to the user."""
+        queryset = super().get_queryset()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(created_by=self.request.user)
+        if self.action == 'list':
+            for param in ('status', 'queue'):
+                value = self.request.query_params.get(param)
+                if value:
+                    queryset = queryset.filter(**{param: value})
+        return queryset
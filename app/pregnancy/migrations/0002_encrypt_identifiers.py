@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:35
+
+import core.encryption
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pregnancy', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pregnantwoman',
+            name='nis_number_index',
+            field=core.encryption.BlindIndexField(source='nis_number'),
+        ),
+        migrations.AddField(
+            model_name='pregnantwoman',
+            name='sus_card_number_index',
+            field=core.encryption.BlindIndexField(source='sus_card_number'),
+        ),
+        migrations.AlterField(
+            model_name='pregnantwoman',
+            name='nis_number',
+            field=core.encryption.EncryptedCharField(blank=True, blind_index='nis_number_index', max_length=20, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='pregnantwoman',
+            name='sus_card_number',
+            field=core.encryption.EncryptedCharField(blind_index='sus_card_number_index', max_length=20, unique=True),
+        ),
+    ]
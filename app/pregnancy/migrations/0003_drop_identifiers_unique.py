@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:22
+
+import core.encryption
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pregnancy', '0002_encrypt_identifiers'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pregnantwoman',
+            name='nis_number',
+            field=core.encryption.EncryptedCharField(blank=True, blind_index='nis_number_index', max_length=20, null=True),
+        ),
+        migrations.AlterField(
+            model_name='pregnantwoman',
+            name='sus_card_number',
+            field=core.encryption.EncryptedCharField(blind_index='sus_card_number_index', max_length=20),
+        ),
+    ]
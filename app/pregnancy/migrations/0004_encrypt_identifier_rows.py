@@ -0,0 +1,15 @@
+from django.db import migrations
+
+from core.encryption import encrypt_rows
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pregnancy', '0003_drop_identifiers_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(encrypt_rows('pregnancy.PregnantWoman'),
+                             migrations.RunPython.noop),
+    ]
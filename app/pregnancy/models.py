@@ -1,5 +1,7 @@
 from django.db import models
 
+from core.encryption import BlindIndexField, EncryptedCharField
+
 # Create your models here.
 class Address(models.Model):
     street = models.CharField(max_length=255)
@@ -15,9 +17,14 @@ class EmergencyContact(models.Model):
     
 class PregnantWoman(models.Model):
     full_name = models.CharField(max_length=255)
-    sus_card_number = models.CharField(max_length=20, unique=True)
+    sus_card_number = EncryptedCharField(
+        max_length=20, blind_index='sus_card_number_index')
+    sus_card_number_index = BlindIndexField(source='sus_card_number')
     birth_date = models.DateField()
-    nis_number = models.CharField(max_length=20, unique=True, blank=True, null=True)
+    nis_number = EncryptedCharField(
+        max_length=20, blank=True, null=True,
+        blind_index='nis_number_index')
+    nis_number_index = BlindIndexField(source='nis_number')
     prefered_name = models.CharField(max_length=255, blank=True, null=True)
     race = models.CharField(max_length=50)
     ethnicity = models.CharField(max_length=50)
@@ -1,6 +1,7 @@
 from unittest.mock import patch
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.db.utils import IntegrityError
 from pregnancy.models import PregnantWoman, Address, EmergencyContact
 
@@ -96,4 +97,44 @@ class PregnancyModelTest(TestCase):
             address=address,
             emergency_contact=emergency_contact)
         self.assertEqual(pregnant_woman.full_name, data['full_name'])
-        
\ No newline at end of file
+        
+    def test_identifiers_are_encrypted(self):
+        """
+        Test SUS and NIS numbers are stored encrypted and found by value.
+        """
+        emergency_contact = create_emergency_contact(
+            **emergency_contact_model_test())
+        data = pregnancy_model_test()
+        pregnant_woman = create_pregnant_woman(
+            **data,
+            address=create_address(**address_model_test()),
+            emergency_contact=emergency_contact)
+        other = create_pregnant_woman(
+            **{**data, 'sus_card_number': '98765432109876543210',
+               'nis_number': None},
+            address=create_address(**address_model_test()),
+            emergency_contact=emergency_contact)
+        create_pregnant_woman(
+            **{**data, 'sus_card_number': '11111111111111111111',
+               'nis_number': None},
+            address=create_address(**address_model_test()),
+            emergency_contact=emergency_contact)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT sus_card_number, nis_number '
+                'FROM pregnancy_pregnantwoman WHERE id = %s',
+                [pregnant_woman.pk])
+            stored = cursor.fetchone()
+        self.assertNotIn(data['sus_card_number'], stored[0])
+        self.assertNotIn(data['nis_number'], stored[1])
+        self.assertEqual(
+            PregnantWoman.objects.get(sus_card_number=data['sus_card_number']),
+            pregnant_woman)
+        self.assertEqual(
+            PregnantWoman.objects.get(nis_number=data['nis_number']),
+            pregnant_woman)
+        self.assertEqual(
+            PregnantWoman.objects.filter(nis_number__isnull=True).count(), 2)
+        self.assertIsNone(
+            PregnantWoman.objects.get(pk=other.pk).nis_number)